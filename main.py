@@ -9,6 +9,7 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 import traceback
+import threading
 from qtpy import QtWidgets, QtCore
 from ui.main_window import MainWindow
 from utils.logger import Logger, app_logger
@@ -43,6 +44,15 @@ def setup_exception_handling():
     sys.excepthook = excepthook
 
 
+def start_font_preload():
+    """Load the grid label fonts in a background thread."""
+    def preload():
+        from workflows.grid_generator import preload_fonts
+        preload_fonts()
+    
+    threading.Thread(target=preload, name="font-preload", daemon=True).start()
+
+
 def main():
     """Application entry point."""
     # Set up exception handling
@@ -59,6 +69,9 @@ def main():
     main_window = MainWindow()
     main_window.show()
     
+    # Find label fonts now rather than on the first render
+    start_font_preload()
+    
     # Start the application event loop
     app_logger.info("Application started")
     sys.exit(app.exec_())
@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('config.json', '.')],
-    hiddenimports=[],
+    hiddenimports=['workflows.mag_grid', 'workflows.compare_grid', 'workflows.mode_grid'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
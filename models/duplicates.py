@@ -0,0 +1,120 @@
+"""
+Duplicate image detection for SEM Image Workflow Manager.
+Finds byte-identical copies of image files and groups near-duplicate pairs,
+without comparing every image with every other image.
+"""
+
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+# Bytes read per step when hashing file contents
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_content_hash(path):
+    """
+    Hash the contents of a file.
+    
+    Args:
+        path (str): File path
+    
+    Returns:
+        str: Hex digest, or None if the file could not be read
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    except OSError as e:
+        logger.warning(f"Could not hash {path}: {str(e)}")
+        return None
+    return digest.hexdigest()
+
+
+def find_exact_duplicates(paths, max_workers=8):
+    """
+    Find files with identical contents.
+    
+    Files are first grouped by size, and only files that share a size are
+    hashed, so unique files are never read.
+    
+    Args:
+        paths (list): File paths
+        max_workers (int): Number of threads reading files
+    
+    Returns:
+        list: Groups of two or more paths with identical contents, each in input order
+    """
+    by_size = {}
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        by_size.setdefault(size, []).append(path)
+    
+    candidates = [path for group in by_size.values() if len(group) > 1 for path in group]
+    if not candidates:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="content-hash") as executor:
+        digests = list(executor.map(file_content_hash, candidates))
+    
+    by_digest = {}
+    for path, digest in zip(candidates, digests):
+        if digest is not None:
+            by_digest.setdefault(digest, []).append(path)
+    
+    order = {path: index for index, path in enumerate(paths)}
+    groups = [sorted(group, key=order.get) for group in by_digest.values() if len(group) > 1]
+    groups.sort(key=lambda group: order[group[0]])
+    
+    logger.info(f"Hashed {len(candidates)} of {len(paths)} files; "
+                f"found {len(groups)} groups of identical files")
+    return groups
+
+
+def group_pairs(pairs, order):
+    """
+    Merge pairs of related items into connected groups.
+    
+    Args:
+        pairs (iterable): (item, item) tuples
+        order (dict): Item -> sort position, used to order items within and across groups
+    
+    Returns:
+        list: Groups of two or more items
+    """
+    parent = {}
+    
+    def find(item):
+        root = item
+        while parent.get(root, root) != root:
+            root = parent[root]
+        # Path compression
+        while item != root:
+            parent[item], item = root, parent.get(item, item)
+        return root
+    
+    for first, second in pairs:
+        parent.setdefault(first, first)
+        parent.setdefault(second, second)
+        first_root, second_root = find(first), find(second)
+        if first_root != second_root:
+            # Keep the earliest item as the root
+            if order[second_root] < order[first_root]:
+                first_root, second_root = second_root, first_root
+            parent[second_root] = first_root
+    
+    groups = {}
+    for item in parent:
+        groups.setdefault(find(item), []).append(item)
+    
+    result = [sorted(group, key=order.get) for group in groups.values() if len(group) > 1]
+    result.sort(key=lambda group: order[group[0]])
+    return result
@@ -0,0 +1,429 @@
+"""
+Perceptual image signatures for SEM Image Workflow Manager.
+Computes compact perceptual hashes and intensity histograms for images and
+indexes them for fast "most similar image" queries across sessions.
+"""
+
+from itertools import combinations
+import numpy as np
+from PIL import Image
+from utils.logger import Logger
+from workflows.windowing import apply_window
+
+logger = Logger(__name__)
+
+# Side of the hash grid; hashes have HASH_SIZE * HASH_SIZE bits
+HASH_SIZE = 8
+
+# Side of the downsampled image the pHash DCT is computed from
+PHASH_IMAGE_SIZE = 32
+
+# Number of bins in the intensity histogram descriptor
+HISTOGRAM_BINS = 16
+
+# Size of the grayscale proxy decoded for signatures
+SIGNATURE_PROXY_SIZE = 256
+
+# Metadata keys the signature is stored under
+SIGNATURE_KEYS = ("phash", "dhash", "histogram")
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II matrix of size n x n."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_IMAGE_SIZE)
+
+# Number of set bits for every byte value
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _bits_to_int(bits):
+    """Pack a boolean array into an integer, most significant bit first."""
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash(img):
+    """
+    Compute the difference hash of a grayscale image.
+    
+    Args:
+        img (PIL.Image): Grayscale image
+    
+    Returns:
+        int: 64-bit hash
+    """
+    small = np.asarray(img.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR), dtype=np.int16)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def phash(img):
+    """
+    Compute the DCT-based perceptual hash of a grayscale image.
+    
+    Args:
+        img (PIL.Image): Grayscale image
+    
+    Returns:
+        int: 64-bit hash
+    """
+    small = np.asarray(img.resize((PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE), Image.BILINEAR), dtype=np.float64)
+    coefficients = (_DCT @ small @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    
+    # Compare against the median of the low frequencies, leaving out the DC term
+    median = np.median(coefficients.ravel()[1:])
+    return _bits_to_int(coefficients > median)
+
+
+def histogram_descriptor(img):
+    """
+    Compute a coarse intensity histogram of a grayscale image.
+    
+    Args:
+        img (PIL.Image): Grayscale image
+    
+    Returns:
+        numpy.ndarray: HISTOGRAM_BINS uint8 values scaled to sum to about 255
+    """
+    counts = np.asarray(img.histogram()[:256], dtype=np.float64)
+    counts = counts.reshape(HISTOGRAM_BINS, -1).sum(axis=1)
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(HISTOGRAM_BINS, dtype=np.uint8)
+    return np.rint(counts * 255.0 / total).astype(np.uint8)
+
+
+def compute_signature(image_path):
+    """
+    Compute the perceptual signature of an image file.
+    
+    Args:
+        image_path (str): Path to the image file
+    
+    Returns:
+        dict: "phash", "dhash" and "histogram" values encoded for metadata storage
+    """
+    with Image.open(image_path) as img:
+        img.draft('L', (SIGNATURE_PROXY_SIZE, SIGNATURE_PROXY_SIZE))
+        # Window high bit depth frames as for display; PIL's conversion clips them
+        img = apply_window(img, image_path)
+        if img.mode not in ('L', 'RGB', 'RGBA', '1'):
+            img = img.convert('RGB')
+        gray = img.convert('L')
+        gray.thumbnail((SIGNATURE_PROXY_SIZE, SIGNATURE_PROXY_SIZE), Image.BILINEAR)
+    
+    # Hex strings with a 0x prefix survive the CSV round trip as strings
+    return {
+        "phash": f"0x{phash(gray):016x}",
+        "dhash": f"0x{dhash(gray):016x}",
+        "histogram": "0x" + histogram_descriptor(gray).tobytes().hex()
+    }
+
+
+def parse_hash(value):
+    """
+    Decode a stored hash.
+    
+    Args:
+        value: Hash as stored in metadata
+    
+    Returns:
+        int: Hash, or None if the value is missing or malformed
+    """
+    if isinstance(value, str) and value.startswith("0x"):
+        try:
+            return int(value, 16)
+        except ValueError:
+            return None
+    return None
+
+
+def parse_histogram(value):
+    """
+    Decode a stored histogram descriptor.
+    
+    Args:
+        value: Histogram as stored in metadata
+    
+    Returns:
+        numpy.ndarray: Histogram as float values summing to 1, or None if missing or malformed
+    """
+    if not isinstance(value, str) or not value.startswith("0x"):
+        return None
+    try:
+        counts = np.frombuffer(bytes.fromhex(value[2:]), dtype=np.uint8).astype(np.float64)
+    except ValueError:
+        return None
+    if counts.size != HISTOGRAM_BINS or counts.sum() == 0:
+        return None
+    return counts / counts.sum()
+
+
+def hamming_distance(a, b):
+    """
+    Count the differing bits of two hashes.
+    
+    Args:
+        a (int): First hash
+        b (int): Second hash
+    
+    Returns:
+        int: Number of differing bits
+    """
+    return bin(a ^ b).count("1")
+
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over 64-bit hashes for Hamming-distance range queries.
+    
+    Each hash is split into CHUNKS substrings with one lookup table per substring.
+    Two hashes within distance r must agree to within r // CHUNKS bits on at
+    least one substring, so a query only looks up the few substring values that
+    close to its own and then checks the full distance of those candidates.
+    """
+    
+    CHUNKS = 4
+    CHUNK_BITS = 16
+    
+    def __init__(self):
+        """Initialize an empty index."""
+        self._tables = [{} for _ in range(self.CHUNKS)]  # Substring value -> [(hash, item)]
+        self._size = 0
+        self._flip_masks = {}
+    
+    def __len__(self):
+        return self._size
+    
+    def _chunks(self, hash_value):
+        """Split a hash into its substrings."""
+        mask = (1 << self.CHUNK_BITS) - 1
+        return [(hash_value >> (self.CHUNK_BITS * index)) & mask for index in range(self.CHUNKS)]
+    
+    def _masks(self, radius):
+        """Get all substring bit masks with at most radius bits set."""
+        if radius not in self._flip_masks:
+            masks = [0]
+            for bit_count in range(1, radius + 1):
+                for bits in combinations(range(self.CHUNK_BITS), bit_count):
+                    masks.append(sum(1 << bit for bit in bits))
+            self._flip_masks[radius] = masks
+        return self._flip_masks[radius]
+    
+    def add(self, hash_value, item):
+        """
+        Add an item under a hash.
+        
+        Args:
+            hash_value (int): Hash of the item
+            item: Item stored with the hash
+        """
+        entry = (hash_value, item)
+        for table, chunk in zip(self._tables, self._chunks(hash_value)):
+            table.setdefault(chunk, []).append(entry)
+        self._size += 1
+    
+    def search(self, hash_value, max_distance):
+        """
+        Find all items whose hash is within a Hamming distance.
+        
+        Args:
+            hash_value (int): Query hash
+            max_distance (int): Largest distance to include
+        
+        Returns:
+            list: (distance, item) tuples, unordered
+        """
+        masks = self._masks(max_distance // self.CHUNKS)
+        
+        results = []
+        seen = set()
+        for table, chunk in zip(self._tables, self._chunks(hash_value)):
+            for mask in masks:
+                for candidate_hash, item in table.get(chunk ^ mask, ()):
+                    if id(item) in seen:
+                        continue
+                    seen.add(id(item))
+                    distance = hamming_distance(hash_value, candidate_hash)
+                    if distance <= max_distance:
+                        results.append((distance, item))
+        return results
+
+
+class SimilarityIndex:
+    """
+    Index of image signatures answering "most similar images" queries.
+    
+    Near-duplicates are found by pHash distance with multi-index hashing; when
+    a small search radius does not find enough candidates, all signatures are
+    compared in one vectorized pass. Candidates are ranked by a combined
+    distance of pHash, dHash and histogram differences.
+    """
+    
+    # Weights of the combined distance; each term is scaled to the range 0-1
+    PHASH_WEIGHT = 0.5
+    DHASH_WEIGHT = 0.25
+    HISTOGRAM_WEIGHT = 0.25
+    
+    # Hash search radius tried before falling back to a full comparison
+    NEAR_RADIUS = 8
+    
+    def __init__(self):
+        """Initialize an empty index."""
+        self._hash_index = MultiIndexHash()
+        self._signatures = {}  # Image path -> (phash, dhash, histogram)
+        self._arrays = None    # (paths, phashes, dhashes, histograms) for full comparisons
+    
+    def __len__(self):
+        return len(self._signatures)
+    
+    def __contains__(self, image_path):
+        return image_path in self._signatures
+    
+    def add(self, image_path, signature):
+        """
+        Add an image to the index.
+        
+        Args:
+            image_path (str): Image path
+            signature (dict): Stored signature values from compute_signature
+        
+        Returns:
+            bool: True if the signature was valid and the image was added
+        """
+        p_hash = parse_hash(signature.get("phash"))
+        d_hash = parse_hash(signature.get("dhash"))
+        histogram = parse_histogram(signature.get("histogram"))
+        if p_hash is None or d_hash is None or histogram is None:
+            return False
+        
+        if image_path not in self._signatures:
+            self._hash_index.add(p_hash, image_path)
+        self._signatures[image_path] = (p_hash, d_hash, histogram)
+        self._arrays = None
+        return True
+    
+    def distance(self, first, second):
+        """
+        Get the combined distance between two indexed images.
+        
+        Args:
+            first (str): Image path
+            second (str): Image path
+        
+        Returns:
+            float: Distance from 0 (identical) to 1
+        """
+        return self._combined_distance(self._signatures[first], self._signatures[second])
+    
+    def _combined_distance(self, a, b):
+        """Weighted sum of the normalized pHash, dHash and histogram distances."""
+        bits = HASH_SIZE * HASH_SIZE
+        return (
+            self.PHASH_WEIGHT * hamming_distance(a[0], b[0]) / bits
+            + self.DHASH_WEIGHT * hamming_distance(a[1], b[1]) / bits
+            + self.HISTOGRAM_WEIGHT * float(np.abs(a[2] - b[2]).sum()) / 2.0
+        )
+    
+    def _get_arrays(self):
+        """Get the signatures as arrays, building them after the index changed."""
+        if self._arrays is None:
+            paths = list(self._signatures)
+            signatures = [self._signatures[path] for path in paths]
+            phashes = np.array([sig[0] for sig in signatures], dtype=np.uint64)
+            dhashes = np.array([sig[1] for sig in signatures], dtype=np.uint64)
+            histograms = np.array([sig[2] for sig in signatures], dtype=np.float32).reshape(-1, HISTOGRAM_BINS)
+            self._arrays = (paths, phashes, dhashes, histograms)
+        return self._arrays
+    
+    @staticmethod
+    def _hamming_array(hashes, query):
+        """Hamming distances between an array of 64-bit hashes and one hash."""
+        differences = np.bitwise_xor(hashes, np.uint64(query))
+        return _POPCOUNT[differences.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+    
+    def find_similar(self, image_path, max_results=10, max_hash_distance=24, exclude=None):
+        """
+        Find the indexed images most similar to an indexed image.
+        
+        Args:
+            image_path (str): Query image path
+            max_results (int): Maximum number of results
+            max_hash_distance (int): Largest pHash distance considered similar
+            exclude (callable, optional): Predicate for image paths to leave out
+        
+        Returns:
+            list: (image path, combined distance, pHash distance) tuples, most similar first
+        """
+        query = self._signatures.get(image_path)
+        if query is None:
+            return []
+        
+        # Near-duplicates: a small hash index search
+        radius = min(self.NEAR_RADIUS, max_hash_distance)
+        candidates = [
+            (p_distance, path) for p_distance, path in self._hash_index.search(query[0], radius)
+            if path != image_path and not (exclude and exclude(path))
+        ]
+        
+        if len(candidates) >= max_results or radius >= max_hash_distance:
+            ranked = sorted(
+                (self._combined_distance(query, self._signatures[path]), p_distance, path)
+                for p_distance, path in candidates
+            )
+            return [(path, distance, p_distance) for distance, p_distance, path in ranked[:max_results]]
+        
+        # Otherwise compare against every signature at once
+        paths, phashes, dhashes, histograms = self._get_arrays()
+        bits = HASH_SIZE * HASH_SIZE
+        p_distances = self._hamming_array(phashes, query[0])
+        within = np.flatnonzero(p_distances <= max_hash_distance)
+        p_distances = p_distances[within]
+        distances = (
+            self.PHASH_WEIGHT * p_distances / bits
+            + self.DHASH_WEIGHT * self._hamming_array(dhashes[within], query[1]) / bits
+            + self.HISTOGRAM_WEIGHT * np.abs(histograms[within] - query[2].astype(np.float32)).sum(axis=1) / 2.0
+        )
+        
+        results = []
+        for order in np.lexsort((p_distances, distances)):
+            index = within[order]
+            path = paths[index]
+            if path == image_path or (exclude and exclude(path)):
+                continue
+            results.append((path, float(distances[order]), int(p_distances[order])))
+            if len(results) >= max_results:
+                break
+        return results
+    
+    def near_duplicate_pairs(self, max_hash_distance=4):
+        """
+        Find all pairs of indexed images whose pHash and dHash both differ by only a few bits.
+        
+        Each image is looked up in the hash index rather than compared with every
+        other image, so the pass is close to linear in the number of images.
+        
+        Args:
+            max_hash_distance (int): Largest pHash and dHash distance of a near-duplicate pair
+        
+        Returns:
+            list: (image path, image path) tuples, each pair listed once in index order
+        """
+        position = {path: index for index, path in enumerate(self._signatures)}
+        pairs = []
+        for image_path, (p_hash, d_hash, _) in self._signatures.items():
+            for _, other_path in self._hash_index.search(p_hash, max_hash_distance):
+                # Each pair is found from both ends; keep it from the earlier image
+                if position[other_path] <= position[image_path]:
+                    continue
+                if hamming_distance(d_hash, self._signatures[other_path][1]) <= max_hash_distance:
+                    pairs.append((image_path, other_path))
+        return pairs
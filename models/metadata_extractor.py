@@ -291,7 +291,7 @@ class MetadataExtractor:
             # Add other strategies as needed
         }
     
-    def extract_metadata(self, image_path, device_type=None):
+    def extract_metadata(self, image_path, device_type=None, compute_signature=True):
         """
         Extract metadata using appropriate strategy.
         
@@ -299,6 +299,8 @@ class MetadataExtractor:
             image_path (str): Path to the image file.
             device_type (str, optional): Type of device to use for extraction.
                 If None, will attempt to auto-detect.
+            compute_signature (bool, optional): Whether to add the perceptual
+                signature, which decodes the whole image. Defaults to True.
                 
         Returns:
             ImageMetadata: Extracted metadata object.
@@ -310,10 +312,22 @@ class MetadataExtractor:
             # Auto-detect device type from image
             device_type = self._detect_device_type(image_path)
             
-        if device_type in self.strategies:
-            return self.strategies[device_type].extract(image_path)
-        else:
+        if device_type not in self.strategies:
             raise ValueError(f"Unsupported device type: {device_type}")
+        
+        metadata = self.strategies[device_type].extract(image_path)
+        
+        # Perceptual signature for similarity search, stored with the other metadata
+        from utils.config import config
+        if (metadata is not None and compute_signature
+                and config.get('similarity.compute_at_extraction', True)):
+            from models.image_hash import compute_signature as compute_image_signature
+            try:
+                metadata.additional_params.update(compute_image_signature(image_path))
+            except Exception as e:
+                print(f"Error computing image signature for {image_path}: {str(e)}")
+        
+        return metadata
             
     def _detect_device_type(self, image_path):
         """
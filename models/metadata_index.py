@@ -0,0 +1,168 @@
+"""
+Metadata index for SEM Image Workflow Manager.
+Builds lookup tables over session metadata in a single pass so that collection
+discovery works with dictionary lookups instead of repeated full scans.
+"""
+
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+
+class MetadataIndex:
+    """
+    Indexes of session metadata by manual collection, mode, position and ChemSEM companion.
+    """
+    
+    def __init__(self, metadata, mode_func=None, display_func=None):
+        """
+        Build the index from a metadata dictionary.
+        
+        Args:
+            metadata (dict): Dictionary mapping image paths to metadata objects
+            mode_func (callable, optional): Function returning a mode identifier for a
+                metadata object; defaults to the lower-case detector mode
+            display_func (callable, optional): Function returning a display name for a
+                metadata object; defaults to the mode identifier
+        """
+        self.metadata = metadata
+        self._size = len(metadata)
+        self._mode_func = mode_func or (lambda m: m.mode.lower() if m.mode else "unknown")
+        self._display_func = display_func
+        
+        self.valid_paths = []          # Valid image paths in metadata order
+        self.by_collection = {}        # Manual Collection field value -> image paths
+        self.modes = {}                # Image path -> mode identifier
+        self.by_mode = {}              # Mode identifier -> image paths
+        self.by_position = {}          # Exact position key -> image paths, ChemSEM companions last
+        self.position_of = {}          # Image path -> position key
+        self.chemsem_companions = {}   # Regular image path -> matching ChemSEM image path
+        self.chemsem_paths = set()     # All valid ChemSEM image paths
+        self._display_names = {}
+        
+        self._build()
+    
+    def _build(self):
+        """Walk the metadata once and fill every index."""
+        chemsem_by_base = {}   # Filename without _ChemiSEM and extension -> ChemSEM path
+        regular_by_base = {}   # Filename without extension -> regular path
+        
+        for img_path, metadata in self.metadata.items():
+            if not metadata.is_valid():
+                continue
+            
+            self.valid_paths.append(img_path)
+            
+            # Manual Collection field
+            additional_params = getattr(metadata, 'additional_params', None)
+            if isinstance(additional_params, dict) and additional_params.get('Collection'):
+                self.by_collection.setdefault(additional_params['Collection'], []).append(img_path)
+            
+            # Mode
+            mode = self._mode_func(metadata)
+            self.modes[img_path] = mode
+            self.by_mode.setdefault(mode, []).append(img_path)
+            
+            # ChemSEM images are matched to their regular image by filename and
+            # join its position group instead of forming their own
+            filename = metadata.filename or ""
+            if "ChemiSEM" in filename:
+                base_name = filename.replace("_ChemiSEM", "").replace(".tiff", "").replace(".tif", "")
+                chemsem_by_base[base_name] = img_path
+                self.chemsem_paths.add(img_path)
+                continue
+            
+            base_name = filename.replace(".tiff", "").replace(".tif", "")
+            regular_by_base[base_name] = img_path
+            
+            # Position bucket - exact stage coordinates
+            pos_key = f"{metadata.sample_position_x}_{metadata.sample_position_y}"
+            self.by_position.setdefault(pos_key, []).append(img_path)
+            self.position_of[img_path] = pos_key
+        
+        # Attach ChemSEM companions to the position group of their regular image
+        for base_name, regular_path in regular_by_base.items():
+            chemsem_path = chemsem_by_base.get(base_name)
+            if chemsem_path is None:
+                continue
+            
+            self.chemsem_companions[regular_path] = chemsem_path
+            pos_key = self.position_of[regular_path]
+            self.by_position[pos_key].append(chemsem_path)
+            self.position_of.setdefault(chemsem_path, pos_key)
+        
+        logger.info(f"Indexed {len(self.valid_paths)}/{self._size} valid images: "
+                    f"{len(self.by_mode)} modes, {len(self.by_position)} positions, "
+                    f"{len(self.by_collection)} manual collections, "
+                    f"{len(self.chemsem_companions)} ChemSEM companions")
+    
+    def is_current(self, metadata):
+        """
+        Check whether the index still describes the given metadata dictionary.
+        
+        Args:
+            metadata (dict): Dictionary mapping image paths to metadata objects
+        
+        Returns:
+            bool: True if the index was built from this dictionary and it has not grown or shrunk
+        """
+        return metadata is self.metadata and len(metadata) == self._size
+    
+    def mode(self, img_path):
+        """
+        Get the mode identifier of an image.
+        
+        Args:
+            img_path (str): Image path
+        
+        Returns:
+            str: Mode identifier
+        """
+        mode = self.modes.get(img_path)
+        if mode is None:
+            mode = self._mode_func(self.metadata[img_path])
+            self.modes[img_path] = mode
+        return mode
+    
+    def display_name(self, img_path):
+        """
+        Get the display name of an image's mode, computing it on first request.
+        
+        Args:
+            img_path (str): Image path
+        
+        Returns:
+            str: Display name
+        """
+        display_name = self._display_names.get(img_path)
+        if display_name is None:
+            if self._display_func:
+                display_name = self._display_func(self.metadata[img_path])
+            else:
+                display_name = self.mode(img_path)
+            self._display_names[img_path] = display_name
+        return display_name
+    
+    def mode_counts(self):
+        """
+        Get the number of valid images per mode.
+        
+        Returns:
+            dict: Mode identifier -> image count
+        """
+        return {mode: len(paths) for mode, paths in self.by_mode.items()}
+    
+    def group_by_mode(self, img_paths):
+        """
+        Group image paths by mode, preserving their order.
+        
+        Args:
+            img_paths (list): Image paths
+        
+        Returns:
+            dict: Mode identifier -> image paths
+        """
+        groups = {}
+        for img_path in img_paths:
+            groups.setdefault(self.mode(img_path), []).append(img_path)
+        return groups
@@ -0,0 +1,413 @@
+"""
+Project-level metadata index for SEM Image Workflow Manager.
+Keeps the image metadata of every session in a project folder in one SQLite
+database, so workflows that compare sessions can query them without listing
+session folders or parsing their metadata CSV files.
+"""
+
+import os
+import csv
+import json
+import sqlite3
+import threading
+from utils.logger import Logger
+from utils.config import config
+
+logger = Logger(__name__)
+
+# Bump when the table layout changes; older databases are rebuilt from the CSV files
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_folder TEXT PRIMARY KEY,
+    session_id TEXT,
+    sample_id TEXT,
+    sample_name TEXT,
+    csv_path TEXT,
+    csv_mtime_ns INTEGER,
+    csv_size INTEGER,
+    image_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS images (
+    image_path TEXT PRIMARY KEY,
+    session_folder TEXT NOT NULL,
+    mode TEXT,
+    high_voltage_kV REAL,
+    magnification REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_session ON images (session_folder);
+CREATE INDEX IF NOT EXISTS images_mode ON images (mode, high_voltage_kV, magnification);
+"""
+
+
+def find_metadata_csv(session_folder):
+    """
+    Find the metadata CSV file of a session.
+    
+    Args:
+        session_folder (str): Path to the session folder
+    
+    Returns:
+        str: Path to the CSV file, or None if the session has no metadata
+    """
+    session_id = os.path.basename(session_folder)
+    csv_file = os.path.join(session_folder, f"{session_id}_metadata.csv")
+    if os.path.exists(csv_file):
+        return csv_file
+    
+    # Legacy filename
+    csv_file = os.path.join(session_folder, "metadata.csv")
+    if os.path.exists(csv_file):
+        return csv_file
+    return None
+
+
+def _convert_csv_value(value):
+    """Convert a CSV cell the same way SessionManager does when loading metadata."""
+    if value == '' or value == 'None':
+        return None
+    try:
+        if '.' in value:
+            return float(value)
+        return int(value)
+    except (ValueError, TypeError):
+        return value
+
+
+class ProjectIndex:
+    """
+    SQLite index of the image metadata of all sessions in a project folder.
+    
+    Each session is re-indexed only when its metadata CSV changes (by modification
+    time and size). Connections are opened per operation so the index can be used
+    from worker threads; writes are serialized with a lock.
+    """
+    
+    def __init__(self, project_folder, filename=None):
+        """
+        Initialize project index.
+        
+        Args:
+            project_folder (str): Folder containing the session folders
+            filename (str, optional): Database filename; defaults to project_index.filename from config
+        """
+        self.project_folder = project_folder
+        self.db_path = os.path.join(
+            project_folder,
+            filename or config.get('project_index.filename', '.sem_project_index.sqlite')
+        )
+        self._lock = threading.Lock()
+        self._create_schema()
+    
+    def _connect(self):
+        """Open a connection to the database."""
+        # Rollback journal rather than WAL - WAL does not work on network shares
+        return sqlite3.connect(self.db_path, timeout=30)
+    
+    def _create_schema(self):
+        """Create the tables, rebuilding them if they were written by another schema version."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version != SCHEMA_VERSION:
+                    conn.executescript("DROP TABLE IF EXISTS images; DROP TABLE IF EXISTS sessions;")
+                    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                conn.executescript(SCHEMA)
+                conn.commit()
+            finally:
+                conn.close()
+    
+    def _csv_signature(self, session_folder):
+        """Get (path, mtime_ns, size) of a session's metadata CSV, or None if it has none."""
+        csv_file = find_metadata_csv(session_folder)
+        if csv_file is None:
+            return None
+        stat = os.stat(csv_file)
+        return csv_file, stat.st_mtime_ns, stat.st_size
+    
+    def is_current(self, session_folder):
+        """
+        Check whether the indexed metadata of a session matches its CSV file.
+        
+        Args:
+            session_folder (str): Path to the session folder
+        
+        Returns:
+            bool: True if the session is indexed and its CSV has not changed since
+        """
+        signature = self._csv_signature(session_folder)
+        if signature is None:
+            return False
+        
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT csv_path, csv_mtime_ns, csv_size FROM sessions WHERE session_folder = ?",
+                (session_folder,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row is not None and tuple(row) == signature
+    
+    def update_session(self, session_folder, session_info=None, force=False):
+        """
+        Index a session from its metadata CSV if the CSV changed since it was last indexed.
+        
+        Args:
+            session_folder (str): Path to the session folder
+            session_info (SessionInfo, optional): Session information for sample fields
+            force (bool): Re-index even if the CSV has not changed
+        
+        Returns:
+            bool: True if the session is indexed, False if it has no metadata or indexing failed
+        """
+        try:
+            if not force and self.is_current(session_folder):
+                if session_info is not None:
+                    self._update_session_info(session_folder, session_info)
+                return True
+            
+            signature = self._csv_signature(session_folder)
+            if signature is None:
+                logger.info(f"No metadata CSV to index for session: {session_folder}")
+                return False
+            
+            with open(signature[0], 'r', newline='') as f:
+                records = [
+                    {key: _convert_csv_value(value) for key, value in row.items()}
+                    for row in csv.DictReader(f)
+                ]
+            
+            self._replace_session(session_folder, records, signature, session_info)
+            logger.info(f"Indexed {len(records)} images from {signature[0]}")
+            return True
+        except Exception as e:
+            logger.error(f"Error indexing session {session_folder}: {str(e)}")
+            return False
+    
+    def update_session_metadata(self, session_folder, metadata, session_info=None):
+        """
+        Index a session from metadata already in memory, e.g. right after its CSV was saved.
+        
+        Args:
+            session_folder (str): Path to the session folder
+            metadata (dict): Dictionary mapping image paths to metadata objects
+            session_info (SessionInfo, optional): Session information for sample fields
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            session_id = os.path.basename(session_folder)
+            records = []
+            for meta in metadata.values():
+                record = meta.to_dict()
+                record["session_id"] = session_id
+                records.append(record)
+            
+            signature = self._csv_signature(session_folder) or (None, None, None)
+            self._replace_session(session_folder, records, signature, session_info)
+            logger.info(f"Indexed {len(records)} images for session: {session_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error indexing session {session_folder}: {str(e)}")
+            return False
+    
+    def _replace_session(self, session_folder, records, signature, session_info):
+        """Replace all indexed rows of a session in one transaction."""
+        image_rows = [
+            (
+                record["image_path"],
+                session_folder,
+                record.get("mode"),
+                record.get("high_voltage_kV"),
+                record.get("magnification"),
+                json.dumps(record)
+            )
+            for record in records if record.get("image_path")
+        ]
+        
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM images WHERE session_folder = ?", (session_folder,))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO images "
+                        "(image_path, session_folder, mode, high_voltage_kV, magnification, data) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        image_rows
+                    )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO sessions "
+                        "(session_folder, session_id, sample_id, sample_name, "
+                        "csv_path, csv_mtime_ns, csv_size, image_count) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            session_folder,
+                            os.path.basename(session_folder),
+                            getattr(session_info, 'sample_id', None),
+                            getattr(session_info, 'sample_name', None),
+                            *signature,
+                            len(image_rows)
+                        )
+                    )
+            finally:
+                conn.close()
+    
+    def _update_session_info(self, session_folder, session_info):
+        """Refresh the sample fields of an indexed session."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "UPDATE sessions SET sample_id = ?, sample_name = ? WHERE session_folder = ?",
+                        (session_info.sample_id, session_info.sample_name, session_folder)
+                    )
+            finally:
+                conn.close()
+    
+    def remove_session(self, session_folder):
+        """
+        Remove a session from the index.
+        
+        Args:
+            session_folder (str): Path to the session folder
+        """
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM images WHERE session_folder = ?", (session_folder,))
+                    conn.execute("DELETE FROM sessions WHERE session_folder = ?", (session_folder,))
+            finally:
+                conn.close()
+    
+    def get_sessions(self):
+        """
+        Get all indexed sessions.
+        
+        Returns:
+            dict: Session folder -> dict of session_id, sample_id, sample_name and image_count
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT session_folder, session_id, sample_id, sample_name, image_count FROM sessions"
+            ).fetchall()
+        finally:
+            conn.close()
+        
+        return {
+            folder: {
+                "session_id": session_id,
+                "sample_id": sample_id,
+                "sample_name": sample_name,
+                "image_count": image_count
+            }
+            for folder, session_id, sample_id, sample_name, image_count in rows
+        }
+    
+    def get_records(self, session_folders=None, mode=None, high_voltage_kV=None):
+        """
+        Get indexed metadata records, optionally filtered.
+        
+        Args:
+            session_folders (list, optional): Only return images of these sessions
+            mode (str, optional): Only return images with this detector mode
+            high_voltage_kV (float, optional): Only return images at this voltage
+        
+        Returns:
+            list: Metadata dictionaries as written to the session CSV files, in session order
+        """
+        conditions = []
+        params = []
+        if session_folders is not None:
+            session_folders = list(session_folders)
+            if not session_folders:
+                return []
+            conditions.append(f"session_folder IN ({','.join('?' * len(session_folders))})")
+            params.extend(session_folders)
+        if mode is not None:
+            conditions.append("mode = ?")
+            params.append(mode)
+        if high_voltage_kV is not None:
+            conditions.append("high_voltage_kV = ?")
+            params.append(high_voltage_kV)
+        
+        query = "SELECT data FROM images"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY session_folder, rowid"
+        
+        conn = self._connect()
+        try:
+            return [json.loads(data) for (data,) in conn.execute(query, params)]
+        finally:
+            conn.close()
+    
+    def get_metadata(self, session_folder):
+        """
+        Get the indexed metadata of a session as metadata objects.
+        
+        Args:
+            session_folder (str): Path to the session folder
+        
+        Returns:
+            dict: Dictionary mapping image paths to metadata objects
+        """
+        return records_to_metadata(self.get_records([session_folder]))
+
+
+def records_to_metadata(records):
+    """
+    Convert indexed metadata records to metadata objects.
+    
+    Args:
+        records (list): Metadata dictionaries from ProjectIndex.get_records
+    
+    Returns:
+        dict: Dictionary mapping image paths to metadata objects
+    """
+    from models.metadata_extractor import ImageMetadata
+    
+    metadata = {}
+    for record in records:
+        # session_id is added when the CSV is written and is not part of ImageMetadata
+        record = {key: value for key, value in record.items() if key != "session_id"}
+        metadata[record["image_path"]] = ImageMetadata.from_dict(record)
+    return metadata
+
+
+# Open project indexes by project folder
+_project_indexes = {}
+_project_indexes_lock = threading.Lock()
+
+
+def get_project_index(session_folder):
+    """
+    Get the index of the project folder containing a session.
+    
+    Args:
+        session_folder (str): Path to the session folder
+    
+    Returns:
+        ProjectIndex: Project index, or None if indexing is disabled or the
+            project folder cannot hold the database
+    """
+    if not config.get('project_index.enabled', True) or not session_folder:
+        return None
+    
+    project_folder = os.path.dirname(os.path.abspath(session_folder))
+    with _project_indexes_lock:
+        if project_folder not in _project_indexes:
+            try:
+                _project_indexes[project_folder] = ProjectIndex(project_folder)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Project index unavailable for {project_folder}: {str(e)}")
+                _project_indexes[project_folder] = None
+        return _project_indexes[project_folder]
@@ -594,6 +594,13 @@ class SessionManager:
                     writer.writerow(meta_dict)
             
             logger.info(f"Saved metadata to: {csv_file}")
+            
+            # Keep the project-level index in step with the CSV
+            from models.project_index import get_project_index
+            project_index = get_project_index(self.session_folder)
+            if project_index:
+                project_index.update_session_metadata(self.session_folder, self.metadata, self.current_session)
+            
             return True
         except Exception as e:
             logger.error(f"Error saving metadata CSV: {str(e)}")
@@ -6,7 +6,10 @@ Allows selection of multiple sessions for comparison.
 import os
 from qtpy import QtWidgets, QtCore, QtGui
 from utils.logger import Logger
-from workflows.compare_grid import CompareGridWorkflow
+from utils.config import config
+from workflows import get_workflow_class
+from ui.workflow_messages import show_workflow_messages
+from utils.path_resolver import path_resolver
 
 logger = Logger(__name__)
 
@@ -160,6 +163,53 @@ class SessionSelectionDialog(QtWidgets.QDialog):
         return sessions
 
 
+class SimilarImagesDialog(QtWidgets.QDialog):
+    """
+    Dialog listing the images most similar to a query image.
+    """
+    
+    def __init__(self, image_path, results, parent=None):
+        """
+        Initialize dialog.
+        
+        Args:
+            image_path (str): Query image path
+            results (list): Result dicts from CompareGridWorkflow.find_similar_images
+            parent: Parent widget
+        """
+        super().__init__(parent)
+        
+        self.setWindowTitle(f"Images Similar to {os.path.basename(image_path)}")
+        self.resize(700, 400)
+        
+        layout = QtWidgets.QVBoxLayout(self)
+        
+        tree = QtWidgets.QTreeWidget()
+        tree.setHeaderLabels(["Image", "Sample", "Mode", "Magnification", "kV", "Similarity"])
+        tree.setColumnWidth(0, 250)
+        tree.setRootIsDecorated(False)
+        
+        for result in results:
+            magnification = result.get("magnification")
+            voltage = result.get("high_voltage_kV")
+            item = QtWidgets.QTreeWidgetItem([
+                os.path.basename(result["path"]),
+                str(result.get("sample_id") or "Unknown"),
+                str(result.get("mode") or ""),
+                f"{int(magnification)}x" if magnification else "",
+                f"{voltage:g}" if voltage else "",
+                f"{(1.0 - result['distance']) * 100:.0f}%"
+            ])
+            item.setToolTip(0, result["path"])
+            tree.addTopLevelItem(item)
+        
+        layout.addWidget(tree)
+        
+        button_box = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+
 class CompareGridPanel(QtWidgets.QGroupBox):
     """
     Panel for controlling the CompareGrid workflow.
@@ -179,13 +229,20 @@ class CompareGridPanel(QtWidgets.QGroupBox):
         super().__init__("CompareGrid Control", parent)
         
         self.session_manager = session_manager
-        self.workflow = CompareGridWorkflow(session_manager)
+        self._workflow = None
         
         # Initialize UI
         self._init_ui()
         
         logger.info("CompareGrid panel initialized")
     
+    @property
+    def workflow(self):
+        """CompareGrid workflow, created the first time the panel uses it."""
+        if self._workflow is None:
+            self._workflow = get_workflow_class("CompareGrid")(self.session_manager)
+        return self._workflow
+    
     def _init_ui(self):
         """Initialize the user interface."""
         layout = QtWidgets.QVBoxLayout(self)
@@ -235,6 +292,8 @@ class CompareGridPanel(QtWidgets.QGroupBox):
         self.collection_tree.setColumnWidth(0, 300)
         self.collection_tree.setColumnWidth(1, 100)
         self.collection_tree.itemSelectionChanged.connect(self._on_collection_selected)
+        self.collection_tree.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.collection_tree.customContextMenuRequested.connect(self._show_collection_menu)
         collection_layout.addWidget(self.collection_tree)
         
         # FIXED: Changed method name in connect to match class method name
@@ -243,6 +302,22 @@ class CompareGridPanel(QtWidgets.QGroupBox):
         self.discover_button.clicked.connect(self.discover_collections)  # No underscore
         collection_layout.addWidget(self.discover_button)
         
+        # Duplicate handling
+        duplicates_layout = QtWidgets.QHBoxLayout()
+        
+        self.collapse_duplicates_check = QtWidgets.QCheckBox("Collapse duplicate images")
+        self.collapse_duplicates_check.setToolTip(
+            "Leave out copies of the same image and near-identical re-acquisitions when discovering collections"
+        )
+        self.collapse_duplicates_check.setChecked(bool(config.get('compare_grid.collapse_duplicates', False)))
+        duplicates_layout.addWidget(self.collapse_duplicates_check)
+        
+        self.duplicate_report_button = QtWidgets.QPushButton("Duplicate Report...")
+        self.duplicate_report_button.clicked.connect(self.show_duplicate_report)
+        duplicates_layout.addWidget(self.duplicate_report_button)
+        
+        collection_layout.addLayout(duplicates_layout)
+        
         layout.addWidget(collection_group)
         
         # Label options
@@ -283,6 +358,20 @@ class CompareGridPanel(QtWidgets.QGroupBox):
         self.layout_combo.addItem("4 rows", (4, 0))
         layout_form.addRow("Layout:", self.layout_combo)
         
+        self.normalize_check = QtWidgets.QCheckBox("Normalize intensity")
+        self.normalize_check.setToolTip(
+            "Match brightness and contrast across samples acquired with different detector settings"
+        )
+        self.normalize_check.setChecked(bool(config.get('compare_grid.normalize_intensity', False)))
+        layout_form.addRow("", self.normalize_check)
+        
+        self.print_size_check = QtWidgets.QCheckBox("Export at print size")
+        self.print_size_check.setToolTip(
+            "Render exported grids at the width of the report page instead of the full image resolution"
+        )
+        self.print_size_check.setChecked(bool(config.get('compare_grid.render_at_print_size', False)))
+        layout_form.addRow("", self.print_size_check)
+        
         layout.addWidget(layout_group)
         
         # FIXED: Changed method name in connect to match class method name
@@ -320,9 +409,11 @@ class CompareGridPanel(QtWidgets.QGroupBox):
         if dialog.exec_() == QtWidgets.QDialog.Accepted:
             selected_sessions = dialog.get_selected_sessions()
             
-            for session_folder in selected_sessions:
-                # Add to workflow
-                if self.workflow.add_session(session_folder):
+            # Add to workflow - sessions are loaded concurrently
+            results = self.workflow.add_sessions(selected_sessions)
+            
+            for session_folder, added in results.items():
+                if added:
                     # Add to list if successful
                     self._add_session_to_list(session_folder)
                 else:
@@ -395,7 +486,39 @@ class CompareGridPanel(QtWidgets.QGroupBox):
         
         try:
             # Discover collections
-            self.workflow.discover_collections()
+            collapse_duplicates = self.collapse_duplicates_check.isChecked()
+            self.workflow.discover_collections(collapse_duplicates=collapse_duplicates)
+            
+            # Ask whether to continue when some sessions have no metadata
+            missing = self.workflow.get_message("missing_metadata")
+            if missing:
+                progress.close()
+                response = QtWidgets.QMessageBox.question(
+                    self,
+                    missing.title,
+                    f"{missing.text}\n\n"
+                    "Would you like to extract metadata for these sessions now?",
+                    QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No,
+                    QtWidgets.QMessageBox.Yes
+                )
+                
+                if response == QtWidgets.QMessageBox.Yes:
+                    # TODO: Implement extracting metadata for these sessions
+                    # For now, just show a message
+                    for session_id in missing.details.get("sessions", []):
+                        QtWidgets.QMessageBox.information(
+                            self,
+                            "Metadata Extraction",
+                            f"Please open session {session_id} in the Standard tab and use "
+                            "Tools → Extract Metadata to process this session."
+                        )
+                    return
+                
+                self.workflow.discover_collections(
+                    allow_missing_metadata=True, collapse_duplicates=collapse_duplicates
+                )
+            
+            show_workflow_messages(self, self.workflow.messages)
             progress.setValue(90)
             
             # Update collections list
@@ -433,7 +556,7 @@ class CompareGridPanel(QtWidgets.QGroupBox):
                 
                 # Check if file exists and set status accordingly
                 status = "OK"
-                if not os.path.exists(img_path):
+                if not path_resolver.exists(img_path):
                     status = "Missing"
                 
                 # Create child item with image details
@@ -465,6 +588,85 @@ class CompareGridPanel(QtWidgets.QGroupBox):
         else:
             self.apply_button.setEnabled(False)
     
+    def _show_collection_menu(self, pos):
+        """
+        Show the context menu for an image in the collection tree.
+        
+        Args:
+            pos: Position where right-click occurred
+        """
+        item = self.collection_tree.itemAt(pos)
+        
+        # Only image items (children of collections) have a menu
+        if item is None or item.parent() is None:
+            return
+        
+        img_data = item.data(0, QtCore.Qt.UserRole)
+        if not img_data or not img_data.get("path"):
+            return
+        
+        menu = QtWidgets.QMenu(self)
+        similar_action = menu.addAction("Find Similar Images...")
+        similar_action.triggered.connect(lambda checked=False, path=img_data["path"]: self.find_similar_images(path))
+        menu.exec_(self.collection_tree.viewport().mapToGlobal(pos))
+    
+    def find_similar_images(self, image_path):
+        """
+        Show the images across all added sessions most similar to an image.
+        
+        Args:
+            image_path (str): Query image path
+        """
+        try:
+            results = self.workflow.find_similar_images(image_path)
+        except Exception as e:
+            logger.exception(f"Error finding similar images: {str(e)}")
+            QtWidgets.QMessageBox.warning(
+                self,
+                "Similarity Search Error",
+                f"Error finding similar images: {str(e)}"
+            )
+            return
+        
+        if not results:
+            QtWidgets.QMessageBox.information(
+                self,
+                "No Similar Images",
+                f"No similar images were found in the other sessions for {os.path.basename(image_path)}."
+            )
+            return
+        
+        dialog = SimilarImagesDialog(image_path, results, self)
+        dialog.exec_()
+    
+    def show_duplicate_report(self):
+        """Find duplicate images across the added sessions and write a report."""
+        if not self.workflow.sessions:
+            QtWidgets.QMessageBox.warning(self, "No Sessions", "Add sessions before checking for duplicates.")
+            return
+        
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            duplicates = self.workflow.find_duplicates()
+            report_path = self.workflow.export_duplicate_report()
+        except Exception as e:
+            logger.exception(f"Error finding duplicate images: {str(e)}")
+            QtWidgets.QMessageBox.warning(
+                self,
+                "Duplicate Search Error",
+                f"Error finding duplicate images: {str(e)}"
+            )
+            return
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        
+        text = (f"Identical copies: {len(duplicates['exact'])} groups\n"
+                f"Near-identical re-acquisitions: {len(duplicates['near'])} groups\n"
+                f"Images that would be collapsed: {len(duplicates['duplicate_of'])}")
+        if report_path:
+            text += f"\n\nReport saved to:\n{report_path}"
+        QtWidgets.QMessageBox.information(self, "Duplicate Images", text)
+    
     def create_grid(self):  # Method name without underscore
         """Create grid visualization for selected collection."""
         current_item = self.collection_tree.currentItem()
@@ -483,7 +685,9 @@ class CompareGridPanel(QtWidgets.QGroupBox):
         font_size = self.font_size_edit.value()
         options = {
             "label_style": label_style,
-            "font_size": font_size
+            "font_size": font_size,
+            "normalize_intensity": self.normalize_check.isChecked(),
+            "print_size": self.print_size_check.isChecked()
         }
         
         # Get layout
@@ -500,10 +704,11 @@ class CompareGridPanel(QtWidgets.QGroupBox):
         # Create grid visualization
         try:
             grid_image = self.workflow.create_grid(collection, layout, options)
+            shown = show_workflow_messages(self, self.workflow.messages)
             if grid_image:
                 # Emit signal with grid image and collection
                 self.grid_created.emit(grid_image, collection)
-            else:
+            elif not shown:
                 QtWidgets.QMessageBox.warning(
                     self,
                     "Grid Creation Error",
@@ -609,7 +814,9 @@ class CompareGridPanel(QtWidgets.QGroupBox):
             font_size = self.font_size_edit.value()
             options = {
                 "label_style": label_style,
-                "font_size": font_size
+                "font_size": font_size,
+                "normalize_intensity": self.normalize_check.isChecked(),
+                "print_size": self.print_size_check.isChecked()
             }
             
             # Get layout
@@ -624,6 +831,7 @@ class CompareGridPanel(QtWidgets.QGroupBox):
                 layout = None
             
             grid_image = self.workflow.create_grid(updated_collection, layout, options)
+            show_workflow_messages(self, self.workflow.messages)
             if grid_image:
                 # Emit signal with grid image and collection
                 self.grid_created.emit(grid_image, updated_collection)
@@ -26,6 +26,7 @@ class GridPreviewPanel(QtWidgets.QGroupBox):
         self.grid_image = None
         self.current_collection = None
         self.zoom_factor = 1.0
+        self.export_in_progress = False
         
         # Initialize UI
         self._init_ui()
@@ -137,8 +138,8 @@ class GridPreviewPanel(QtWidgets.QGroupBox):
             # Generate caption
             self._update_caption()
             
-            # Enable export button
-            self.export_button.setEnabled(True)
+            # Enable export button unless an export is still running
+            self.export_button.setEnabled(not self.export_in_progress)
         else:
             self.clear_preview()
     
@@ -202,6 +203,16 @@ class GridPreviewPanel(QtWidgets.QGroupBox):
         # Disable export button
         self.export_button.setEnabled(False)
     
+    def set_export_in_progress(self, in_progress):
+        """
+        Set whether an export is running, which keeps the export button disabled.
+        
+        Args:
+            in_progress (bool): True while an export is running
+        """
+        self.export_in_progress = in_progress
+        self.export_button.setEnabled(not in_progress and self.grid_image is not None)
+    
     def _update_caption(self):
         """Update the caption preview based on the current collection."""
         if not self.current_collection:
@@ -2,14 +2,13 @@
 Main window UI for SEM Image Workflow Manager.
 """
 
+import copy
 import os
 import sys
 from qtpy import QtWidgets, QtGui, QtCore
 from utils.logger import Logger
 from models.metadata_extractor import MetadataExtractor
-from workflows.mag_grid import MagGridWorkflow
-from workflows.compare_grid import CompareGridWorkflow
-from workflows.mode_grid import ModeGridWorkflow
+from workflows import LazyWorkflows
 from ui.session_panel import SessionPanel
 from ui.workflow_panel import WorkflowPanel
 from ui.grid_preview import GridPreviewPanel
@@ -19,6 +18,47 @@ from ui.mode_grid_panel import ModeGridPanel
 logger = Logger(__name__)
 
 
+class GridExportSignals(QtCore.QObject):
+    """Signals emitted by a GridExportTask."""
+    finished = QtCore.Signal(str, str)  # Image path, caption path
+    failed = QtCore.Signal(str)  # Error message
+
+
+class GridExportTask(QtCore.QRunnable):
+    """
+    Background task that renders a collection at full resolution and exports it.
+    """
+    
+    def __init__(self, workflow, grid_image, collection):
+        """
+        Initialize export task.
+        
+        Args:
+            workflow: Workflow that created the grid
+            grid_image: Preview grid image, exported as-is if the collection cannot be re-rendered
+            collection: Collection to export; the task should own it, since the
+                worker thread writes render settings into it
+        """
+        super().__init__()
+        self.workflow = workflow
+        self.grid_image = grid_image
+        self.collection = collection
+        self.signals = GridExportSignals()
+    
+    def run(self):
+        """Render and export the grid, then report the result through the signals."""
+        try:
+            export_image = self.workflow.render_for_export(self.collection)
+            if export_image is None:
+                export_image = self.grid_image
+            
+            image_path, caption_path = self.workflow.export_grid(export_image, self.collection)
+            self.signals.finished.emit(image_path, caption_path)
+        except Exception as e:
+            logger.error(f"Error exporting grid: {str(e)}")
+            self.signals.failed.emit(str(e))
+
+
 class MainWindow(QtWidgets.QMainWindow):
     """
     Main window for the SEM Image Workflow Manager application.
@@ -34,16 +74,16 @@ class MainWindow(QtWidgets.QMainWindow):
         # Initialize metadata extractor
         self.metadata_extractor = MetadataExtractor()
         
+        # Background grid export in progress and the collection it was requested for
+        self._export_task = None
+        self._export_source = None
+        
         # Create session manager
         from models.session import SessionManager
         self.session_manager = SessionManager()
         
-        # Create workflows
-        self.workflows = {
-            "MagGrid": MagGridWorkflow(self.session_manager),
-            "CompareGrid": CompareGridWorkflow(self.session_manager),
-            "ModeGrid": ModeGridWorkflow(self.session_manager)
-        }
+        # Create workflows - each workflow module is imported on first use
+        self.workflows = LazyWorkflows(self.session_manager)
         
         # Initialize UI components
         self._init_ui()
@@ -358,10 +398,14 @@ class MainWindow(QtWidgets.QMainWindow):
             logger.warning("No metadata available for collection discovery")
             return
         
-        for workflow_name, workflow in self.workflows.items():
+        # Workflows that have not been opened yet discover their collections when first used
+        for workflow_name in self.workflows.keys():
             try:
-                collections = workflow.discover_collections()
-                logger.info(f"Discovered {len(collections)} collections for {workflow_name}")
+                collections = self.workflows.call_or_defer(workflow_name, "discover_collections")
+                if collections is None:
+                    logger.info(f"Deferred collection discovery for {workflow_name}")
+                else:
+                    logger.info(f"Discovered {len(collections)} collections for {workflow_name}")
             except Exception as e:
                 logger.error(f"Error discovering collections for {workflow_name}: {str(e)}")
         
@@ -370,10 +414,18 @@ class MainWindow(QtWidgets.QMainWindow):
     
     def _load_workflow_collections(self):
         """Load existing collections for all workflows."""
-        for workflow_name, workflow in self.workflows.items():
+        # Workflows that have not been opened yet load their collections when first used
+        for workflow_name in self.workflows.keys():
             try:
-                collections = workflow.load_collections()
-                logger.info(f"Loaded {len(collections)} collections for {workflow_name}")
+                collections = self.workflows.call_or_defer(workflow_name, "load_collections")
+                if collections is not None:
+                    logger.info(f"Loaded {len(collections)} collections for {workflow_name}")
+                    continue
+                
+                folder = self.workflows.collection_folder(workflow_name)
+                if folder and os.path.isdir(folder):
+                    count = sum(1 for filename in os.listdir(folder) if filename.endswith(".json"))
+                    logger.info(f"Found {count} saved collections for {workflow_name}")
             except Exception as e:
                 logger.error(f"Error loading collections for {workflow_name}: {str(e)}")
         
@@ -483,6 +535,10 @@ class MainWindow(QtWidgets.QMainWindow):
         if not grid_image or not collection:
             return
         
+        # Only one export at a time; concurrent exports would write the same files
+        if self._export_task is not None:
+            return
+        
         logger.info(f"Export requested signal received: {collection.get('id', 'unknown')}")
         
         # Determine which workflow to use based on collection type
@@ -499,24 +555,77 @@ class MainWindow(QtWidgets.QMainWindow):
         if not workflow:
             return
         
-        # Export the grid visualization
+        # Previews are rendered at screen size, so the grid is re-rendered at full
+        # resolution for export in the background
+        # The export renders a snapshot, as the UI keeps editing the live collection
+        task = GridExportTask(workflow, grid_image, copy.deepcopy(collection))
+        task.signals.finished.connect(self._on_export_finished)
+        task.signals.failed.connect(self._on_export_failed)
+        
+        # Keep a reference until the task's signals have been delivered
+        self._export_task = task
+        self._export_source = collection
+        self.grid_preview.set_export_in_progress(True)
+        self.statusBar().showMessage("Exporting grid...")
+        QtCore.QThreadPool.globalInstance().start(task)
+    
+    def _on_export_finished(self, image_path, caption_path):
+        """Handle a completed background export."""
+        self._store_export_registration(self._export_task, self._export_source)
+        self._export_task = None
+        self._export_source = None
+        self.grid_preview.set_export_in_progress(False)
+        self.statusBar().showMessage(f"Grid exported: {image_path}")
+        
+        QtWidgets.QMessageBox.information(
+            self,
+            "Export Successful",
+            f"Grid exported successfully:\n"
+            f"Image: {os.path.basename(image_path)}\n"
+            f"Caption: {os.path.basename(caption_path)}"
+        )
+    
+    def _store_export_registration(self, task, collection):
+        """
+        Keep a registration computed during an export and save the collection.
+        
+        Export workers render a snapshot and never write collection files, so the
+        collection is saved here, on the UI thread.
+        
+        Args:
+            task (GridExportTask): Finished export task
+            collection (dict): Collection the export was requested for
+        """
+        if task is None or collection is None:
+            return
+        
+        registration = task.collection.get("registration")
+        if not registration or collection.get("registration") == registration:
+            return
+        
+        # The collection may have changed since the export started
+        paths = [img_data.get("path") for img_data in collection.get("images", [])]
+        if registration.get("paths") != paths:
+            return
+        
+        collection["registration"] = registration
         try:
-            image_path, caption_path = workflow.export_grid(grid_image, collection)
-            
-            QtWidgets.QMessageBox.information(
-                self,
-                "Export Successful",
-                f"Grid exported successfully:\n"
-                f"Image: {os.path.basename(image_path)}\n"
-                f"Caption: {os.path.basename(caption_path)}"
-            )
+            task.workflow.save_collection(collection)
         except Exception as e:
-            logger.error(f"Error exporting grid: {str(e)}")
-            QtWidgets.QMessageBox.warning(
-                self,
-                "Export Error",
-                f"Error exporting grid: {str(e)}"
-            )
+            logger.error(f"Error saving collection after export: {str(e)}")
+    
+    def _on_export_failed(self, error):
+        """Handle a failed background export."""
+        self._export_task = None
+        self._export_source = None
+        self.grid_preview.set_export_in_progress(False)
+        self.statusBar().showMessage("Grid export failed")
+        
+        QtWidgets.QMessageBox.warning(
+            self,
+            "Export Error",
+            f"Error exporting grid: {error}"
+        )
     
     def add_comparison_sessions(self):
         """Open dialog to add sessions for comparison."""
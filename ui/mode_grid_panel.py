@@ -7,7 +7,7 @@ import os
 from qtpy import QtWidgets, QtCore, QtGui
 from utils.logger import Logger
 from utils.config import config
-from workflows.mode_grid import ModeGridWorkflow
+from workflows import get_workflow_class
 
 logger = Logger(__name__)
 
@@ -31,13 +31,20 @@ class ModeGridPanel(QtWidgets.QGroupBox):
         super().__init__("ModeGrid Control", parent)
         
         self.session_manager = session_manager
-        self.workflow = ModeGridWorkflow(session_manager)
+        self._workflow = None
         
         # Initialize UI
         self._init_ui()
         
         logger.info("ModeGrid panel initialized")
     
+    @property
+    def workflow(self):
+        """ModeGrid workflow, created the first time the panel uses it."""
+        if self._workflow is None:
+            self._workflow = get_workflow_class("ModeGrid")(self.session_manager)
+        return self._workflow
+    
     def _init_ui(self):
         """Initialize the user interface."""
         layout = QtWidgets.QVBoxLayout(self)
@@ -118,6 +125,21 @@ class ModeGridPanel(QtWidgets.QGroupBox):
         self.layout_combo.addItem("3×3 (3 rows, 3 columns)", (3, 3))
         layout_form.addRow("Layout:", self.layout_combo)
         
+        # Registration option
+        self.register_check = QtWidgets.QCheckBox("Align Modes")
+        self.register_check.setToolTip("Correct drift between modes and crop cells to the common overlap")
+        self.register_check.setChecked(config.get('mode_grid.register_modes', True))
+        layout_form.addRow("", self.register_check)
+        
+        # Output option - side-by-side grid or single false-colour composite
+        self.render_mode_combo = QtWidgets.QComboBox()
+        self.render_mode_combo.addItem("Grid", "grid")
+        self.render_mode_combo.addItem("Colour Composite", "composite")
+        self.render_mode_combo.setToolTip("Combine all modes into one false-colour image")
+        index = self.render_mode_combo.findData(config.get('mode_grid.render_mode', "grid"))
+        self.render_mode_combo.setCurrentIndex(max(0, index))
+        layout_form.addRow("Output:", self.render_mode_combo)
+        
         layout.addWidget(layout_group)
         
         # Apply button
@@ -210,7 +232,10 @@ class ModeGridPanel(QtWidgets.QGroupBox):
             "label_voltage": self.label_voltage_check.isChecked(),
             "label_current": self.label_current_check.isChecked(),
             "label_integrations": self.label_int_check.isChecked(),
-            "label_font_size": self.font_size_spin.value()
+            "label_font_size": self.font_size_spin.value(),
+            "register": self.register_check.isChecked(),
+            "render_mode": self.render_mode_combo.currentData(),
+            "quality": "preview"
         }
         
         # Save options to config
@@ -219,6 +244,8 @@ class ModeGridPanel(QtWidgets.QGroupBox):
         config.set('mode_grid.label_current', options["label_current"])
         config.set('mode_grid.label_integrations', options["label_integrations"])
         config.set('mode_grid.label_font_size', options["label_font_size"])
+        config.set('mode_grid.register_modes', options["register"])
+        config.set('mode_grid.render_mode', options["render_mode"])
         
         # Get layout
         layout = self.layout_combo.currentData()
@@ -255,6 +282,10 @@ class ModeGridPanel(QtWidgets.QGroupBox):
         if not collection or "images" not in collection:
             return
         
+        # A composite has no cells to pick alternatives from
+        if self.render_mode_combo.currentData() == "composite":
+            return
+        
         # Convert position to grid widget coordinates
         global_pos = grid_widget.mapToGlobal(pos)
         
@@ -342,7 +373,10 @@ class ModeGridPanel(QtWidgets.QGroupBox):
                 "label_voltage": self.label_voltage_check.isChecked(),
                 "label_current": self.label_current_check.isChecked(),
                 "label_integrations": self.label_int_check.isChecked(),
-                "label_font_size": self.font_size_spin.value()
+                "label_font_size": self.font_size_spin.value(),
+                "register": self.register_check.isChecked(),
+                "render_mode": self.render_mode_combo.currentData(),
+                "quality": "preview"
             }
             
             # Get layout
@@ -388,28 +422,29 @@ class ModeGridPanel(QtWidgets.QGroupBox):
         image_list.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
         main_layout.addWidget(image_list)
         
-        # Add images to the list
-        for img_path, metadata in self.session_manager.metadata.items():
-            if metadata.is_valid():
-                # Get mode for this image
-                mode = self.workflow._get_mode_from_metadata(metadata)
-                mode_display = self.workflow._get_mode_display_name(metadata)
-                
-                # Get filename
-                filename = os.path.basename(img_path)
-                
-                # Create item text
-                item_text = f"{filename} - {mode_display}"
-                
-                # Create list item
-                item = QtWidgets.QListWidgetItem(item_text)
-                item.setData(QtCore.Qt.UserRole, img_path)
-                
-                # Add icon if possible (could add a thumbnail preview)
-                item.setIcon(QtWidgets.QApplication.style().standardIcon(QtWidgets.QStyle.SP_FileIcon))
-                
-                # Add to list
-                image_list.addItem(item)
+        # Add images to the list, using the indexed modes instead of classifying each image again
+        index = self.workflow.get_metadata_index()
+        file_icon = QtWidgets.QApplication.style().standardIcon(QtWidgets.QStyle.SP_FileIcon)
+        
+        for img_path in index.valid_paths:
+            # Get mode display name for this image
+            mode_display = index.display_name(img_path)
+            
+            # Get filename
+            filename = os.path.basename(img_path)
+            
+            # Create item text
+            item_text = f"{filename} - {mode_display}"
+            
+            # Create list item
+            item = QtWidgets.QListWidgetItem(item_text)
+            item.setData(QtCore.Qt.UserRole, img_path)
+            
+            # Add icon if possible (could add a thumbnail preview)
+            item.setIcon(file_icon)
+            
+            # Add to list
+            image_list.addItem(item)
         
         # Collection ID input
         id_layout = QtWidgets.QHBoxLayout()
@@ -0,0 +1,35 @@
+"""
+Presentation of workflow messages for SEM Image Workflow Manager.
+Shows the WorkflowMessage objects raised by workflow operations as message boxes.
+"""
+
+from qtpy import QtWidgets
+from workflows.workflow_base import WorkflowMessage
+
+
+def show_workflow_messages(parent, messages, skip_codes=()):
+    """
+    Show workflow messages as message boxes, in the order they were raised.
+    
+    Args:
+        parent: Parent widget for the message boxes
+        messages (list): WorkflowMessage objects
+        skip_codes (tuple): Message codes the caller handles itself
+    
+    Returns:
+        int: Number of messages shown
+    """
+    shown = 0
+    for message in messages:
+        if message.code in skip_codes:
+            continue
+        
+        if message.level == WorkflowMessage.ERROR:
+            QtWidgets.QMessageBox.critical(parent, message.title, message.text)
+        elif message.level == WorkflowMessage.WARNING:
+            QtWidgets.QMessageBox.warning(parent, message.title, message.text)
+        else:
+            QtWidgets.QMessageBox.information(parent, message.title, message.text)
+        shown += 1
+    
+    return shown
@@ -23,7 +23,7 @@ class WorkflowPanel(QtWidgets.QGroupBox):
         Initialize workflow panel.
         
         Args:
-            workflows (dict): Dictionary of workflow objects
+            workflows (dict): Workflow objects by name, or a LazyWorkflows collection
         """
         super().__init__("Workflows")
         
@@ -46,8 +46,8 @@ class WorkflowPanel(QtWidgets.QGroupBox):
         workflow_layout.addWidget(workflow_label)
         
         self.workflow_combo = QtWidgets.QComboBox()
-        for name, workflow in self.workflows.items():
-            self.workflow_combo.addItem(workflow.name(), name)
+        for name in self.workflows.keys():
+            self.workflow_combo.addItem(name, name)
         
         self.workflow_combo.currentIndexChanged.connect(self._on_workflow_changed)
         workflow_layout.addWidget(self.workflow_combo)
@@ -44,7 +44,51 @@ class Config:
                 "label_mode": True,
                 "label_voltage": True,
                 "label_current": True,
-                "label_integrations": True
+                "label_integrations": True,
+                "register_modes": True,
+                "registration_proxy_size": 256,
+                "registration_min_confidence": 0.05,
+                "registration_max_shift": 0.25,
+                "render_mode": "grid",
+                "composite_colors": {},
+                "composite_weights": {},
+                "composite_strip_rows": 256
+            },
+            "compare_grid": {
+                "io_workers": 8,
+                "collapse_duplicates": False,
+                "normalize_intensity": False,
+                "intensity_proxy_size": 256,
+                "render_at_print_size": False,
+                "print_width_inches": 6.5,
+                "print_dpi": 300
+            },
+            "similarity": {
+                "compute_at_extraction": True,
+                "max_hash_distance": 24,
+                "max_results": 10,
+                "near_duplicate_distance": 4
+            },
+            "grid_generator": {
+                "decode_workers": 4,
+                "decode_memory_mb": 1024,
+                "preview_max_size": 1600,
+                "stream_export": True,
+                "strip_rows": 256,
+                "window_method": "percentile",
+                "window_percentiles": [0.5, 99.5],
+                "vector_export": ""
+            },
+            "image_cache": {
+                "resample_cache_mb": 256,
+                "cell_cache_mb": 64
+            },
+            "path_resolver": {
+                "ttl_seconds": 30
+            },
+            "project_index": {
+                "enabled": True,
+                "filename": ".sem_project_index.sqlite"
             }
         }
         
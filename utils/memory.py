@@ -0,0 +1,64 @@
+"""
+Memory instrumentation for SEM Image Workflow Manager.
+Reports the peak resident memory of the process for diagnostic logging.
+"""
+
+import sys
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+
+def _peak_rss_windows():
+    """Peak working set of the current process in bytes, from the Win32 API."""
+    import ctypes
+    from ctypes import wintypes
+    
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+    
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    
+    kernel32 = ctypes.windll.kernel32
+    psapi = ctypes.windll.psapi
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+    
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+def peak_rss_mb():
+    """
+    Get the peak resident memory of the process.
+    
+    Returns:
+        float: Peak resident set size in MB, or None if it cannot be measured
+    """
+    try:
+        if sys.platform == "win32":
+            peak = _peak_rss_windows()
+        else:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Linux reports kilobytes, macOS bytes
+            if sys.platform != "darwin":
+                peak *= 1024
+    except Exception as e:
+        logger.debug(f"Could not measure peak memory: {str(e)}")
+        return None
+    
+    return peak / (1024 * 1024) if peak is not None else None
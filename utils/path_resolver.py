@@ -0,0 +1,136 @@
+"""
+Path resolution for SEM Image Workflow Manager.
+Answers file existence checks from cached directory listings, so that checking
+many image paths on a network share costs one listing per folder instead of one
+round trip per path.
+"""
+
+import os
+import time
+import threading
+from utils.logger import Logger
+from utils.config import config
+
+logger = Logger(__name__)
+
+
+class PathResolver:
+    """
+    Existence checks and path repair backed by per-directory listing snapshots.
+    
+    Each directory is listed once with os.scandir and the listing is reused until
+    it is older than the time-to-live.
+    """
+    
+    def __init__(self, ttl=None):
+        """
+        Initialize path resolver.
+        
+        Args:
+            ttl (float, optional): Seconds a directory listing stays valid; defaults
+                to path_resolver.ttl_seconds from config
+        """
+        self._ttl = ttl
+        self._snapshots = {}  # Normalized directory -> (time listed, set of entry names or None)
+        self._lock = threading.Lock()
+    
+    @property
+    def ttl(self):
+        """Seconds a directory listing stays valid."""
+        if self._ttl is not None:
+            return self._ttl
+        return float(config.get('path_resolver.ttl_seconds', 30))
+    
+    @staticmethod
+    def _key(path):
+        """Normalize a path for use as a lookup key (case-insensitive on Windows)."""
+        return os.path.normcase(os.path.normpath(path))
+    
+    def listing(self, folder):
+        """
+        Get the entry names of a directory, listing it if there is no current snapshot.
+        
+        Args:
+            folder (str): Directory path
+        
+        Returns:
+            set: Normalized entry names, or None if the directory does not exist
+        """
+        key = self._key(folder)
+        now = time.monotonic()
+        
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and now - snapshot[0] < self.ttl:
+                return snapshot[1]
+        
+        try:
+            with os.scandir(folder) as entries:
+                names = {os.path.normcase(entry.name) for entry in entries}
+        except (FileNotFoundError, NotADirectoryError):
+            names = None
+        except OSError as e:
+            logger.warning(f"Could not list {folder}: {str(e)}")
+            names = None
+        
+        with self._lock:
+            self._snapshots[key] = (now, names)
+        return names
+    
+    def exists(self, path):
+        """
+        Check whether a file or directory exists, using the listing of its parent.
+        
+        Args:
+            path (str): Path to check
+        
+        Returns:
+            bool: True if the path exists
+        """
+        if not path:
+            return False
+        
+        path = os.path.normpath(path)
+        parent, name = os.path.split(path)
+        if not name:
+            # Filesystem root
+            return os.path.exists(path)
+        
+        names = self.listing(parent or os.curdir)
+        return names is not None and os.path.normcase(name) in names
+    
+    def find(self, filename, folders):
+        """
+        Find the first folder that contains a file.
+        
+        Args:
+            filename (str): File name
+            folders (list): Candidate folders, in order of preference
+        
+        Returns:
+            str: Path to the file, or None if no folder contains it
+        """
+        for folder in folders:
+            if not folder:
+                continue
+            names = self.listing(folder)
+            if names is not None and os.path.normcase(filename) in names:
+                return os.path.join(folder, filename)
+        return None
+    
+    def invalidate(self, folder=None):
+        """
+        Drop cached listings so they are read again on next use.
+        
+        Args:
+            folder (str, optional): Directory to drop; drops all listings if omitted
+        """
+        with self._lock:
+            if folder is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(self._key(folder), None)
+
+
+# Shared resolver
+path_resolver = PathResolver()
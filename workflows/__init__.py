@@ -1,15 +1,186 @@
 """
 Workflow modules for SEM Image Workflow Manager.
+
+Workflows are registered by name and their modules are imported on first use,
+so starting the application does not pay for workflows that are never opened.
 """
 
-# Import workflows to expose them at package level
-from workflows.mag_grid import MagGridWorkflow
-from workflows.compare_grid import CompareGridWorkflow
-from workflows.mode_grid import ModeGridWorkflow
+import importlib
+import os
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+# Registered workflows: name -> (module, class name, description)
+WORKFLOW_REGISTRY = {
+    "MagGrid": (
+        "workflows.mag_grid",
+        "MagGridWorkflow",
+        "Create hierarchical visualizations of the same scene at different magnifications"
+    ),
+    "CompareGrid": (
+        "workflows.compare_grid",
+        "CompareGridWorkflow",
+        "Create grid visualizations for comparing samples across different sessions"
+    ),
+    "ModeGrid": (
+        "workflows.mode_grid",
+        "ModeGridWorkflow",
+        "Compare the same scene with different imaging modes or parameters"
+    )
+}
 
 # Define available workflows
-available_workflows = [
-    "MagGridWorkflow",
-    "CompareGridWorkflow",
-    "ModeGridWorkflow"
-]
\ No newline at end of file
+available_workflows = [class_name for _, class_name, _ in WORKFLOW_REGISTRY.values()]
+
+
+def register_workflow(name, module_name, class_name, description=""):
+    """
+    Register a workflow so it can be created by name.
+    
+    Args:
+        name (str): Workflow name shown in the UI
+        module_name (str): Dotted path of the module defining the workflow
+        class_name (str): Name of the workflow class in the module
+        description (str): Short description shown in the UI
+    """
+    WORKFLOW_REGISTRY[name] = (module_name, class_name, description)
+    if class_name not in available_workflows:
+        available_workflows.append(class_name)
+
+
+def get_workflow_class(name):
+    """
+    Get a registered workflow class, importing its module on first use.
+    
+    Args:
+        name (str): Registered workflow name
+    
+    Returns:
+        type: Workflow class
+    """
+    module_name, class_name, _ = WORKFLOW_REGISTRY[name]
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)
+
+
+def get_workflow_description(name):
+    """
+    Get the description of a registered workflow without importing it.
+    
+    Args:
+        name (str): Registered workflow name
+    
+    Returns:
+        str: Workflow description
+    """
+    return WORKFLOW_REGISTRY[name][2]
+
+
+class LazyWorkflows:
+    """
+    Dictionary-like collection of workflow instances created on first access.
+    """
+    
+    def __init__(self, session_manager, names=None):
+        """
+        Initialize lazy workflow collection.
+        
+        Args:
+            session_manager: Session manager passed to each workflow
+            names (list, optional): Workflow names to expose; defaults to all registered workflows
+        """
+        self.session_manager = session_manager
+        self._names = list(names) if names else list(WORKFLOW_REGISTRY)
+        self._instances = {}
+        self._deferred = {}
+    
+    def __getitem__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+        
+        if name not in self._instances:
+            workflow = get_workflow_class(name)(self.session_manager)
+            self._instances[name] = workflow
+            
+            # Catch up on calls made while the workflow did not exist yet
+            for method_name in self._deferred.pop(name, []):
+                try:
+                    getattr(workflow, method_name)()
+                except Exception as e:
+                    logger.error(f"Error running deferred {method_name} for {name}: {str(e)}")
+        return self._instances[name]
+    
+    def __contains__(self, name):
+        return name in self._names
+    
+    def __iter__(self):
+        return iter(self._names)
+    
+    def __len__(self):
+        return len(self._names)
+    
+    def get(self, name, default=None):
+        """Get a workflow instance by name, creating it if needed."""
+        if name not in self._names:
+            return default
+        return self[name]
+    
+    def keys(self):
+        """Get the workflow names."""
+        return list(self._names)
+    
+    def items(self):
+        """Get (name, workflow) pairs, creating every workflow."""
+        return [(name, self[name]) for name in self._names]
+    
+    def loaded_items(self):
+        """Get (name, workflow) pairs for workflows that have already been created."""
+        return [(name, self._instances[name]) for name in self._names if name in self._instances]
+    
+    def description(self, name):
+        """Get the description of a workflow without creating it."""
+        return get_workflow_description(name)
+    
+    def call_or_defer(self, name, method_name):
+        """
+        Call a workflow method now if the workflow exists, or when it is first created.
+        
+        Args:
+            name (str): Workflow name
+            method_name (str): Name of a workflow method taking no arguments
+        
+        Returns:
+            The method's result, or None if the call was deferred
+        """
+        if name in self._instances:
+            return getattr(self._instances[name], method_name)()
+        
+        deferred = self._deferred.setdefault(name, [])
+        if method_name in deferred:
+            deferred.remove(method_name)
+        deferred.append(method_name)
+        return None
+    
+    def collection_folder(self, name):
+        """
+        Get the folder a workflow saves its collections in, without creating the workflow.
+        
+        Args:
+            name (str): Workflow name
+        
+        Returns:
+            str: Folder path, or None if no session is open
+        """
+        session_folder = getattr(self.session_manager, "session_folder", None)
+        if not session_folder:
+            return None
+        return os.path.join(session_folder, WORKFLOW_REGISTRY[name][1])
+
+
+def __getattr__(name):
+    """Import workflow classes lazily when accessed as package attributes."""
+    for workflow_name, (_, class_name, _) in WORKFLOW_REGISTRY.items():
+        if class_name == name:
+            return get_workflow_class(workflow_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -5,12 +5,11 @@ Creates grid visualizations for comparing samples across different sessions.
 
 import os
 import json
-import pandas as pd
-import numpy as np
-from PIL import Image, ImageDraw, ImageFont
-from qtpy import QtWidgets
+from collections import ChainMap
 from utils.logger import Logger
-from workflows.workflow_base import WorkflowBase, convert_to_serializable
+from utils.config import config
+from workflows.workflow_base import WorkflowBase, WorkflowMessage, convert_to_serializable
+from workflows.grid_generator import GridGenerator, GridCell
 
 logger = Logger(__name__)
 
@@ -21,6 +20,15 @@ class CompareGridWorkflow(WorkflowBase):
     Creates grid visualizations for comparing samples across different sessions.
     """
     
+    # Columns collection discovery reads; session frames are loaded with only these by default
+    DISCOVERY_COLUMNS = (
+        'image_path', 'session_id', 'session_folder', 'sample_id', 'sample_name',
+        'mode', 'high_voltage_kV', 'magnification'
+    )
+    
+    # Low-cardinality string columns stored as pandas categoricals
+    CATEGORICAL_COLUMNS = ('mode', 'session_id', 'sample_id')
+    
     def __init__(self, session_manager):
         """
         Initialize CompareGrid workflow.
@@ -30,8 +38,11 @@ class CompareGridWorkflow(WorkflowBase):
         """
         super().__init__(session_manager)
         self.sessions = {}  # Dictionary of session_folder -> session_info
-        self.all_metadata = {}  # Dictionary of image_path -> metadata
-        self.consolidated_metadata = None  # DataFrame with all metadata
+        self.session_metadata = {}  # Dictionary of session_folder -> {image_path: metadata}
+        self.session_frames = {}  # Dictionary of session_folder -> projected metadata DataFrame, loaded on demand
+        self._consolidated = None  # Column tuple -> concatenation of session_frames, rebuilt after sessions change
+        self._similarity_index = None  # SimilarityIndex over all sessions, built on first query
+        self._duplicates = None  # Duplicate image groups over all sessions, found on first use
         self.main_session_folder = None
         
         # Store the main session if available
@@ -39,11 +50,48 @@ class CompareGridWorkflow(WorkflowBase):
             self.main_session_folder = session_manager.session_folder
             if session_manager.current_session:
                 self.sessions[session_manager.session_folder] = session_manager.current_session
-                self.all_metadata.update(session_manager.metadata)
+                self.session_metadata[session_manager.session_folder] = dict(session_manager.metadata)
                 
         # Call _setup_workflow_folder explicitly to ensure it has the correct path
         self._setup_workflow_folder()
     
+    @property
+    def all_metadata(self):
+        """
+        Read-only view of the metadata of all sessions.
+        
+        Returns:
+            collections.ChainMap: Image path -> metadata across the per-session partitions
+        """
+        return ChainMap(*self.session_metadata.values())
+    
+    @property
+    def consolidated_metadata(self):
+        """
+        Metadata of all sessions as one DataFrame, with every metadata column.
+        
+        Workflow code should call get_metadata_view with the columns it needs instead.
+        
+        Returns:
+            pandas.DataFrame: Consolidated metadata, built on each access
+        """
+        return self._consolidate_metadata(columns=None)
+    
+    def get_metadata_view(self, columns=DISCOVERY_COLUMNS):
+        """
+        Get selected metadata columns of all sessions as one DataFrame.
+        
+        Only the requested columns are loaded, and mode, session_id and sample_id
+        are categorical. Views are cached until sessions change.
+        
+        Args:
+            columns (tuple): Column names; columns missing from a session are filled with NaN
+        
+        Returns:
+            pandas.DataFrame: Consolidated metadata with exactly the requested columns
+        """
+        return self._consolidate_metadata(columns=tuple(columns))
+    
     def _setup_workflow_folder(self):
         """
         Override the workflow folder setup to handle the multi-session nature of CompareGrid.
@@ -83,33 +131,121 @@ class CompareGridWorkflow(WorkflowBase):
         Returns:
             bool: True if successful, False otherwise
         """
-        if session_folder in self.sessions:
-            logger.info(f"Session already added: {session_folder}")
-            return True
+        return self.add_sessions([session_folder]).get(session_folder, False)
+    
+    def add_sessions(self, session_folders):
+        """
+        Add several sessions to the comparison, loading them concurrently.
         
-        try:
-            # Create a temporary session manager to load the session
-            from models.session import SessionManager
-            temp_manager = SessionManager()
+        Sessions are loaded on a thread pool sized for I/O-bound work on network
+        shares (compare_grid.io_workers), and the results are merged into the
+        per-session partitions once all of them have loaded.
+        
+        Args:
+            session_folders (list): Paths to the session folders
             
-            if temp_manager.open_session(session_folder):
-                # Store session info
-                self.sessions[session_folder] = temp_manager.current_session
-                
-                # Copy metadata
-                self.all_metadata.update(temp_manager.metadata)
-                
-                # Reset consolidated metadata so it will be rebuilt
-                self.consolidated_metadata = None
-                
-                logger.info(f"Added session: {session_folder}")
-                return True
-            else:
+        Returns:
+            dict: Session folder -> True if the session was added (or already present), False otherwise
+        """
+        results = {}
+        pending = []
+        for session_folder in session_folders:
+            if session_folder in self.sessions:
+                logger.info(f"Session already added: {session_folder}")
+                results[session_folder] = True
+            elif session_folder not in results:
+                results[session_folder] = False
+                pending.append(session_folder)
+        
+        if not pending:
+            return results
+        
+        # Deferred import - pandas is slow to load, so import it here once rather
+        # than have every worker thread block on the first import
+        import pandas  # noqa: F401
+        from concurrent.futures import ThreadPoolExecutor
+        
+        max_workers = max(1, min(int(config.get('compare_grid.io_workers', 8)), len(pending)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session-loader") as executor:
+            loaded = list(executor.map(self._load_session, pending))
+        
+        # Merge everything once
+        for session_folder, result in zip(pending, loaded):
+            if result is None:
                 logger.error(f"Failed to open session: {session_folder}")
-                return False
+                continue
+            
+            session_info, metadata, frame = result
+            self.sessions[session_folder] = session_info
+            self.session_metadata[session_folder] = metadata
+            if frame is not None:
+                self.session_frames[session_folder] = frame
+            results[session_folder] = True
+            logger.info(f"Added session: {session_folder}")
+        
+        # Only the concatenated view is rebuilt; other sessions' frames are kept
+        self._consolidated = None
+        self._similarity_index = None
+        self._duplicates = None
+        return results
+    
+    def _load_session(self, session_folder):
+        """
+        Load a session's information, metadata and metadata DataFrame without modifying the workflow.
+        
+        Safe to call from worker threads.
+        
+        Args:
+            session_folder: Path to the session folder
+        
+        Returns:
+            tuple: (session_info, metadata dict, DataFrame or None), or None if the session could not be opened
+        """
+        try:
+            # Prefer the project index - it avoids listing the folder and parsing its CSV
+            loaded = self._load_indexed_session(session_folder)
+            if loaded is None:
+                # Create a temporary session manager to load the session
+                from models.session import SessionManager
+                temp_manager = SessionManager()
+                
+                if not temp_manager.open_session(session_folder):
+                    return None
+                loaded = (temp_manager.current_session, temp_manager.metadata, None)
+            
+            session_info, metadata, records = loaded
+            return session_info, metadata, self._load_session_frame(session_folder, session_info, metadata, records)
         except Exception as e:
             logger.error(f"Error adding session: {str(e)}")
-            return False
+            return None
+    
+    def _load_indexed_session(self, session_folder):
+        """
+        Load a session from the project-level metadata index.
+        
+        Args:
+            session_folder: Path to the session folder
+        
+        Returns:
+            tuple: (session_info, metadata dict, indexed records), or None if the session
+                is not available from the index
+        """
+        from models.project_index import get_project_index, records_to_metadata
+        from models.session import SessionInfo
+        
+        if not os.path.isdir(session_folder):
+            return None
+        
+        project_index = get_project_index(session_folder)
+        if project_index is None:
+            return None
+        
+        session_info = SessionInfo(session_folder)
+        if not project_index.update_session(session_folder, session_info):
+            return None
+        
+        records = project_index.get_records([session_folder])
+        return session_info, records_to_metadata(records), records
     
     def remove_session(self, session_folder):
         """
@@ -126,20 +262,15 @@ class CompareGridWorkflow(WorkflowBase):
             return False
         
         try:
-            # Remove session info
+            # Remove session info and its metadata partition
             self.sessions.pop(session_folder)
+            self.session_metadata.pop(session_folder, None)
+            self.session_frames.pop(session_folder, None)
             
-            # Remove metadata for images in this session
-            to_remove = []
-            for img_path in self.all_metadata:
-                if img_path.startswith(session_folder):
-                    to_remove.append(img_path)
-            
-            for img_path in to_remove:
-                self.all_metadata.pop(img_path)
-            
-            # Reset consolidated metadata so it will be rebuilt
-            self.consolidated_metadata = None
+            # Only the concatenated view is rebuilt; other sessions' frames are kept
+            self._consolidated = None
+            self._similarity_index = None
+            self._duplicates = None
             
             logger.info(f"Removed session: {session_folder}")
             return True
@@ -168,79 +299,265 @@ class CompareGridWorkflow(WorkflowBase):
         """
         return self.sessions
     
-    def _consolidate_metadata(self):
+    def find_similar_images(self, image_path, max_results=None, other_sessions_only=True):
+        """
+        Find the images across all added sessions that look most like an image.
+        
+        Uses the perceptual signatures stored at extraction time; signatures of
+        images extracted before they were introduced are computed on first use
+        and written to the project index.
+        
+        Args:
+            image_path (str): Query image path
+            max_results (int, optional): Maximum number of results; defaults to similarity.max_results
+            other_sessions_only (bool): Leave out images from the query image's own session
+        
+        Returns:
+            list: Result dicts with path, session_folder, sample_id, mode, magnification,
+                high_voltage_kV and distance (0 = identical), most similar first
+        """
+        index, session_of = self._get_similarity_index()
+        if image_path not in index:
+            logger.warning(f"No image signature available for: {image_path}")
+            return []
+        
+        if max_results is None:
+            max_results = int(config.get('similarity.max_results', 10))
+        
+        exclude = None
+        query_session = session_of.get(image_path)
+        if other_sessions_only and query_session:
+            exclude = lambda path: session_of.get(path) == query_session
+        
+        matches = index.find_similar(
+            image_path,
+            max_results=max_results,
+            max_hash_distance=int(config.get('similarity.max_hash_distance', 24)),
+            exclude=exclude
+        )
+        
+        results = []
+        for path, distance, _ in matches:
+            session_folder = session_of.get(path)
+            session_info = self.sessions.get(session_folder)
+            metadata = self.session_metadata.get(session_folder, {}).get(path)
+            results.append({
+                "path": path,
+                "session_folder": session_folder,
+                "sample_id": session_info.sample_id if session_info else "Unknown",
+                "mode": metadata.mode if metadata else None,
+                "magnification": metadata.magnification if metadata else None,
+                "high_voltage_kV": metadata.high_voltage_kV if metadata else None,
+                "distance": distance
+            })
+        return results
+    
+    def _get_similarity_index(self):
+        """
+        Get the similarity index over all sessions, building it after sessions change.
+        
+        Returns:
+            tuple: (SimilarityIndex, dict of image path -> session folder)
+        """
+        if self._similarity_index is not None:
+            return self._similarity_index
+        
+        from models.image_hash import SimilarityIndex, SIGNATURE_KEYS, compute_signature
+        
+        index = SimilarityIndex()
+        session_of = {}
+        missing = []
+        for session_folder, metadata in self.session_metadata.items():
+            for img_path, meta in metadata.items():
+                session_of[img_path] = session_folder
+                if not index.add(img_path, meta.additional_params):
+                    missing.append((session_folder, img_path, meta))
+        
+        # Compute signatures of images extracted before signatures were stored
+        if missing:
+            from concurrent.futures import ThreadPoolExecutor
+            
+            def compute(item):
+                try:
+                    return compute_signature(item[1])
+                except Exception as e:
+                    logger.warning(f"Could not compute image signature for {item[1]}: {str(e)}")
+                    return None
+            
+            logger.info(f"Computing image signatures for {len(missing)} images")
+            max_workers = max(1, int(config.get('compare_grid.io_workers', 8)))
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="signature") as executor:
+                signatures = list(executor.map(compute, missing))
+            
+            updated_sessions = set()
+            for (session_folder, img_path, meta), signature in zip(missing, signatures):
+                if signature is None:
+                    continue
+                meta.additional_params.update({key: signature[key] for key in SIGNATURE_KEYS})
+                index.add(img_path, signature)
+                updated_sessions.add(session_folder)
+            
+            # Keep the computed signatures in the project index for next time
+            from models.project_index import get_project_index
+            for session_folder in updated_sessions:
+                project_index = get_project_index(session_folder)
+                if project_index is not None and project_index.is_current(session_folder):
+                    project_index.update_session_metadata(
+                        session_folder, self.session_metadata[session_folder], self.sessions.get(session_folder)
+                    )
+        
+        logger.info(f"Built similarity index over {len(index)} images")
+        self._similarity_index = (index, session_of)
+        return self._similarity_index
+    
+    def find_duplicates(self):
+        """
+        Find duplicate images across all added sessions.
+        
+        Exact duplicates are files with identical contents in any sessions; they
+        are found by grouping files by size and hashing only files that share a
+        size. Near-duplicates are re-acquired frames within one session, at the
+        same mode and voltage, whose pHash and dHash differ by at most
+        similarity.near_duplicate_distance bits; they are found through the hash
+        index. Neither pass compares every image with every other image.
+        
+        Returns:
+            dict: "exact" and "near" lists of image path groups, and "duplicate_of"
+                mapping each duplicate to the image kept in its place (the first
+                image of its group in session order)
+        """
+        if self._duplicates is not None:
+            return self._duplicates
+        
+        from models.duplicates import find_exact_duplicates, group_pairs
+        
+        session_of = {}
+        for session_folder, metadata in self.session_metadata.items():
+            for img_path in metadata:
+                session_of.setdefault(img_path, session_folder)
+        paths = list(session_of)
+        order = {path: index for index, path in enumerate(paths)}
+        
+        exact_groups = find_exact_duplicates(
+            paths, max_workers=int(config.get('compare_grid.io_workers', 8))
+        )
+        
+        # Near-duplicates must come from the same session and acquisition settings
+        def same_acquisition(first, second):
+            session_folder = session_of[first]
+            if session_of[second] != session_folder:
+                return False
+            first_meta = self.session_metadata[session_folder][first]
+            second_meta = self.session_metadata[session_folder][second]
+            return (first_meta.mode == second_meta.mode
+                    and first_meta.high_voltage_kV == second_meta.high_voltage_kV)
+        
+        index, _ = self._get_similarity_index()
+        near_pairs = [
+            pair for pair in index.near_duplicate_pairs(int(config.get('similarity.near_duplicate_distance', 4)))
+            if pair[0] in order and pair[1] in order and same_acquisition(*pair)
+        ]
+        near_groups = group_pairs(near_pairs, order)
+        
+        # Collapse both kinds together so chains of duplicates keep a single image
+        exact_pairs = [(group[0], path) for group in exact_groups for path in group[1:]]
+        duplicate_of = {}
+        for group in group_pairs(exact_pairs + near_pairs, order):
+            for path in group[1:]:
+                duplicate_of[path] = group[0]
+        
+        logger.info(f"Found {len(exact_groups)} exact and {len(near_groups)} near-duplicate groups "
+                    f"({len(duplicate_of)} duplicate images)")
+        self._duplicates = {"exact": exact_groups, "near": near_groups, "duplicate_of": duplicate_of}
+        return self._duplicates
+    
+    def export_duplicate_report(self, output_path=None):
+        """
+        Write the duplicate images found by find_duplicates to a CSV report.
+        
+        Args:
+            output_path (str, optional): Report path; defaults to duplicate_report.csv
+                in the workflow folder
+        
+        Returns:
+            str: Path to the report, or None if it could not be written
+        """
+        import csv
+        
+        duplicates = self.find_duplicates()
+        if output_path is None:
+            if not self.workflow_folder:
+                logger.error("No workflow folder for the duplicate report")
+                return None
+            output_path = os.path.join(self.workflow_folder, "duplicate_report.csv")
+        
+        session_of = {}
+        for session_folder, metadata in self.session_metadata.items():
+            for img_path in metadata:
+                session_of.setdefault(img_path, session_folder)
+        
+        try:
+            with open(output_path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["group", "kind", "image_path", "session_id", "sample_id", "duplicate_of"])
+                group_number = 0
+                for kind in ("exact", "near"):
+                    for group in duplicates[kind]:
+                        group_number += 1
+                        for img_path in group:
+                            session_folder = session_of.get(img_path)
+                            session_info = self.sessions.get(session_folder)
+                            writer.writerow([
+                                group_number,
+                                kind,
+                                img_path,
+                                os.path.basename(session_folder) if session_folder else "",
+                                session_info.sample_id if session_info else "",
+                                duplicates["duplicate_of"].get(img_path, "")
+                            ])
+            logger.info(f"Wrote duplicate report to {output_path}")
+            return output_path
+        except Exception as e:
+            logger.error(f"Error writing duplicate report: {str(e)}")
+            return None
+    
+    def _consolidate_metadata(self, columns=DISCOVERY_COLUMNS):
         """
         Consolidate metadata from all sessions into a single DataFrame.
         
+        Args:
+            columns (tuple, optional): Columns to include; None loads every column
+                without caching the result or the session frames
+        
         Returns:
             pandas.DataFrame: Consolidated metadata
         """
-        if self.consolidated_metadata is not None:
-            return self.consolidated_metadata
+        if columns is not None and self._consolidated is not None and columns in self._consolidated:
+            return self._consolidated[columns]
         
-        # Convert metadata to DataFrames
+        # Deferred import - pandas is slow to load and only needed once sessions are compared
+        import pandas as pd
+        
+        # Load the frames of sessions that do not have the requested columns yet
         session_dfs = []
         
         for session_folder, session_info in self.sessions.items():
-            # Try to load from CSV first (more efficient)
-            session_id = os.path.basename(session_folder)
-            csv_path = os.path.join(session_folder, f"{session_id}_metadata.csv")
-            
-            if not os.path.exists(csv_path):
-                # Try legacy path
-                csv_path = os.path.join(session_folder, "metadata.csv")
-            
-            if os.path.exists(csv_path):
-                try:
-                    # Load the CSV
-                    df = pd.read_csv(csv_path)
-                    
-                    # Add session_id if not present
-                    if 'session_id' not in df.columns:
-                        df['session_id'] = session_id
-                    
-                    # Add session_folder
-                    df['session_folder'] = session_folder
-                    
-                    # Add sample_id and sample_name if available
-                    if session_info:
-                        if not 'sample_id' in df.columns:
-                            df['sample_id'] = session_info.sample_id
-                        if hasattr(session_info, 'sample_name') and not 'sample_name' in df.columns:
-                            df['sample_name'] = session_info.sample_name
-                    
+            if columns is None:
+                df = self._load_session_frame(session_folder, session_info, columns=None)
+                if df is not None:
                     session_dfs.append(df)
-                    logger.info(f"Loaded metadata from CSV for session: {session_id}")
-                    continue
-                except Exception as e:
-                    logger.warning(f"Error loading CSV for session {session_id}: {str(e)}")
-                    # Fall back to metadata from memory
-            
-            # If CSV loading failed, use metadata from memory
-            session_metadata = [m for p, m in self.all_metadata.items() if p.startswith(session_folder)]
+                continue
             
-            if session_metadata:
-                # Convert to dicts
-                metadata_dicts = [m.to_dict() for m in session_metadata]
-                
-                # Create DataFrame
-                df = pd.DataFrame(metadata_dicts)
-                
-                # Add session_id
-                df['session_id'] = session_id
-                
-                # Add session_folder
-                df['session_folder'] = session_folder
-                
-                # Add sample_id and sample_name if available
-                if session_info:
-                    if not 'sample_id' in df.columns:
-                        df['sample_id'] = session_info.sample_id
-                    if hasattr(session_info, 'sample_name') and not 'sample_name' in df.columns:
-                        df['sample_name'] = session_info.sample_name
-                
-                session_dfs.append(df)
-                logger.info(f"Created metadata DataFrame for session: {session_id}")
+            df = self.session_frames.get(session_folder)
+            if df is None or not set(columns) <= set(df.columns):
+                # Keep the columns other views loaded, so frames are not reloaded back and forth
+                frame_columns = tuple(df.columns) if df is not None else ()
+                frame_columns += tuple(column for column in columns if column not in frame_columns)
+                df = self._load_session_frame(session_folder, session_info, columns=frame_columns)
+                if df is None:
+                    continue
+                self.session_frames[session_folder] = df
+            session_dfs.append(df[list(columns)])
         
         if not session_dfs:
             logger.warning("No metadata available for consolidation")
@@ -248,28 +565,192 @@ class CompareGridWorkflow(WorkflowBase):
         
         # Combine all DataFrames
         try:
-            self.consolidated_metadata = pd.concat(session_dfs, ignore_index=True)
-            logger.info(f"Consolidated metadata with {len(self.consolidated_metadata)} entries")
-            return self.consolidated_metadata
+            consolidated = pd.concat(self._unify_categories(session_dfs), ignore_index=True)
+            logger.info(f"Consolidated metadata with {len(consolidated)} entries")
+            if columns is not None:
+                if self._consolidated is None:
+                    self._consolidated = {}
+                self._consolidated[columns] = consolidated
+            return consolidated
         except Exception as e:
             logger.error(f"Error consolidating metadata: {str(e)}")
             return pd.DataFrame()
     
-    def discover_collections(self):
+    def _unify_categories(self, session_dfs):
+        """
+        Give the categorical columns of session frames the same categories so they stay
+        categorical when concatenated (pandas falls back to object columns otherwise).
+        
+        Args:
+            session_dfs (list): Session metadata DataFrames
+        
+        Returns:
+            list: DataFrames with shared categorical dtypes
+        """
+        import pandas as pd
+        from pandas.api.types import union_categoricals
+        
+        for column in self.CATEGORICAL_COLUMNS:
+            parts = [df[column] for df in session_dfs
+                     if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype)]
+            if len(parts) < 2:
+                continue
+            
+            # Sorted categories keep sorting and grouping in alphabetical order
+            dtype = pd.CategoricalDtype(union_categoricals(parts, sort_categories=True).categories)
+            session_dfs = [
+                df.astype({column: dtype}) if column in df.columns else df
+                for df in session_dfs
+            ]
+        return session_dfs
+    
+    def _load_session_frame(self, session_folder, session_info, metadata=None, records=None,
+                            columns=DISCOVERY_COLUMNS):
+        """
+        Load the metadata of one session as a DataFrame.
+        
+        Safe to call from worker threads.
+        
+        Args:
+            session_folder: Path to the session folder
+            session_info: Session info object or None
+            metadata (dict, optional): Session metadata to fall back on; defaults to
+                the session's partition of session_metadata
+            records (list, optional): Records already read from the project index
+            columns (tuple, optional): Columns to load; None loads every column
+        
+        Returns:
+            pandas.DataFrame: Session metadata, or None if none is available
+        """
+        import pandas as pd
+        from models.project_index import get_project_index
+        
+        session_id = os.path.basename(session_folder)
+        wanted = set(columns) if columns is not None else None
+        
+        # Use the project index when the session is indexed and up to date
+        if records is None:
+            project_index = get_project_index(session_folder)
+            if project_index is not None and project_index.is_current(session_folder):
+                records = project_index.get_records([session_folder])
+        
+        if records:
+            record_columns = [column for column in records[0] if wanted is None or column in wanted]
+            df = pd.DataFrame.from_records(records, columns=record_columns)
+            
+            df = self._finish_session_frame(df, session_folder, session_info, columns)
+            logger.info(f"Loaded metadata from project index for session: {session_id}")
+            return df
+        
+        # Otherwise load from CSV (more efficient than converting objects)
+        csv_path = os.path.join(session_folder, f"{session_id}_metadata.csv")
+        
+        if not os.path.exists(csv_path):
+            # Try legacy path
+            csv_path = os.path.join(session_folder, "metadata.csv")
+        
+        if os.path.exists(csv_path):
+            try:
+                # Load the CSV, parsing only the requested columns
+                df = pd.read_csv(csv_path, usecols=(lambda column: column in wanted) if wanted else None)
+                
+                df = self._finish_session_frame(df, session_folder, session_info, columns)
+                logger.info(f"Loaded metadata from CSV for session: {session_id}")
+                return df
+            except Exception as e:
+                logger.warning(f"Error loading CSV for session {session_id}: {str(e)}")
+                # Fall back to metadata from memory
+        
+        # If CSV loading failed, use metadata from memory
+        if metadata is None:
+            metadata = self.session_metadata.get(session_folder, {})
+        session_metadata = list(metadata.values())
+        
+        if not session_metadata:
+            return None
+        
+        # Convert to dicts
+        metadata_dicts = [m.to_dict() for m in session_metadata]
+        
+        # Create DataFrame
+        df = pd.DataFrame(metadata_dicts)
+        
+        df = self._finish_session_frame(df, session_folder, session_info, columns)
+        logger.info(f"Created metadata DataFrame for session: {session_id}")
+        return df
+    
+    def _finish_session_frame(self, df, session_folder, session_info, columns):
+        """
+        Add session columns to a loaded session frame, project it and convert categorical columns.
+        
+        Args:
+            df (pandas.DataFrame): Metadata of one session
+            session_folder: Path to the session folder
+            session_info: Session info object or None
+            columns (tuple): Columns to keep, or None to keep all
+        
+        Returns:
+            pandas.DataFrame: Session frame
+        """
+        self._add_session_columns(df, session_folder, session_info)
+        if columns is not None:
+            df = df.reindex(columns=list(columns))
+        
+        categorical = {column: 'category' for column in self.CATEGORICAL_COLUMNS if column in df.columns}
+        return df.astype(categorical)
+    
+    @staticmethod
+    def _add_session_columns(df, session_folder, session_info):
+        """
+        Add session identification columns to a session's metadata DataFrame.
+        
+        Args:
+            df (pandas.DataFrame): Metadata of one session, modified in place
+            session_folder: Path to the session folder
+            session_info: Session info object or None
+        """
+        # Add session_id if not present
+        if 'session_id' not in df.columns:
+            df['session_id'] = os.path.basename(session_folder)
+        
+        # Add session_folder
+        df['session_folder'] = session_folder
+        
+        # Add sample_id and sample_name if available
+        if session_info:
+            if not 'sample_id' in df.columns:
+                df['sample_id'] = session_info.sample_id
+            if hasattr(session_info, 'sample_name') and not 'sample_name' in df.columns:
+                df['sample_name'] = session_info.sample_name
+    
+    def discover_collections(self, allow_missing_metadata=False, collapse_duplicates=None):
         """
         Discover and create collections based on CompareGrid criteria.
         
+        Problems are reported as WorkflowMessage objects in self.messages rather
+        than dialogs, so discovery can run in worker threads and batch jobs.
+        
+        Args:
+            allow_missing_metadata (bool): Continue with the sessions that have metadata
+                when some do not; otherwise stop with a "missing_metadata" message
+            collapse_duplicates (bool, optional): Leave out images found by find_duplicates,
+                keeping one image per group; defaults to compare_grid.collapse_duplicates
+        
         Returns:
             list: List of collections
         """
+        import numpy as np
+        
         self.collections = []
+        self.messages = []
         
         # Verify we have at least two sessions
         if len(self.sessions) < 2:
-            QtWidgets.QMessageBox.warning(
-                None,
+            self._add_message(
+                WorkflowMessage.WARNING,
                 "Insufficient Sessions",
-                "At least two sessions are required for comparison. Please add more sessions."
+                "At least two sessions are required for comparison. Please add more sessions.",
+                code="insufficient_sessions"
             )
             return self.collections
         
@@ -286,151 +767,99 @@ class CompareGridWorkflow(WorkflowBase):
             if not os.path.exists(metadata_file) and not os.path.exists(legacy_metadata_file):
                 sessions_without_metadata.append(session_id)
         
-        # Alert if metadata is missing
-        if sessions_without_metadata:
+        # Stop if metadata is missing, unless the caller chose to continue without it
+        if sessions_without_metadata and not allow_missing_metadata:
             missing_sessions = "\n".join(sessions_without_metadata)
-            response = QtWidgets.QMessageBox.question(
-                None,
+            self._add_message(
+                WorkflowMessage.WARNING,
                 "Missing Metadata",
-                f"The following sessions are missing metadata:\n{missing_sessions}\n\n"
-                "Would you like to extract metadata for these sessions now?",
-                QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No,
-                QtWidgets.QMessageBox.Yes
+                f"The following sessions are missing metadata:\n{missing_sessions}",
+                code="missing_metadata",
+                sessions=sessions_without_metadata
             )
-            
-            if response == QtWidgets.QMessageBox.Yes:
-                # Extract metadata for each session
-                for session_folder in sessions_without_metadata:
-                    # TODO: Implement extracting metadata for these sessions
-                    # For now, just show a message
-                    QtWidgets.QMessageBox.information(
-                        None,
-                        "Metadata Extraction",
-                        f"Please open session {session_folder} in the Standard tab and use "
-                        "Tools → Extract Metadata to process this session."
-                    )
-                return self.collections
+            return self.collections
         
         logger.info("Starting CompareGrid collection discovery")
         
-        # Consolidate metadata from all sessions
-        df = self._consolidate_metadata()
+        # Consolidate the metadata columns discovery needs from all sessions
+        df = self.get_metadata_view(self.DISCOVERY_COLUMNS)
         
         if df.empty:
-            QtWidgets.QMessageBox.warning(
-                None,
+            self._add_message(
+                WorkflowMessage.WARNING,
                 "No Metadata",
-                "No metadata available for collection discovery."
+                "No metadata available for collection discovery.",
+                code="no_metadata"
             )
             return self.collections
         
-        # Group by mode and high voltage (exact match)
-        mode_voltage_groups = []
+        if collapse_duplicates is None:
+            collapse_duplicates = config.get('compare_grid.collapse_duplicates', False)
+        if collapse_duplicates and 'image_path' in df.columns:
+            duplicate_of = self.find_duplicates()["duplicate_of"]
+            if duplicate_of:
+                df = df[~df['image_path'].isin(list(duplicate_of))]
+                logger.info(f"Left out {len(duplicate_of)} duplicate images from discovery")
+        
+        # Only mode/voltage combinations present in at least two sessions can be compared
+        session_counts = df.groupby(['mode', 'high_voltage_kV'], observed=True)['session_id'].nunique()
+        comparable = set(session_counts[session_counts >= 2].index)
         
-        # Get unique mode/voltage combinations
-        mode_voltage_combinations = df.groupby(['mode', 'high_voltage_kV']).size().reset_index().rename(columns={0: 'count'})
+        # Process each mode/voltage group, sorted by magnification once
+        excluded_columns = ['session_id', 'session_folder', 'mag_diff']
         
-        # For each combination, check if it exists in multiple sessions
-        for _, row in mode_voltage_combinations.iterrows():
-            mode = row['mode']
-            voltage = row['high_voltage_kV']
+        for (mode, voltage), filtered_df in df.groupby(['mode', 'high_voltage_kV'], sort=True, observed=True):
+            if (mode, voltage) not in comparable:
+                continue
             
-            # Filter by this mode and voltage
-            filtered_df = df[(df['mode'] == mode) & (df['high_voltage_kV'] == voltage)]
+            filtered_df = filtered_df[filtered_df['magnification'].notna()]
+            filtered_df = filtered_df.sort_values('magnification', kind='mergesort')
+            sorted_mags = filtered_df['magnification'].to_numpy(dtype=float)
             
-            # Check if this appears in at least 2 sessions
-            session_count = filtered_df['session_id'].nunique()
-            if session_count >= 2:
-                mode_voltage_groups.append({
-                    'mode': mode,
-                    'voltage': voltage,
-                    'data': filtered_df
-                })
-        
-        # Process each mode/voltage group
-        for group in mode_voltage_groups:
-            mode = group['mode']
-            voltage = group['voltage']
-            filtered_df = group['data']
-            
-            # Get all magnifications
-            magnifications = filtered_df['magnification'].dropna().unique().tolist()
-            magnifications.sort()
-            
-            # Group magnifications with 12% tolerance
-            mag_groups = []
-            for mag in magnifications:
-                # Check if this mag fits in an existing group
-                found_group = False
-                for group in mag_groups:
-                    # Check if within 12% of the first mag in group
-                    base_mag = group[0]
-                    if abs(mag - base_mag) / base_mag <= 0.12:  # 12% tolerance
-                        group.append(mag)
-                        found_group = True
-                        break
-                
-                # If not found a group, create a new one
-                if not found_group:
-                    mag_groups.append([mag])
-            
-            # Create collections for each magnification group
-            for mag_group in mag_groups:
-                # Use the median magnification as the representative
-                if len(mag_group) % 2 == 0:  # even number
-                    representative_mag = (mag_group[len(mag_group)//2-1] + mag_group[len(mag_group)//2]) / 2
-                else:  # odd number
-                    representative_mag = mag_group[len(mag_group)//2]
-                
+            # Create collections for each magnification group (12% tolerance)
+            for representative_mag in self._cluster_magnifications(sorted_mags, tolerance=0.12):
                 # Find images within tolerance of the representative magnification
-                mag_min = representative_mag * 0.88  # -12%
-                mag_max = representative_mag * 1.12  # +12%
-                
-                mag_df = filtered_df[(filtered_df['magnification'] >= mag_min) & 
-                                     (filtered_df['magnification'] <= mag_max)]
-                
-                # Group by session
-                session_groups = mag_df.groupby('session_id')
+                start = np.searchsorted(sorted_mags, representative_mag * 0.88, side='left')   # -12%
+                end = np.searchsorted(sorted_mags, representative_mag * 1.12, side='right')    # +12%
+                mag_df = filtered_df.iloc[start:end]
                 
                 # Check if we have images from at least 2 sessions
-                if len(session_groups) < 2:
+                if mag_df['session_id'].nunique() < 2:
                     continue
                 
-                # Find best matching image for each session
-                collection_images = []
+                # Rank images within each session by how close the magnification is to the representative
+                mag_df = mag_df.assign(mag_diff=np.abs(mag_df['magnification'].to_numpy() - representative_mag))
+                mag_df = mag_df.sort_values(['session_id', 'mag_diff'], kind='mergesort')
+                rank = mag_df.groupby('session_id', sort=False, observed=True).cumcount().to_numpy()
                 
-                for session_id, group_df in session_groups:
-                    # Get session folder
-                    session_folder = group_df['session_folder'].iloc[0]
-                    
-                    # Get sample info
-                    sample_id = group_df['sample_id'].iloc[0] if 'sample_id' in group_df else "Unknown"
-                    sample_name = group_df['sample_name'].iloc[0] if 'sample_name' in group_df else ""
-                    
-                    # Sort by how close the magnification is to the representative
-                    group_df['mag_diff'] = abs(group_df['magnification'] - representative_mag)
-                    group_df = group_df.sort_values('mag_diff')
-                    
-                    # Get the best matching image
-                    best_image = group_df.iloc[0]
-                    
-                    # Extract alternative images (up to 4)
-                    alternatives = []
-                    for _, alt_row in group_df.iloc[1:5].iterrows():
-                        if 'image_path' in alt_row and pd.notna(alt_row['image_path']):
-                            alternatives.append(alt_row['image_path'])
+                # The best matching image per session, plus up to 4 alternatives
+                best_df = mag_df[rank == 0]
+                alt_df = mag_df[(rank >= 1) & (rank <= 4)]
+                
+                alternatives_by_session = {}
+                if 'image_path' in alt_df.columns:
+                    alt_df = alt_df[alt_df['image_path'].notna()]
+                    for session_id, alt_path in zip(alt_df['session_id'], alt_df['image_path']):
+                        alternatives_by_session.setdefault(session_id, []).append(alt_path)
+                
+                collection_images = []
+                for best_image in best_df.to_dict('records'):
+                    session_id = best_image['session_id']
                     
-                    # Add to collection images
-                    metadata_dict = {col: best_image[col] for col in best_image.index 
-                                    if col not in ['session_id', 'session_folder', 'mag_diff']}
+                    # Add to collection images, with the full metadata of the image
+                    metadata_dict = {col: value for col, value in best_image.items()
+                                     if col not in excluded_columns}
+                    meta = self.session_metadata.get(best_image['session_folder'], {}).get(best_image['image_path'])
+                    if meta is not None:
+                        metadata_dict.update(meta.to_dict())
                     
                     collection_images.append({
                         "path": best_image['image_path'],
                         "metadata_dict": metadata_dict,
-                        "session_folder": session_folder,
-                        "sample_id": sample_id,
-                        "sample_name": sample_name,
-                        "alternatives": alternatives
+                        "session_folder": best_image['session_folder'],
+                        "sample_id": best_image.get('sample_id', "Unknown"),
+                        "sample_name": best_image.get('sample_name', ""),
+                        "alternatives": alternatives_by_session.get(session_id, [])
                     })
                 
                 # Create collection
@@ -453,20 +882,55 @@ class CompareGridWorkflow(WorkflowBase):
                 logger.info(f"Found CompareGrid collection with {len(collection_images)} samples: {collection['description']}")
         
         if not self.collections:
-            QtWidgets.QMessageBox.information(
-                None,
+            self._add_message(
+                WorkflowMessage.INFO,
                 "No Collections Found",
                 "No comparable collections were found across the selected sessions.\n\n"
                 "Comparable collections require images with:\n"
                 "- Same detector mode\n"
                 "- Same high voltage\n"
                 "- Similar magnification (within 12%)\n\n"
-                "Make sure metadata has been extracted for all sessions."
+                "Make sure metadata has been extracted for all sessions.",
+                code="no_collections"
             )
         
         logger.info(f"Discovered {len(self.collections)} CompareGrid collections")
         return self.collections
     
+    @staticmethod
+    def _cluster_magnifications(sorted_mags, tolerance=0.12):
+        """
+        Group sorted magnifications into clusters and return their representatives.
+        
+        Each cluster starts at the smallest magnification not yet clustered and takes
+        every distinct magnification within the tolerance above it. Clusters are
+        found with one binary search each in log-magnification space.
+        
+        Args:
+            sorted_mags (numpy.ndarray): Magnifications sorted in ascending order
+            tolerance (float): Relative tolerance of a cluster
+        
+        Returns:
+            list: Median of the distinct magnifications in each cluster
+        """
+        import numpy as np
+        
+        unique_mags = np.unique(sorted_mags[sorted_mags > 0])
+        if unique_mags.size == 0:
+            return []
+        
+        log_mags = np.log(unique_mags)
+        log_tolerance = np.log1p(tolerance)
+        
+        representatives = []
+        start = 0
+        while start < unique_mags.size:
+            end = int(np.searchsorted(log_mags, log_mags[start] + log_tolerance, side='right'))
+            representatives.append(float(np.median(unique_mags[start:end])))
+            start = end
+        
+        return representatives
+    
     def create_grid(self, collection, layout=None, options=None):
         """
         Create a grid visualization for the CompareGrid collection.
@@ -474,11 +938,19 @@ class CompareGridWorkflow(WorkflowBase):
         Args:
             collection: CompareGrid collection to visualize
             layout (tuple, optional): Grid layout as (rows, columns)
-            options (dict, optional): Annotation options
+            options (dict, optional): Annotation and render options; "normalize_intensity"
+                matches the intensity distributions of the images (defaults to
+                compare_grid.normalize_intensity), "quality" is "preview" (default) or
+                "export", and "target_size" bounds the size of the rendered image as
+                (width, height). "print_size" renders the grid at the width of the
+                document it is meant for (compare_grid.print_width_inches at "dpi"
+                dots per inch) instead of the native image resolution
             
         Returns:
             PIL.Image: Grid visualization image
         """
+        self.messages = []
+        
         if not collection or "images" not in collection or len(collection["images"]) < 2:
             logger.error("Invalid collection for CompareGrid visualization")
             return None
@@ -504,118 +976,98 @@ class CompareGridWorkflow(WorkflowBase):
         rows, cols = layout
         logger.info(f"Creating CompareGrid with layout {rows}x{cols} for {num_images} samples")
         
-        # Load all images with improved error handling
-        pil_images = []
+        # Previews are rendered at screen size; export re-renders the same settings at full size
+        quality = options.get("quality", "preview")
+        self._store_render_settings(collection, layout, options)
+        
+        # Output is intended for a document of this width; labels are sized for it
+        print_dpi = int(options.get("dpi", config.get('compare_grid.print_dpi', 300)))
+        target_width_pixels = float(config.get('compare_grid.print_width_inches', 6.5)) * print_dpi
+        
+        # Rendering at print size decodes each image straight to its final cell size and
+        # builds only the canvas the document needs
+        print_size = options.get("print_size", config.get('compare_grid.render_at_print_size', False))
+        target_size = options.get("target_size")
+        if target_size is None and print_size:
+            target_size = (round(target_width_pixels), None)
+        
+        # Spacing between images and the label band above each image
+        spacing = 30
+        label_height = 30
+        generator = GridGenerator(spacing=spacing, header_height=label_height, quality=quality,
+                                  target_size=target_size, stream=options.get("stream", False))
+        
+        # Load all images, keeping each with its collection entry
+        loaded = []
         missing_images = []
         
-        for img_data in images_data:
-            try:
-                img_path = img_data.get("path", "")
-                
-                if not img_path:
-                    logger.error("Image path is missing in collection data")
-                    missing_images.append("Unknown path")
-                    continue
-                
-                # Verify the file exists
-                if not os.path.exists(img_path):
-                    logger.error(f"Image file does not exist: {img_path}")
-                    missing_images.append(os.path.basename(img_path))
-                    continue
-                
-                # Try to open the image
-                img = Image.open(img_path)
-                pil_images.append(img)
-                logger.info(f"Successfully loaded image: {img_path}")
-            except Exception as e:
-                logger.error(f"Error loading image {img_data.get('path', 'Unknown')}: {str(e)}")
-                if 'path' in img_data:
-                    missing_images.append(os.path.basename(img_data["path"]))
-                else:
-                    missing_images.append("Unknown path")
+        paths = [img_data.get("path", "") for img_data in images_data]
+        for img_data, img in zip(images_data, generator.open_images(paths)):
+            if img is None:
+                missing_images.append(os.path.basename(img_data["path"]) if img_data.get("path") else "Unknown path")
+                continue
+            loaded.append((img_data, img))
+            logger.info(f"Successfully loaded image: {img_data['path']}")
         
         # If no images could be loaded, show detailed error and return
-        if not pil_images:
+        if not loaded:
             error_msg = "Failed to load any images. Please check that all image files exist."
             if missing_images:
                 error_msg += f"\nMissing images: {', '.join(missing_images)}"
-            logger.error(error_msg)
-            QtWidgets.QMessageBox.critical(None, "Image Loading Error", error_msg)
+            self._add_message(
+                WorkflowMessage.ERROR, "Image Loading Error", error_msg,
+                code="images_missing", missing=missing_images
+            )
             return None
             
         # If some images are missing, warn but continue with available ones
-        if missing_images and len(pil_images) < len(images_data):
+        if missing_images:
             warn_msg = f"Some images could not be loaded ({len(missing_images)} missing).\nThe grid will be created with available images only."
-            logger.warning(warn_msg)
-            QtWidgets.QMessageBox.warning(None, "Partial Image Loading", warn_msg)
+            self._add_message(
+                WorkflowMessage.WARNING, "Partial Image Loading", warn_msg,
+                code="partial_images", missing=missing_images
+            )
         
-        # Determine the size of grid cells (use the max width and height)
-        cell_width = max(img.width for img in pil_images)
-        cell_height = max(img.height for img in pil_images)
+        pil_images = [img for _, img in loaded]
         
-        # Create a blank grid image with spacing
-        spacing = 30  # Increased spacing between images to accommodate larger labels
+        # Window 16-bit and float images to 8 bits as they are drawn
+        from workflows.windowing import apply_window, window_settings
+        windows = [window_settings(options, img_data.get("metadata_dict")) for img_data, _ in loaded]
         
-        # Additional space for labels at the top of each image
-        label_height = 30  # Increased label height for larger text
+        # Match brightness and contrast across samples acquired with different settings
+        if options.get("normalize_intensity", config.get('compare_grid.normalize_intensity', False)):
+            from workflows.intensity import match_intensities
+            pil_images = match_intensities(
+                [apply_window(img, img_data["path"], window) for (img_data, img), window in zip(loaded, windows)],
+                max_size=int(config.get('compare_grid.intensity_proxy_size', 256))
+            )
         
-        grid_width = cols * cell_width + (cols - 1) * spacing
-        grid_height = rows * (cell_height + label_height) + (rows - 1) * spacing
-        grid_img = Image.new('RGB', (grid_width, grid_height), color='white')
+        # Determine the size of grid cells (use the max width and height)
+        cell_width = max(img.width for img in pil_images)
+        cell_height = max(img.height for img in pil_images)
+        cell_size = (cell_width, cell_height)
         
-        # Place images in the grid
-        draw = ImageDraw.Draw(grid_img)
+        # Get custom font size in points from options or use default
+        base_font_size = options.get("font_size", 16)
+        # Size labels in grid pixels so they print at that size once the grid is
+        # scaled to the print width
+        font_scale = generator.grid_size(layout, cell_size)[0] / target_width_pixels
+        font_size = max(int(base_font_size * print_dpi / 72 * font_scale), 8)  # Allow smaller minimum size
+        logger.info(f"Using user-specified font size: {base_font_size}, adjusted to: {font_size}")
         
-        try:
-            # Get custom font size from options or use default
-            base_font_size = options.get("font_size", 16)
-            # Scale based on grid width (approximate for 6.5 inch document)
-            target_doc_width_inches = 6.5
-            pixels_per_inch = 300  # Typical print resolution
-            target_width_pixels = target_doc_width_inches * pixels_per_inch
-            font_scale = grid_width / target_width_pixels
-            adjusted_font_size = max(int(base_font_size / font_scale), 8)  # Allow smaller minimum size
-            logger.info(f"Using user-specified font size: {base_font_size}, adjusted to: {adjusted_font_size}")
-            
-            # Try to load the font
-            try:
-                font = ImageFont.truetype("arial.ttf", adjusted_font_size)
-            except IOError:
-                try:
-                    # Try system font locations
-                    import sys
-                    if sys.platform == "win32":
-                        font = ImageFont.truetype("C:\\Windows\\Fonts\\arial.ttf", adjusted_font_size)
-                    elif sys.platform == "darwin":  # macOS
-                        font = ImageFont.truetype("/Library/Fonts/Arial.ttf", adjusted_font_size)
-                    else:  # Linux
-                        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", adjusted_font_size)
-                except:
-                    # Fallback to default font
-                    font = ImageFont.load_default()
-                    logger.warning(f"Could not load Arial font, using default font")
-        except Exception as e:
-            # Fallback to default font if any error
-            font = ImageFont.load_default()
-            logger.warning(f"Error setting up font: {str(e)}")
+        # Make room for larger labels above the images
+        label_height = max(label_height, round(font_size * 1.5))
+        generator.header_height = label_height
         
-        logger.info(f"Using font size: {adjusted_font_size}")
+        # Keep corner labels clear of the image edges
+        corner_margin = max(25, font_size + 15)
         
-        # Place images and add labels
-        for i, (img_data, img) in enumerate(zip(images_data, pil_images)):
-            row = i // cols
-            col = i % cols
-            
-            # Calculate position (including space for label)
-            x = col * (cell_width + spacing)
-            y = row * (cell_height + label_height + spacing) + label_height
-            
-            # Center the image in its cell
-            x_offset = (cell_width - img.width) // 2
-            y_offset = (cell_height - img.height) // 2
-            
-            # Paste the image
-            grid_img.paste(img, (x + x_offset, y + y_offset))
+        # Describe labels as overlays in cell coordinates
+        cells = []
+        for (img_data, original), img, window in zip(loaded, pil_images, windows):
+            # Normalized images no longer match their files, so they are not resampled from disk
+            cell = GridCell(img, path=img_data["path"] if img is original else None, window=window)
+            x_offset, y_offset = cell.image_offset(cell_size)
             
             # Add sample ID/name label
             sample_id = img_data.get("sample_id", "Unknown")
@@ -631,60 +1083,52 @@ class CompareGridWorkflow(WorkflowBase):
                 label_text = f"{sample_id}: {sample_name}"
             
             # Center the label both horizontally and vertically in the white space above the image
-            label_x = x + (cell_width // 2)
-            
-            # Calculate text dimensions to center vertically
-            text_width = draw.textlength(label_text, font=font)
-            
-            # Use textbbox to get text dimensions (compatible with newer Pillow)
-            text_bbox = draw.textbbox((0, 0), label_text, font=font)
+            text_width = generator.text_length(label_text, font_size)
+            text_bbox = generator.text_bbox(label_text, font_size)
             text_height = text_bbox[3] - text_bbox[1]
             
-            # Position in the middle of the label area
-            label_y = y - label_height + ((label_height - text_height) // 2)
-            
-            # Draw the label text with center alignment
-            draw.text(
-                (label_x - (text_width // 2), label_y),
-                label_text,
-                fill=(0, 0, 0),
-                font=font
-            )
+            cell.overlays.append({
+                "type": "text",
+                "text": label_text,
+                "position": (cell_width // 2 - (text_width // 2),
+                             -label_height + ((label_height - text_height) // 2)),
+                "color": (0, 0, 0),
+                "font_size": font_size
+            })
             
             # Add magnification label at the bottom left corner of each image
             mag = img_data["metadata_dict"]["magnification"]
             mag_label = f"{mag}x"
+            mag_x = x_offset + 10
+            mag_y = y_offset + img.height - corner_margin  # Increased spacing
             
-            # Draw magnification with improved visibility
-            mag_x = x + x_offset + 10
-            mag_y = y + y_offset + img.height - 25  # Increased spacing
-            
-            # Draw shadow/outline for better visibility
+            # Shadow/outline for better visibility, then the main text
             for offset in [(1,1), (-1,-1), (1,-1), (-1,1)]:
-                draw.text(
-                    (mag_x + offset[0], mag_y + offset[1]),
-                    mag_label,
-                    fill=(0, 0, 0),
-                    font=font
-                )
-            
-            # Draw the main text
-            draw.text(
-                (mag_x, mag_y),
-                mag_label,
-                fill=(255, 255, 255),
-                font=font
-            )
+                cell.overlays.append({
+                    "type": "text", "text": mag_label, "position": (mag_x + offset[0], mag_y + offset[1]),
+                    "color": (0, 0, 0), "font_size": font_size
+                })
+            cell.overlays.append({
+                "type": "text", "text": mag_label, "position": (mag_x, mag_y),
+                "color": (255, 255, 255), "font_size": font_size
+            })
             
             # If this image has alternatives, add a small indicator
             if img_data.get("alternatives"):
-                alt_indicator = "▼"  # Down triangle indicator for alternatives
-                draw.text(
-                    (x + cell_width - 25, y - label_height + 5),
-                    alt_indicator,
-                    fill=(0, 120, 215),  # Blue color
-                    font=font
-                )
+                cell.overlays.append({
+                    "type": "text",
+                    "text": "▼",  # Down triangle indicator for alternatives
+                    "position": (cell_width - corner_margin, -label_height + 5),
+                    "color": (0, 120, 215),  # Blue color
+                    "font_size": font_size
+                })
+            
+            cells.append(cell)
+        
+        grid_img = generator.render(cells, layout, cell_size)
+        
+        if print_size and quality == "export":
+            grid_img.info["dpi"] = (print_dpi, print_dpi)
         
         logger.info(f"Created CompareGrid visualization with {num_images} samples")
         return grid_img
@@ -732,6 +1176,9 @@ class CompareGridWorkflow(WorkflowBase):
                     common_parent = common_parent[:-1]
                 logger.info(f"Found common parent directory: {common_parent}")
         
+        # Existence checks are answered from cached directory listings
+        from utils.path_resolver import path_resolver
+        
         # Check each image entry
         for img_data in collection["images"]:
             # Make sure all necessary fields are present
@@ -751,33 +1198,35 @@ class CompareGridWorkflow(WorkflowBase):
                 img_data["path"] = img_path
             
             # Check if file exists and try to fix if not
-            if not os.path.exists(img_path):
+            file_exists = path_resolver.exists(img_path)
+            if not file_exists:
                 # Try to locate the file in the session folder
-                if session_folder and os.path.exists(session_folder):
-                    potential_path = os.path.join(session_folder, filename)
-                    if os.path.exists(potential_path):
-                        logger.info(f"Fixed path for {filename}: {potential_path}")
-                        img_path = potential_path
-                        img_data["path"] = img_path
+                potential_path = path_resolver.find(filename, [session_folder])
+                if potential_path:
+                    logger.info(f"Fixed path for {filename}: {potential_path}")
+                    img_path = potential_path
+                    img_data["path"] = img_path
+                    file_exists = True
                 
                 # If common parent is found, try to reconstruct path relative to it
-                if common_parent and not os.path.exists(img_path):
+                if common_parent and not file_exists:
                     # Get session name from session folder path
                     session_name = os.path.basename(session_folder)
                     
                     # Try to reconstruct path based on common parent and session name
-                    potential_path = os.path.join(common_parent, session_name, filename)
-                    if os.path.exists(potential_path):
+                    new_session_folder = os.path.join(common_parent, session_name)
+                    potential_path = path_resolver.find(filename, [new_session_folder])
+                    if potential_path:
                         logger.info(f"Fixed path for {filename} using common parent: {potential_path}")
                         img_path = potential_path
                         img_data["path"] = img_path
+                        file_exists = True
                         
                         # Update session folder to be consistent
-                        new_session_folder = os.path.join(common_parent, session_name)
                         img_data["session_folder"] = new_session_folder
             
             # Store the file existence status and path information
-            img_data["file_exists"] = os.path.exists(img_path)
+            img_data["file_exists"] = file_exists
             img_data["filename"] = filename
             img_data["parent_dir"] = os.path.dirname(img_path)
             
@@ -816,8 +1265,9 @@ class CompareGridWorkflow(WorkflowBase):
             from models.metadata_extractor import MetadataExtractor
             extractor = MetadataExtractor()
             
-            # Extract metadata for the alternative image
-            alt_metadata = extractor.extract_metadata(alternative_path)
+            # Extract metadata for the alternative image; the signature is left out to
+            # keep the switch fast, as similarity search computes missing ones itself
+            alt_metadata = extractor.extract_metadata(alternative_path, compute_signature=False)
             
             if not alt_metadata:
                 logger.error(f"Failed to extract metadata for alternative image: {alternative_path}")
@@ -966,7 +1416,10 @@ class CompareGridWorkflow(WorkflowBase):
             
             # Save the grid image
             logger.info(f"Saving grid image to: {image_path}")
-            grid_image.save(image_path, format="PNG")
+            grid_image.save(image_path, format="PNG", dpi=grid_image.info.get("dpi"))
+            
+            # Optional SVG or PDF copy with vector annotations
+            self.export_vector(collection, image_path, grid_image)
             
             # Create a caption file
             logger.info(f"Saving caption to: {caption_path}")
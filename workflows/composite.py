@@ -0,0 +1,146 @@
+"""
+Colour composite rendering for SEM Image Workflow Manager.
+Combines several grayscale or RGB images of the same scene into one false-colour image.
+"""
+
+import numpy as np
+from PIL import Image
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+# Default false colours by base mode; ChemSEM images keep their own colours
+DEFAULT_CHANNEL_COLORS = {
+    "sed": (255, 255, 255),
+    "bsd": (255, 0, 0),
+    "topo": (0, 255, 0),
+    "topo-h": (0, 255, 0),
+    "topo-v": (0, 0, 255),
+    "edx": (255, 0, 255)
+}
+
+
+def build_channel_lut(color, weight=1.0, gamma=1.0):
+    """
+    Build a lookup table mapping 8-bit intensities to weighted RGB contributions.
+    
+    Args:
+        color (tuple): Channel colour as (r, g, b) in the range 0-255
+        weight (float): Weight applied to the channel
+        gamma (float): Gamma applied to the normalized intensity before colouring
+    
+    Returns:
+        numpy.ndarray: (256, 3) uint16 lookup table
+    """
+    levels = np.linspace(0.0, 1.0, 256)
+    if gamma != 1.0:
+        levels = levels ** (1.0 / gamma)
+    
+    lut = np.outer(levels, np.asarray(color, dtype=np.float64) * weight)
+    return np.clip(np.rint(lut), 0, 255).astype(np.uint16)
+
+
+class CompositeAccumulator:
+    """
+    Accumulates channel contributions into an RGB composite one channel at a time.
+    
+    Only the planar uint16 accumulator and the current channel are held in memory,
+    and lookups are applied in row strips to bound the size of temporary arrays.
+    """
+    
+    def __init__(self, width, height, strip_rows=256):
+        """
+        Initialize composite accumulator.
+        
+        Args:
+            width (int): Width of the composite in pixels
+            height (int): Height of the composite in pixels
+            strip_rows (int): Number of rows processed per lookup
+        """
+        self.width = width
+        self.height = height
+        self.strip_rows = max(1, int(strip_rows))
+        self._accumulator = np.zeros((3, height, width), dtype=np.uint16)
+        self._peak = np.zeros(3, dtype=np.uint32)
+    
+    def add(self, band, lut):
+        """
+        Add one band to the composite through its lookup table.
+        
+        Args:
+            band (numpy.ndarray): 2D uint8 array of shape (height, width)
+            lut (numpy.ndarray): (256, 3) uint16 lookup table from build_channel_lut
+        """
+        if band.shape != (self.height, self.width):
+            raise ValueError(f"Band shape {band.shape} does not match composite size {(self.height, self.width)}")
+        
+        # Accumulate per colour plane, skipping colours the channel does not contribute to
+        for component in range(3):
+            component_lut = lut[:, component]
+            if not component_lut.any():
+                continue
+            
+            plane = self._accumulator[component]
+            for top in range(0, self.height, self.strip_rows):
+                bottom = min(top + self.strip_rows, self.height)
+                plane[top:bottom] += component_lut[band[top:bottom]]
+        
+        # Track the largest possible value per colour so the result can be normalized
+        self._peak += lut[-1]
+    
+    def add_image(self, img, lut):
+        """
+        Add a PIL image to the composite as a single channel.
+        
+        Args:
+            img (PIL.Image): Image of the composite size; converted to grayscale if needed
+            lut (numpy.ndarray): (256, 3) uint16 lookup table from build_channel_lut
+        """
+        if img.mode != 'L':
+            img = img.convert('L')
+        self.add(np.asarray(img), lut)
+    
+    def add_rgb_image(self, img, weight=1.0):
+        """
+        Add a colour image to the composite, keeping its own colours.
+        
+        Args:
+            img (PIL.Image): Image of the composite size
+            weight (float): Weight applied to the image
+        """
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        for band_index, band in enumerate(img.split()):
+            color = [0, 0, 0]
+            color[band_index] = 255
+            self.add(np.asarray(band), build_channel_lut(color, weight))
+    
+    def to_image(self, normalize=True):
+        """
+        Convert the accumulated channels to an 8-bit RGB image.
+        
+        Args:
+            normalize (bool): Scale colours whose combined peak exceeds 255 back
+                into range instead of clipping them
+        
+        Returns:
+            PIL.Image: Composite image
+        """
+        scale = np.ones(3, dtype=np.float32)
+        if normalize:
+            over = self._peak > 255
+            scale[over] = 255.0 / self._peak[over]
+        
+        planes = []
+        for component in range(3):
+            plane = np.empty((self.height, self.width), dtype=np.uint8)
+            for top in range(0, self.height, self.strip_rows):
+                bottom = min(top + self.strip_rows, self.height)
+                strip = self._accumulator[component, top:bottom]
+                if scale[component] < 1.0:
+                    strip = strip * scale[component]
+                plane[top:bottom] = np.minimum(strip, 255)
+            planes.append(Image.fromarray(plane, 'L'))
+        
+        return Image.merge('RGB', planes)
@@ -1,315 +1,1069 @@
 """
-Grid visualization generator for SEM Image Workflow Manager.
-Handles image layout and processing for grid visualizations.
+Grid rendering engine for SEM Image Workflow Manager.
+Lays out image cells on a canvas and draws their overlays. The MagGrid,
+CompareGrid and ModeGrid workflows describe their grids as cells with overlays
+and leave image loading, fitting, font loading and drawing to this module.
 """
 
+import os
+import sys
+import time
+import threading
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 from utils.logger import Logger
+from utils.config import config
 
 logger = Logger(__name__)
 
+# Extra rows composed above and below each streamed strip. Shapes are clipped at
+# the edges of the canvas they are drawn on, which can change their outline, so
+# strips are drawn on a taller canvas and cropped well away from its edges.
+STRIP_MARGIN = 16
+
+
+# Family of the label font used by all workflows
+DEFAULT_FONT_FAMILY = "sans"
+
+
+def _font_candidates():
+    """Font files tried in order before falling back to PIL's built-in font."""
+    candidates = ["arial.ttf"]
+    if sys.platform == "win32":
+        candidates.append("C:\\Windows\\Fonts\\arial.ttf")
+    elif sys.platform == "darwin":  # macOS
+        candidates.append("/Library/Fonts/Arial.ttf")
+    else:  # Linux
+        candidates.append("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+    return candidates
+
+
+# Font files tried per family; other family names are used as font files directly
+FONT_FAMILIES = {DEFAULT_FONT_FAMILY: _font_candidates()}
+
+# Process-wide font caches shared by all workflows
+_font_lock = threading.Lock()
+_font_files = {}  # Family -> resolved font file, or None for PIL's built-in font
+_fonts = {}  # (family, size) -> font
+
+# Drawing context used only to measure text
+_measure = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
+
+def find_font_file(family=DEFAULT_FONT_FAMILY):
+    """
+    Find the font file of a family, trying its candidates once per process.
+    
+    Args:
+        family (str): Font family name or font file
+    
+    Returns:
+        str: Font file that loaded, or None to use PIL's built-in font
+    """
+    with _font_lock:
+        if family in _font_files:
+            return _font_files[family]
+    
+    font_file = None
+    for candidate in FONT_FAMILIES.get(family, [family]):
+        try:
+            ImageFont.truetype(candidate, 10)
+            font_file = candidate
+            break
+        except IOError:
+            continue
+    
+    if font_file is None:
+        logger.warning(f"Could not load font {family}, using default font")
+    
+    with _font_lock:
+        _font_files.setdefault(family, font_file)
+        return _font_files[family]
+
+
+def load_font(font_size, family=DEFAULT_FONT_FAMILY):
+    """
+    Get a font with the given size, falling back to the default font.
+    
+    Fonts are loaded once per process and shared by all grids.
+    
+    Args:
+        font_size (int): Font size in points
+        family (str): Font family name or font file
+    
+    Returns:
+        PIL.ImageFont: Loaded font
+    """
+    key = (family, font_size)
+    with _font_lock:
+        font = _fonts.get(key)
+    if font is not None:
+        return font
+    
+    font_file = find_font_file(family)
+    font = ImageFont.truetype(font_file, font_size) if font_file else ImageFont.load_default()
+    
+    with _font_lock:
+        return _fonts.setdefault(key, font)
+
+
+@lru_cache(maxsize=4096)
+def text_metrics(text, font_size, family=DEFAULT_FONT_FAMILY):
+    """
+    Measure a text once per process.
+    
+    Args:
+        text (str): Text to measure
+        font_size (int): Font size in points
+        family (str): Font family name or font file
+    
+    Returns:
+        tuple: (advance width, (left, top, right, bottom) bounding box when drawn at (0, 0))
+    """
+    font = load_font(font_size, family)
+    return _measure.textlength(text, font=font), _measure.textbbox((0, 0), text, font=font)
+
+
+def preload_fonts(sizes=(10, 12, 16, 36)):
+    """
+    Find the label font and load it at common sizes.
+    
+    Run at startup in the background, so the first grid does not wait for font discovery.
+    
+    Args:
+        sizes (iterable): Font sizes to load
+    """
+    start = time.perf_counter()
+    for font_size in sizes:
+        load_font(font_size)
+    logger.debug(f"Preloaded label fonts in {time.perf_counter() - start:.3f} s "
+                 f"({find_font_file() or 'default font'})")
+
+
+# Images opened by grid generators and not yet closed, across all generators
+_open_image_lock = threading.Lock()
+_open_image_count = 0
+
+
+def open_image_count():
+    """
+    Get the number of images opened for rendering that are still open.
+    
+    Returns:
+        int: Open image handles held by grid generators
+    """
+    return _open_image_count
+
+
+def _count_open_images(change):
+    """Add to the number of open images."""
+    global _open_image_count
+    with _open_image_lock:
+        _open_image_count += change
+
+
+def decoded_size(img):
+    """
+    Estimate the memory taken by an image once its pixel data is decoded.
+    
+    Args:
+        img (PIL.Image): Opened image
+    
+    Returns:
+        int: Size in bytes
+    """
+    # PIL stores 8-bit single-band images in one byte per pixel, 16-bit images
+    # in two and everything else (RGB included) in four
+    if img.mode in ("1", "L", "P"):
+        bytes_per_pixel = 1
+    elif img.mode.startswith("I;16"):
+        bytes_per_pixel = 2
+    else:
+        bytes_per_pixel = 4
+    return img.width * img.height * bytes_per_pixel
+
+
+def _decode_image(img):
+    """Decode the pixel data of an opened image and return the time it took in seconds."""
+    start = time.perf_counter()
+    img.load()
+    return time.perf_counter() - start
+
+
+class GridCell:
+    """
+    One image cell of a grid and the overlays drawn on it.
+    
+    The fit decides how the image fills the cell:
+        "center" - placed at its own size in the middle of the cell
+        "stretch" - resized to fill the cell exactly (ChemSEM maps)
+        "register" - the registered region starting at origin, in frame
+            coordinates, resampled into the cell
+    
+    16-bit and float images are windowed to 8 bits as they are drawn (see
+    workflows.windowing).
+    
+    Overlays are dicts in cell coordinates, relative to the top-left of the cell:
+        {"type": "text", "text", "position", "color", "font_size", "stroke_width", "stroke_color"}
+        {"type": "box", "box": (x, y, width, height), "color", "fill", "width",
+         "style": "solid", "dotted" or "corners", "dots": dashes per side when dotted}
+        {"type": "line", "start", "end", "color", "width"}
+        {"type": "arrow", "start", "end", "color", "width"}
+    """
+    
+    def __init__(self, image, path=None, fit="center", origin=None, frame_size=None, overlays=None, window=None):
+        """
+        Initialize grid cell.
+        
+        Args:
+            image (PIL.Image): Source image
+            path (str, optional): Path of the source image, used for cached resampling
+            fit (str): "center", "stretch" or "register"
+            origin (tuple, optional): Top-left of the cell in frame coordinates, for "register"
+            frame_size (tuple, optional): Size of the common frame as (width, height), for "register"
+            overlays (list, optional): Overlay dicts drawn after the image is placed
+            window (tuple, optional): Intensity window for high bit depth images (see
+                windowing.window_settings); defaults to grid_generator.window_method
+        """
+        self.image = image
+        self.path = path
+        self.fit = fit
+        self.origin = origin
+        self.frame_size = frame_size
+        self.overlays = overlays if overlays is not None else []
+        self.window = window
+    
+    def image_offset(self, cell_size):
+        """
+        Get the position of the image within the cell.
+        
+        Args:
+            cell_size (tuple): Cell size as (width, height)
+        
+        Returns:
+            tuple: (x, y) offset of the image's top-left corner; (0, 0) unless centered
+        """
+        if self.fit != "center":
+            return 0, 0
+        return (cell_size[0] - self.image.width) // 2, (cell_size[1] - self.image.height) // 2
+
+
+class StreamedGrid:
+    """
+    Grid at native size that is composed in horizontal strips as it is saved.
+    
+    Only one strip of the canvas and the fitted images of the cells it crosses are
+    held in memory, so very large grids can be exported without building the whole
+    canvas. Cells and overlays are drawn in the same order as GridGenerator.render,
+    so the pixels are identical.
+    
+    Images opened by the generator are released once the strips have passed their
+    cells, so a streamed grid can be saved only once.
+    """
+    
+    def __init__(self, generator, cells, layout, cell_size):
+        """
+        Initialize streamed grid.
+        
+        Args:
+            generator (GridGenerator): Rendering engine
+            cells (list): GridCell objects, row by row
+            layout (tuple): Grid layout as (rows, columns)
+            cell_size (tuple): Size of each grid cell as (width, height)
+        """
+        self.generator = generator
+        self.cells = cells
+        self.layout = layout
+        self.cell_size = cell_size
+        self.size = generator.grid_size(layout, cell_size)
+        self.mode = "RGB"
+        self.info = {}
+    
+    @property
+    def width(self):
+        return self.size[0]
+    
+    @property
+    def height(self):
+        return self.size[1]
+    
+    def strips(self, strip_height=None):
+        """
+        Compose the grid strip by strip.
+        
+        Args:
+            strip_height (int, optional): Rows per strip; defaults to grid_generator.strip_rows
+        
+        Yields:
+            tuple: (top, PIL.Image) for each strip, from the top of the grid down
+        """
+        if strip_height is None:
+            strip_height = int(config.get('grid_generator.strip_rows', 256))
+        strip_height = max(1, strip_height)
+        
+        generator = self.generator
+        width, height = self.size
+        cell_height = self.cell_size[1]
+        positions = [generator.cell_position(i, self.layout, self.cell_size) for i in range(len(self.cells))]
+        fitted = {}
+        
+        for top in range(0, height, strip_height):
+            bottom = min(top + strip_height, height)
+            canvas_top = max(0, top - STRIP_MARGIN)
+            canvas_bottom = min(height, bottom + STRIP_MARGIN)
+            strip = Image.new('RGB', (width, canvas_bottom - canvas_top), color=generator.background_color)
+            draw = ImageDraw.Draw(strip)
+            
+            for i, (cell, (x, y)) in enumerate(zip(self.cells, positions)):
+                if y < canvas_bottom and y + cell_height > canvas_top:
+                    # Fit (or window) each cell once and keep it while strips cross it
+                    if cell.fit == "center":
+                        if i not in fitted:
+                            fitted[i] = generator.display_image(cell)
+                        x_offset, y_offset = cell.image_offset(self.cell_size)
+                        strip.paste(fitted[i], (x + x_offset, y + y_offset - canvas_top))
+                    else:
+                        if i not in fitted:
+                            fitted[i] = generator.fit_to_cell(cell, self.cell_size)
+                        strip.paste(fitted[i], (x, y - canvas_top))
+            
+            # Overlays may reach outside their cell, so every strip draws them all
+            for cell, (x, y) in zip(self.cells, positions):
+                generator.draw_overlays(draw, cell.overlays, (x, y - canvas_top))
+            
+            # Release cells the next strip, including its margin, no longer reaches
+            for i, (cell, (x, y)) in enumerate(zip(self.cells, positions)):
+                if y + cell_height <= bottom - STRIP_MARGIN and bottom < height:
+                    fitted.pop(i, None)
+                    if not any(other.image is cell.image for other in self.cells[i + 1:]):
+                        generator.release_image(cell.image)
+            
+            if canvas_top < top or canvas_bottom > bottom:
+                strip = strip.crop((0, top - canvas_top, width, bottom - canvas_top))
+            yield top, strip
+    
+    def to_image(self):
+        """
+        Compose the whole grid in memory.
+        
+        Returns:
+            PIL.Image: Grid visualization image
+        """
+        grid_img = Image.new('RGB', self.size, color=self.generator.background_color)
+        for top, strip in self.strips():
+            grid_img.paste(strip, (0, top))
+        grid_img.info.update(self.info)
+        return grid_img
+    
+    def save(self, fp, format=None, **params):
+        """
+        Save the grid, streaming it strip by strip for PNG and TIFF files.
+        
+        SVG and PDF files get the cells as embedded images and the overlays as
+        vector shapes (see workflows.vector_export).
+        
+        Args:
+            fp (str): Output file path
+            format (str, optional): Image format; by default taken from the file extension
+            **params: Save options; "dpi" is written to the file, and formats that cannot
+                be streamed receive all of them through PIL
+        """
+        from workflows.strip_writer import open_strip_writer
+        from workflows.vector_export import vector_format, write_vector_grid
+        
+        dpi = params.get("dpi") or self.info.get("dpi")
+        strip_height = int(config.get('grid_generator.strip_rows', 256))
+        try:
+            if vector_format(fp, format):
+                write_vector_grid(self, fp, format, dpi)
+                return
+            
+            writer = open_strip_writer(fp, self.size, self.mode, format, dpi, strip_height)
+            if writer is None:
+                self.to_image().save(fp, format=format, **params)
+                return
+            
+            with writer:
+                for _, strip in self.strips(strip_height):
+                    writer.write(strip)
+            logger.info(f"Streamed {self.width}x{self.height} grid to {fp} in strips of {strip_height} rows")
+        finally:
+            self.generator.close()
+
 
 class GridGenerator:
     """
-    Utility class for creating grid visualizations of SEM images.
+    Rendering engine for grid visualizations of SEM images.
+    
+    Cells are placed row by row, each with an optional header band above it for
+    labels. Overlays form a layer drawn over the grid once all cell images are
+    placed, so an overlay reaching into a neighbouring cell is never covered by it.
+    
+    Layouts and overlays are always described at the native resolution of the
+    images. With a target size, a grid that does not fit is rendered scaled down
+    as a whole, from downsampled copies of its images.
+    
+    Previews keep each scaled cell image, without its overlays, in the shared cell
+    cache, so re-rendering a grid after one cell changed only decodes that cell,
+    and restyling labels or boxes only redraws the overlay layer.
+    
+    Images opened with open_images belong to the generator. Each is closed as soon
+    as its cell has been placed, and the rest when the grid is rendered, when a
+    streamed grid is saved, or on close().
     """
     
-    def __init__(self, spacing=4, background_color='white'):
+    def __init__(self, spacing=4, background_color='white', header_height=0, quality="export",
+                 target_size=None, stream=False):
         """
         Initialize grid generator.
         
         Args:
             spacing (int): Pixel spacing between grid cells
             background_color (str): Background color of the grid
+            header_height (int): Height of the label band above each cell
+            quality (str): "preview" for fast resampling or "export" for full quality
+            target_size (tuple, optional): Maximum size of the rendered grid as
+                (width, height), where either may be None for no limit; exports default
+                to the native size, and previews are never larger than
+                grid_generator.preview_max_size
+            stream (bool): Return grids rendered at native size as StreamedGrid
+                objects, composed strip by strip when they are saved
         """
         self.spacing = spacing
         self.background_color = background_color
+        self.header_height = header_height
+        self.quality = quality
+        
+        if quality == "preview":
+            max_size = int(config.get('grid_generator.preview_max_size', 1600))
+            if max_size > 0:
+                target_size = tuple(
+                    max_size if limit is None else min(limit, max_size)
+                    for limit in (target_size or (None, None))
+                )
+        self.target_size = target_size
+        self.stream = stream
+        self.decode_times = {}
+        self._images = {}  # Images opened by open_images and not yet closed, by id
     
-    def create_grid(self, images, layout=None, cell_size=None):
+    def open_images(self, paths, prefetch=None):
         """
-        Create a grid visualization of images.
+        Open images for rendering and decode their pixel data in parallel.
         
         Args:
-            images (list): List of PIL.Image objects
-            layout (tuple, optional): Grid layout as (rows, columns)
-            cell_size (tuple, optional): Size of each grid cell as (width, height)
-            
+            paths (list): Image paths
+            prefetch (bool, optional): Decode pixel data now (see prefetch_images); if
+                False, images are opened lazily and decoded when a cell is placed. By
+                default images are prefetched unless a target size is set, since scaled
+                grids read their cells from downsampled copies instead
+        
         Returns:
-            PIL.Image: Grid visualization image
+            list: PIL images in the same order, with None for images that do not
+                exist or could not be opened; owned by the generator (see release_image)
         """
-        if not images:
-            logger.error("No images provided for grid visualization")
-            return None
+        images = []
+        for img_path in paths:
+            if not img_path or not os.path.exists(img_path):
+                logger.error(f"Image file does not exist: {img_path}")
+                images.append(None)
+                continue
+            
+            try:
+                img = Image.open(img_path)
+                self._images[id(img)] = img
+                _count_open_images(1)
+                images.append(img)
+            except Exception as e:
+                logger.error(f"Error loading image {img_path}: {str(e)}")
+                images.append(None)
         
-        num_images = len(images)
+        if prefetch is None:
+            prefetch = self.target_size is None
+        if prefetch:
+            images = self.prefetch_images(paths, images)
+        return images
+    
+    def prefetch_images(self, paths, images):
+        """
+        Decode the pixel data of opened images on a thread pool.
         
-        # Determine layout if not specified
-        if not layout:
-            if num_images <= 2:
-                layout = (1, 2)  # 1 row, 2 columns
-            elif num_images <= 4:
-                layout = (2, 2)  # 2 rows, 2 columns
-            else:
-                layout = (3, 2)  # 3 rows, 2 columns
+        PIL releases the GIL while decoding, so the images are ready in about the
+        time of the slowest single decode. Images are prefetched in order while their
+        total decoded size fits in grid_generator.decode_memory_mb; the first image is
+        always prefetched, and images that do not fit stay lazy and are decoded when
+        their cell is placed.
+        Decode times are recorded in decode_times by path.
         
-        rows, cols = layout
+        Args:
+            paths (list): Image paths
+            images (list): Opened PIL images matching paths, or None
         
-        # If there are more grid cells than images, adjust the layout
-        if rows * cols > num_images:
-            if cols > 1:
-                cols = min(cols, num_images)
-            rows = (num_images + cols - 1) // cols
+        Returns:
+            list: The images, with None for images whose data could not be decoded
+        """
+        from concurrent.futures import ThreadPoolExecutor
         
-        logger.info(f"Creating grid with layout {rows}x{cols} for {num_images} images")
+        memory_limit = float(config.get('grid_generator.decode_memory_mb', 1024)) * 1024 * 1024
+        selected = []
+        in_flight = 0
+        for index, img in enumerate(images):
+            if img is None:
+                continue
+            size = decoded_size(img)
+            if selected and in_flight + size > memory_limit:
+                continue
+            selected.append(index)
+            in_flight += size
         
-        # Determine cell size if not specified
-        if not cell_size:
-            max_width = max(img.width for img in images)
-            max_height = max(img.height for img in images)
-            cell_size = (max_width, max_height)
+        if not selected:
+            return images
         
-        cell_width, cell_height = cell_size
+        skipped = sum(1 for img in images if img is not None) - len(selected)
+        if skipped:
+            logger.info(f"Decode memory limit reached, {skipped} images will be decoded on demand")
         
-        # Create a blank grid image with spacing
-        grid_width = cols * cell_width + (cols - 1) * self.spacing
-        grid_height = rows * cell_height + (rows - 1) * self.spacing
-        grid_img = Image.new('RGB', (grid_width, grid_height), color=self.background_color)
+        images = list(images)
+        max_workers = max(1, min(int(config.get('grid_generator.decode_workers', 4)), len(selected)))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-decode") as executor:
+            futures = [(index, executor.submit(_decode_image, images[index])) for index in selected]
+            for index, future in futures:
+                try:
+                    self.decode_times[paths[index]] = future.result()
+                    logger.debug(f"Decoded {os.path.basename(paths[index])} "
+                                 f"in {self.decode_times[paths[index]]:.3f} s")
+                except Exception as e:
+                    logger.error(f"Error decoding image {paths[index]}: {str(e)}")
+                    self.release_image(images[index])
+                    images[index] = None
         
-        # Place images in the grid
-        for i, img in enumerate(images):
-            if i >= rows * cols:
-                break  # Skip if we've filled all cells
-                
-            row = i // cols
-            col = i % cols
-            
-            # Calculate position
-            x = col * (cell_width + self.spacing)
-            y = row * (cell_height + self.spacing)
-            
-            # Center the image in its cell
-            x_offset = (cell_width - img.width) // 2
-            y_offset = (cell_height - img.height) // 2
+        if self.decode_times:
+            slowest = max(self.decode_times, key=self.decode_times.get)
+            logger.info(f"Decoded {len(self.decode_times)} images in {time.perf_counter() - start:.3f} s "
+                        f"on {max_workers} threads (slowest: {os.path.basename(slowest)}, "
+                        f"{self.decode_times[slowest]:.3f} s)")
+        return images
+    
+    def release_image(self, img):
+        """
+        Close an image opened by open_images once it is no longer needed.
+        
+        Closing frees the decoded pixel data and the file handle, which on network
+        shares also releases the lock on the file. Other images are left alone.
+        
+        Args:
+            img (PIL.Image): Image to close
+        """
+        if self._images.pop(id(img), None) is not None:
+            img.close()
+            _count_open_images(-1)
+    
+    def close(self):
+        """Close all images opened by this generator and log memory use."""
+        closed = len(self._images)
+        for img in list(self._images.values()):
+            self.release_image(img)
+        
+        if closed:
+            from utils.memory import peak_rss_mb
+            from workflows.image_cache import resample_cache, cell_cache
             
-            # Paste the image
-            grid_img.paste(img, (x + x_offset, y + y_offset))
+            peak = peak_rss_mb()
+            cache_mb = (resample_cache.size_bytes + cell_cache.size_bytes) / (1024 * 1024)
+            logger.info(f"Closed {closed} images; {open_image_count()} image handles still open, "
+                        f"render caches {cache_mb:.0f} MB, peak RSS "
+                        f"{f'{peak:.0f} MB' if peak is not None else 'unknown'}")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def font(self, font_size):
+        """
+        Get the label font with the given size.
         
-        return grid_img
+        Args:
+            font_size (int): Font size in points
+        
+        Returns:
+            PIL.ImageFont: Loaded font
+        """
+        return load_font(font_size)
+    
+    def text_length(self, text, font_size):
+        """
+        Measure the advance width of a text.
+        
+        Args:
+            text (str): Text to measure
+            font_size (int): Font size in points
+        
+        Returns:
+            float: Width in pixels
+        """
+        return text_metrics(text, font_size)[0]
     
-    def add_labels(self, grid_img, labels, layout, cell_size, position='top'):
+    def text_bbox(self, text, font_size, position=(0, 0)):
         """
-        Add text labels to a grid visualization.
+        Measure the bounding box of a text drawn at a position.
+        
+        Args:
+            text (str): Text to measure
+            font_size (int): Font size in points
+            position (tuple): Position the text is drawn at
+        
+        Returns:
+            tuple: (left, top, right, bottom) in pixels
+        """
+        left, top, right, bottom = text_metrics(text, font_size)[1]
+        return left + position[0], top + position[1], right + position[0], bottom + position[1]
+    
+    def grid_size(self, layout, cell_size):
+        """
+        Get the size of the canvas for a layout.
         
         Args:
-            grid_img (PIL.Image): Grid image to modify
-            labels (list): List of label strings
             layout (tuple): Grid layout as (rows, columns)
             cell_size (tuple): Size of each grid cell as (width, height)
-            position (str): Label position ('top', 'bottom', 'left', 'right')
-            
+        
         Returns:
-            PIL.Image: Grid image with labels
+            tuple: Canvas size as (width, height)
         """
-        if not grid_img or not labels:
-            return grid_img
-        
         rows, cols = layout
         cell_width, cell_height = cell_size
+        return (
+            cols * cell_width + (cols - 1) * self.spacing,
+            rows * (cell_height + self.header_height) + (rows - 1) * self.spacing
+        )
+    
+    def cell_position(self, index, layout, cell_size):
+        """
+        Get the position of a cell on the canvas.
         
-        # Try to load a font
-        try:
-            font = ImageFont.truetype("arial.ttf", 10)
-        except IOError:
-            # Fallback to default font
-            font = ImageFont.load_default()
+        Args:
+            index (int): Cell index, row by row
+            layout (tuple): Grid layout as (rows, columns)
+            cell_size (tuple): Size of each grid cell as (width, height)
         
-        # Create a new image to accommodate labels
-        padding = 20  # Padding for labels
+        Returns:
+            tuple: (x, y) of the top-left of the cell, below its header band
+        """
+        cols = layout[1]
+        cell_width, cell_height = cell_size
+        row = index // cols
+        col = index % cols
+        return (
+            col * (cell_width + self.spacing),
+            row * (cell_height + self.header_height + self.spacing) + self.header_height
+        )
+    
+    def render_scale(self, layout, cell_size):
+        """
+        Get the factor a grid is scaled by to fit the target size.
         
-        if position in ['top', 'bottom']:
-            new_width = grid_img.width
-            new_height = grid_img.height + padding
-            
-            if position == 'top':
-                paste_y = padding
-            else:  # bottom
-                paste_y = 0
-                
-            new_img = Image.new('RGB', (new_width, new_height), color=self.background_color)
-            new_img.paste(grid_img, (0, paste_y))
-            
-        else:  # left or right
-            new_width = grid_img.width + padding
-            new_height = grid_img.height
-            
-            if position == 'left':
-                paste_x = padding
-            else:  # right
-                paste_x = 0
-                
-            new_img = Image.new('RGB', (new_width, new_height), color=self.background_color)
-            new_img.paste(grid_img, (paste_x, 0))
+        Args:
+            layout (tuple): Grid layout as (rows, columns)
+            cell_size (tuple): Size of each grid cell as (width, height)
+        
+        Returns:
+            float: Scale factor, at most 1.0
+        """
+        if not self.target_size:
+            return 1.0
+        
+        scale = 1.0
+        for limit, size in zip(self.target_size, self.grid_size(layout, cell_size)):
+            if limit is not None:
+                scale = min(scale, limit / size)
+        return scale
+    
+    def display_image(self, cell):
+        """
+        Get a cell's image at native size as it is drawn.
         
-        # Draw labels
-        draw = ImageDraw.Draw(new_img)
+        Args:
+            cell (GridCell): Cell
         
-        for i, label in enumerate(labels):
-            if i >= rows * cols:
-                break  # Skip if we've labeled all cells
-                
-            row = i // cols
-            col = i % cols
+        Returns:
+            PIL.Image: The cell's image, windowed to 8 bits if it has a higher bit depth
+        """
+        # Deferred import - windowing pulls in numpy
+        from workflows.windowing import apply_window
+        
+        return apply_window(cell.image, cell.path, cell.window)
+    
+    def scaled_image(self, cell, scale):
+        """
+        Get a cell's image scaled down for rendering below native size.
+        
+        Images with a path are read from the shared resample cache, which decodes
+        them at reduced size where the format allows, so repeated previews of the
+        same images do not decode them again.
+        
+        Args:
+            cell (GridCell): Cell whose image to scale
+            scale (float): Scale factor
+        
+        Returns:
+            PIL.Image: Scaled image; shared with the cache, so it must not be modified
+        """
+        img = cell.image
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        if size == img.size:
+            return self.display_image(cell)
+        
+        from workflows.image_cache import resample_cache, get_resample_settings
+        
+        resample, reducing_gap = get_resample_settings(self.quality)
+        scaled = resample_cache.get(cell.path, size, resample, reducing_gap, cell.window) if cell.path else None
+        if scaled is None:
+            img = self.display_image(cell)
+            if img.mode not in ("1", "L", "RGB", "RGBA"):
+                img = img.convert("RGB")
+            scaled = img.resize(size, resample, reducing_gap=reducing_gap)
+        return scaled
+    
+    def fit_to_cell(self, cell, cell_size, background=None, scale=1.0):
+        """
+        Fit a cell's image to the cell size.
+        
+        Args:
+            cell (GridCell): Cell to fit
+            cell_size (tuple): Native cell size as (width, height)
+            background: Fill colour for cell areas not covered by the image;
+                defaults to the grid background
+            scale (float): Scale factor of the rendered cell (see render_scale)
+        
+        Returns:
+            PIL.Image: Image of exactly the cell size times scale
+        """
+        img = self.display_image(cell) if scale == 1.0 else self.scaled_image(cell, scale)
+        cell_width, cell_height = max(1, round(cell_size[0] * scale)), max(1, round(cell_size[1] * scale))
+        
+        # Registered images - resample the aligned overlap region into the cell
+        if cell.fit == "register":
+            if img.mode not in ("L", "RGB"):
+                img = img.convert("RGB")
             
-            # Calculate label position
-            if position == 'top':
-                x = col * (cell_width + self.spacing) + cell_width // 2
-                y = 0
-            elif position == 'bottom':
-                x = col * (cell_width + self.spacing) + cell_width // 2
-                y = grid_img.height
-            elif position == 'left':
-                x = 0
-                y = row * (cell_height + self.spacing) + cell_height // 2
-            else:  # right
-                x = grid_img.width
-                y = row * (cell_height + self.spacing) + cell_height // 2
+            # Map the common frame onto this image's own pixel grid
+            origin_x, origin_y = cell.origin
+            scale_x = img.width / cell.frame_size[0]
+            scale_y = img.height / cell.frame_size[1]
             
-            # Draw text
-            text_width, text_height = draw.textsize(label, font=font)
+            return img.transform(
+                (cell_width, cell_height),
+                Image.AFFINE,
+                (scale_x / scale, 0, origin_x * scale_x, 0, scale_y / scale, origin_y * scale_y),
+                resample=Image.BICUBIC if self.quality == "export" else Image.BILINEAR
+            )
+        
+        # Stretch to fill the entire cell without maintaining aspect ratio
+        if cell.fit == "stretch":
+            from workflows.image_cache import resample_cache, get_resample_settings
             
-            if position in ['top', 'bottom']:
-                text_x = x - text_width // 2
-                text_y = y + (padding - text_height) // 2
-            else:  # left or right
-                text_x = x + (padding - text_width) // 2
-                text_y = y - text_height // 2
+            # Resampled cells are cached, so preview refreshes and alternative switches reuse them
+            resample, reducing_gap = get_resample_settings(self.quality)
+            resized_img = resample_cache.get(cell.path, (cell_width, cell_height), resample, reducing_gap,
+                                             cell.window) if cell.path else None
+            if resized_img is None:
+                resized_img = img.resize((cell_width, cell_height), resample, reducing_gap=reducing_gap)
             
-            draw.text((text_x, text_y), label, fill=(0, 0, 0), font=font)
+            logger.debug(f"Resized image to fill entire cell: {cell_width}x{cell_height} ({self.quality})")
+            return resized_img
+        
+        # Center the image in its cell
+        if img.size == (cell_width, cell_height):
+            return img
         
-        return new_img
+        if background is None:
+            background = self.background_color
+        x_offset, y_offset = cell.image_offset(cell_size)
+        cell_img = Image.new('RGB' if img.mode not in ('L', '1') else 'L', (cell_width, cell_height), color=background)
+        cell_img.paste(img, (round(x_offset * scale), round(y_offset * scale)))
+        return cell_img
     
-    def add_annotations(self, grid_img, annotations, layout, cell_size):
+    def render(self, cells, layout, cell_size):
         """
-        Add annotations (boxes, arrows, etc.) to a grid visualization.
+        Render cells into a grid image.
         
         Args:
-            grid_img (PIL.Image): Grid image to modify
-            annotations (list): List of annotation dictionaries
+            cells (list): GridCell objects, row by row
             layout (tuple): Grid layout as (rows, columns)
             cell_size (tuple): Size of each grid cell as (width, height)
-            
+        
         Returns:
-            PIL.Image: Grid image with annotations
+            PIL.Image: Grid visualization image, scaled down to the target size if needed,
+                or a StreamedGrid if streaming is enabled and the grid is at native size
         """
-        if not grid_img or not annotations:
-            return grid_img
+        cells = cells[:layout[0] * layout[1]]  # Skip cells beyond the layout
+        scale = self.render_scale(layout, cell_size)
+        if scale < 1.0 or self.quality == "preview":
+            return self._render_scaled(cells, layout, cell_size, scale)
+        if self.stream:
+            return StreamedGrid(self, cells, layout, cell_size)
         
-        rows, cols = layout
-        cell_width, cell_height = cell_size
+        grid_img = Image.new('RGB', self.grid_size(layout, cell_size), color=self.background_color)
+        draw = ImageDraw.Draw(grid_img)
         
-        # Create a copy of the image to draw on
-        annotated_img = grid_img.copy()
-        draw = ImageDraw.Draw(annotated_img)
+        # Release each image after its last cell, so images decoded on demand do not pile up
+        last_use = {id(cell.image): i for i, cell in enumerate(cells)}
         
-        # Process each annotation
-        for annotation in annotations:
-            annotation_type = annotation.get('type')
-            cell_index = annotation.get('cell_index', 0)
+        for i, cell in enumerate(cells):
+            x, y = self.cell_position(i, layout, cell_size)
             
-            # Calculate cell position
-            row = cell_index // cols
-            col = cell_index % cols
+            if cell.fit == "center":
+                # Paste at its own size; the canvas already has the background colour
+                x_offset, y_offset = cell.image_offset(cell_size)
+                grid_img.paste(self.display_image(cell), (x + x_offset, y + y_offset))
+            else:
+                grid_img.paste(self.fit_to_cell(cell, cell_size), (x, y))
             
-            cell_x = col * (cell_width + self.spacing)
-            cell_y = row * (cell_height + self.spacing)
+            if last_use[id(cell.image)] == i:
+                self.release_image(cell.image)
+        
+        for i, cell in enumerate(cells):
+            self.draw_overlays(draw, cell.overlays, self.cell_position(i, layout, cell_size))
+        
+        self.close()
+        return grid_img
+    
+    def _render_scaled(self, cells, layout, cell_size, scale):
+        """
+        Render cells into a grid image scaled down by a factor.
+        
+        Cell images are scaled on a thread pool, mostly from the resample cache, and
+        the overlays are scaled with them, so the result looks like the native grid
+        resized without ever building the native canvas. Previews are also rendered
+        here, at any scale, so their cells can be reused from the cell cache.
+        
+        Args:
+            cells (list): GridCell objects, row by row
+            layout (tuple): Grid layout as (rows, columns)
+            cell_size (tuple): Native size of each grid cell as (width, height)
+            scale (float): Scale factor
+        
+        Returns:
+            PIL.Image: Scaled grid visualization image
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from workflows.image_cache import cell_cache
+        
+        def scale_cell(cell):
+            if cell.fit == "center":
+                return self.scaled_image(cell, scale)
+            return self.fit_to_cell(cell, cell_size, scale=scale)
+        
+        width, height = self.grid_size(layout, cell_size)
+        grid_img = Image.new('RGB', (max(1, round(width * scale)), max(1, round(height * scale))),
+                             color=self.background_color)
+        draw = ImageDraw.Draw(grid_img)
+        
+        # Preview cells are cached without their overlays, so restyling labels and
+        # boxes reuses every cell and only redraws the overlay layer
+        keys = [self.cell_key(cell, cell_size, scale) for cell in cells]
+        cell_images = [cell_cache.get(cell.path, key) if key else None for cell, key in zip(cells, keys)]
+        
+        # Only cells that are not cached need their images
+        pending = [i for i, cell_img in enumerate(cell_images) if cell_img is None]
+        if pending:
+            max_workers = max(1, min(int(config.get('grid_generator.decode_workers', 4)), len(pending)))
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cell-resample") as executor:
+                for i, cell_img in zip(pending, executor.map(scale_cell, [cells[i] for i in pending])):
+                    if keys[i]:
+                        # Opened images are closed after rendering, so the cache keeps its own copy
+                        if cell_img is cells[i].image:
+                            cell_img = cell_img.copy()
+                        cell_cache.put(cells[i].path, keys[i], cell_img)
+                    cell_images[i] = cell_img
+        
+        positions = [self.cell_position(i, layout, cell_size) for i in range(len(cells))]
+        for cell, cell_img, (x, y) in zip(cells, cell_images, positions):
+            x_offset, y_offset = cell.image_offset(cell_size)
+            grid_img.paste(cell_img, (round((x + x_offset) * scale), round((y + y_offset) * scale)))
+        
+        for cell, (x, y) in zip(cells, positions):
+            self.draw_overlays(draw, cell.overlays, (x * scale, y * scale), scale)
+        
+        if self.quality == "preview":
+            logger.info(f"Rendered grid at {scale:.3f}x native size ({grid_img.width}x{grid_img.height}), "
+                        f"{len(cells) - len(pending)} of {len(cells)} cells from cache")
+        else:
+            logger.info(f"Rendered grid at {scale:.3f}x native size ({grid_img.width}x{grid_img.height})")
+        
+        self.close()
+        return grid_img
+    
+    def cell_key(self, cell, cell_size, scale):
+        """
+        Get the key a scaled preview cell is cached under.
+        
+        Only preview cells read from an image file are cached. The key covers how
+        the image is fitted to the cell but not the cell's overlays, which are drawn
+        over the cached image.
+        
+        Args:
+            cell (GridCell): Cell
+            cell_size (tuple): Native cell size as (width, height)
+            scale (float): Scale factor
+        
+        Returns:
+            tuple: Cache key, or None if the cell is not cached
+        """
+        if self.quality != "preview" or not cell.path:
+            return None
+        
+        fit_hash = hash(repr((cell.fit, cell.origin, cell.frame_size, cell.window)))
+        return tuple(cell_size), round(scale, 6), self.quality, fit_hash
+    
+    def box_segments(self, overlay):
+        """
+        Get the line segments a styled box overlay is drawn with.
+        
+        Args:
+            overlay (dict): Box overlay with a "dotted" or "corners" style (see GridCell)
+        
+        Returns:
+            list: ((x1, y1), (x2, y2)) segments in cell coordinates
+        """
+        x, y, w, h = overlay.get('box')
+        right, bottom = x + w, y + h
+        
+        if overlay.get('style') == 'dotted':
+            dots = overlay.get('dots', 20)
+            segments = []
+            for d in range(dots):
+                x1, x2 = x + (w * d / dots), x + (w * (d + 0.5) / dots)
+                y1, y2 = y + (h * d / dots), y + (h * (d + 0.5) / dots)
+                segments.append(((x1, y), (x2, y)))                # Top edge
+                segments.append(((x1, bottom), (x2, bottom)))      # Bottom edge
+                segments.append(((x, y1), (x, y2)))                # Left edge
+                segments.append(((right, y1), (right, y2)))        # Right edge
+            return segments
+        
+        # Just the corners (L shapes)
+        corner_length = min(20, w / 4, h / 4)
+        return [
+            ((x, y), (x + corner_length, y)),
+            ((x, y), (x, y + corner_length)),
+            ((right - corner_length, y), (right, y)),
+            ((right, y), (right, y + corner_length)),
+            ((x, bottom - corner_length), (x, bottom)),
+            ((x, bottom), (x + corner_length, bottom)),
+            ((right - corner_length, bottom), (right, bottom)),
+            ((right, bottom - corner_length), (right, bottom))
+        ]
+    
+    def draw_overlays(self, draw, overlays, origin, scale=1.0):
+        """
+        Draw overlays relative to an origin.
+        
+        Args:
+            draw (PIL.ImageDraw): Drawing context
+            overlays (list): Overlay dicts (see GridCell)
+            origin (tuple): Canvas position of the overlays' (0, 0)
+            scale (float): Factor applied to overlay coordinates, sizes and line widths
+        """
+        origin_x, origin_y = origin
+        
+        def point(x, y):
+            return origin_x + x * scale, origin_y + y * scale
+        
+        def line_width(width):
+            return max(1, round(width * scale)) if width else 0
+        
+        for overlay in overlays:
+            overlay_type = overlay.get('type')
+            color = overlay.get('color', (255, 0, 0))
+            width = line_width(overlay.get('width', 2))
             
-            if annotation_type == 'box':
-                # Draw a box
-                box = annotation.get('box')
-                color = annotation.get('color', (255, 0, 0))
-                width = annotation.get('width', 2)
-                
-                x, y, w, h = box
-                draw.rectangle(
-                    [cell_x + x, cell_y + y, cell_x + x + w, cell_y + y + h],
-                    outline=color,
-                    width=width
-                )
-                
-            elif annotation_type == 'text':
-                # Draw text
-                text = annotation.get('text', '')
-                position = annotation.get('position', (0, 0))
-                color = annotation.get('color', (0, 0, 0))
-                
-                try:
-                    font_size = annotation.get('font_size', 10)
-                    font = ImageFont.truetype("arial.ttf", font_size)
-                except IOError:
-                    font = ImageFont.load_default()
-                
-                x, y = position
+            if overlay_type == 'text':
                 draw.text(
-                    (cell_x + x, cell_y + y),
-                    text,
-                    fill=color,
-                    font=font
+                    point(*overlay.get('position', (0, 0))),
+                    overlay.get('text', ''),
+                    fill=overlay.get('color', (0, 0, 0)),
+                    font=self.font(max(1, round(overlay.get('font_size', 10) * scale))),
+                    stroke_width=line_width(overlay.get('stroke_width', 0)),
+                    stroke_fill=overlay.get('stroke_color')
                 )
-                
-            elif annotation_type == 'line':
-                # Draw a line
-                start = annotation.get('start', (0, 0))
-                end = annotation.get('end', (0, 0))
-                color = annotation.get('color', (255, 0, 0))
-                width = annotation.get('width', 2)
-                
-                start_x, start_y = start
-                end_x, end_y = end
-                
-                draw.line(
-                    [cell_x + start_x, cell_y + start_y, cell_x + end_x, cell_y + end_y],
-                    fill=color,
+            
+            elif overlay_type == 'box' and overlay.get('style', 'solid') != 'solid':
+                for start, end in self.box_segments(overlay):
+                    draw.line([point(*start), point(*end)], fill=color, width=width)
+            
+            elif overlay_type == 'box':
+                x, y, w, h = overlay.get('box')
+                draw.rectangle(
+                    [point(x, y), point(x + w, y + h)],
+                    fill=overlay.get('fill'),
+                    outline=overlay.get('color'),
                     width=width
                 )
+            
+            elif overlay_type in ('line', 'arrow'):
+                start = point(*overlay.get('start', (0, 0)))
+                end = point(*overlay.get('end', (0, 0)))
                 
-            elif annotation_type == 'arrow':
-                # Draw an arrow (line with an arrowhead)
-                start = annotation.get('start', (0, 0))
-                end = annotation.get('end', (0, 0))
-                color = annotation.get('color', (255, 0, 0))
-                width = annotation.get('width', 2)
-                
-                start_x, start_y = start
-                end_x, end_y = end
-                
-                # Draw the line
-                draw.line(
-                    [cell_x + start_x, cell_y + start_y, cell_x + end_x, cell_y + end_y],
-                    fill=color,
-                    width=width
-                )
+                draw.line([start, end], fill=color, width=width)
                 
-                # Draw the arrowhead
-                self._draw_arrowhead(
-                    draw,
-                    (cell_x + end_x, cell_y + end_y),
-                    (cell_x + start_x, cell_y + start_y),
-                    color,
-                    size=10
-                )
+                if overlay_type == 'arrow':
+                    self._draw_arrowhead(draw, end, start, color, size=10 * scale)
+    
+    def create_grid(self, images, layout=None, cell_size=None):
+        """
+        Create a grid visualization of images, each centered in its cell.
+        
+        Args:
+            images (list): List of PIL.Image objects
+            layout (tuple, optional): Grid layout as (rows, columns)
+            cell_size (tuple, optional): Size of each grid cell as (width, height)
         
-        return annotated_img
+        Returns:
+            PIL.Image: Grid visualization image
+        """
+        if not images:
+            logger.error("No images provided for grid visualization")
+            return None
+        
+        num_images = len(images)
+        
+        # Determine layout if not specified
+        if not layout:
+            if num_images <= 2:
+                layout = (1, 2)  # 1 row, 2 columns
+            elif num_images <= 4:
+                layout = (2, 2)  # 2 rows, 2 columns
+            else:
+                layout = (3, 2)  # 3 rows, 2 columns
+        
+        rows, cols = layout
+        
+        # If there are more grid cells than images, adjust the layout
+        if rows * cols > num_images:
+            if cols > 1:
+                cols = min(cols, num_images)
+            rows = (num_images + cols - 1) // cols
+        
+        logger.info(f"Creating grid with layout {rows}x{cols} for {num_images} images")
+        
+        # Determine cell size if not specified
+        if not cell_size:
+            cell_size = (max(img.width for img in images), max(img.height for img in images))
+        
+        return self.render([GridCell(img) for img in images], (rows, cols), cell_size)
     
-    def _draw_arrowhead(self, draw, p2, p1, color, size=10):
+    def arrowhead(self, p2, p1, size=10):
         """
-        Draw an arrowhead at p2 pointing from p1 to p2.
+        Get the triangle of an arrowhead at p2 pointing from p1 to p2.
         
         Args:
-            draw (PIL.ImageDraw): Drawing context
             p2 (tuple): End point (x, y)
             p1 (tuple): Start point (x, y)
-            color (tuple): Arrow color (R, G, B)
-            size (int): Arrowhead size
+            size (float): Arrowhead size
+        
+        Returns:
+            list: Corner points of the arrowhead, starting at its tip
         """
         import math
         
@@ -326,5 +1080,17 @@ class GridGenerator:
         x4 = x2 - size * math.cos(angle + math.pi/6)
         y4 = y2 - size * math.sin(angle + math.pi/6)
         
-        # Draw the arrowhead
-        draw.polygon([(x2, y2), (x3, y3), (x4, y4)], fill=color)
+        return [(x2, y2), (x3, y3), (x4, y4)]
+    
+    def _draw_arrowhead(self, draw, p2, p1, color, size=10):
+        """
+        Draw an arrowhead at p2 pointing from p1 to p2.
+        
+        Args:
+            draw (PIL.ImageDraw): Drawing context
+            p2 (tuple): End point (x, y)
+            p1 (tuple): Start point (x, y)
+            color (tuple): Arrow color (R, G, B)
+            size (int): Arrowhead size
+        """
+        draw.polygon(self.arrowhead(p2, p1, size), fill=color)
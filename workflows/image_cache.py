@@ -0,0 +1,319 @@
+"""
+Image cache for SEM Image Workflow Manager.
+Provides cached, downsampled grayscale proxies of SEM images for fast analysis,
+cached resampled copies of images for rendering grid cells, and cached rendered
+grid cells for refreshing previews.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+from utils.logger import Logger
+from utils.config import config
+from workflows.windowing import apply_window
+
+logger = Logger(__name__)
+
+# Resampling settings per render quality as (filter, reducing_gap)
+RESAMPLE_QUALITY = {
+    "preview": (Image.BILINEAR, 2.0),
+    "export": (Image.LANCZOS, None)
+}
+
+
+def get_resample_settings(quality):
+    """
+    Get the resampling filter and reducing gap for a render quality.
+    
+    Args:
+        quality (str): "preview" for fast interactive rendering or "export"
+            for full quality output
+    
+    Returns:
+        tuple: (filter, reducing_gap) to pass to PIL's resize
+    """
+    return RESAMPLE_QUALITY.get(quality, RESAMPLE_QUALITY["export"])
+
+
+class ProxyCache:
+    """
+    LRU cache of downsampled grayscale proxies keyed by image path and size.
+    """
+    
+    def __init__(self, max_entries=128):
+        """
+        Initialize proxy cache.
+        
+        Args:
+            max_entries (int): Maximum number of proxies kept in memory
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, image_path, max_size=256):
+        """
+        Get a grayscale proxy of an image, loading it on a cache miss.
+        
+        Args:
+            image_path (str): Path to the image file
+            max_size (int): Maximum width/height of the proxy in pixels
+        
+        Returns:
+            numpy.ndarray: Proxy as a 2D float32 array, or None if loading failed
+        """
+        try:
+            mtime = os.path.getmtime(image_path)
+        except OSError:
+            logger.error(f"Image file does not exist: {image_path}")
+            return None
+        
+        key = (image_path, mtime, max_size)
+        
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        
+        proxy = self._load_proxy(image_path, max_size)
+        if proxy is None:
+            return None
+        
+        with self._lock:
+            self._entries[key] = proxy
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        
+        return proxy
+    
+    def clear(self):
+        """Remove all cached proxies."""
+        with self._lock:
+            self._entries.clear()
+    
+    def _load_proxy(self, image_path, max_size):
+        """
+        Decode an image and reduce it to a grayscale proxy.
+        
+        Args:
+            image_path (str): Path to the image file
+            max_size (int): Maximum width/height of the proxy in pixels
+        
+        Returns:
+            numpy.ndarray: Proxy as a 2D float32 array, or None if loading failed
+        """
+        try:
+            with Image.open(image_path) as img:
+                # Let JPEG decoders scale during decode; a no-op for TIFF
+                img.draft('L', (max_size, max_size))
+                proxy = apply_window(img, image_path).convert('L')
+            
+            # reducing_gap does a cheap integer box reduction before filtering
+            proxy.thumbnail((max_size, max_size), Image.BILINEAR, reducing_gap=2.0)
+            return np.asarray(proxy, dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Error creating proxy for {image_path}: {str(e)}")
+            return None
+
+
+class ResampleCache:
+    """
+    LRU cache of resampled images keyed by image path, target size and filter.
+    
+    Entries are evicted by total pixel memory rather than count, since cell-sized
+    images range from thumbnails to full-resolution frames.
+    """
+    
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Initialize resample cache.
+        
+        Args:
+            max_bytes (int): Approximate memory budget for cached images
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def size_bytes(self):
+        """Approximate memory held by cached images."""
+        return self._size_bytes
+    
+    def get(self, image_path, size, resample=Image.LANCZOS, reducing_gap=None, window=None):
+        """
+        Get an image resampled to a target size, resampling it on a cache miss.
+        
+        Args:
+            image_path (str): Path to the image file
+            size (tuple): Target size as (width, height)
+            resample (int): PIL resampling filter
+            reducing_gap (float, optional): Allow a cheap integer reduction before
+                filtering when downscaling by more than this factor
+            window (tuple, optional): Intensity window for high bit depth images
+                (see windowing.window_settings)
+        
+        Returns:
+            PIL.Image: Resampled image, or None if loading failed. The image is
+                shared with the cache and must not be modified.
+        """
+        try:
+            mtime = os.path.getmtime(image_path)
+        except OSError:
+            logger.error(f"Image file does not exist: {image_path}")
+            return None
+        
+        size = (int(size[0]), int(size[1]))
+        key = (image_path, mtime, size, resample, reducing_gap, window)
+        
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        
+        img = self._load_resampled(image_path, size, resample, reducing_gap, window)
+        if img is None:
+            return None
+        
+        entry_bytes = img.width * img.height * len(img.getbands())
+        if entry_bytes > self.max_bytes:
+            return img
+        
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = img
+                self._size_bytes += entry_bytes
+            
+            while self._size_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size_bytes -= evicted.width * evicted.height * len(evicted.getbands())
+        
+        return img
+    
+    def clear(self):
+        """Remove all cached images."""
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+    
+    def _load_resampled(self, image_path, size, resample, reducing_gap, window=None):
+        """
+        Decode an image and resample it to the target size.
+        
+        Args:
+            image_path (str): Path to the image file
+            size (tuple): Target size as (width, height)
+            resample (int): PIL resampling filter
+            reducing_gap (float, optional): Reducing gap passed to resize
+            window (tuple, optional): Intensity window for high bit depth images
+        
+        Returns:
+            PIL.Image: Resampled image, or None if loading failed
+        """
+        try:
+            with Image.open(image_path) as img:
+                # Let JPEG decoders scale by 1/2, 1/4 or 1/8 during decode while
+                # staying at least as large as the target; a no-op for TIFF
+                img.draft(img.mode, size)
+                img = apply_window(img, image_path, window)
+                
+                if img.mode not in ("1", "L", "RGB", "RGBA"):
+                    img = img.convert("RGB")
+                
+                return img.resize(size, resample, reducing_gap=reducing_gap)
+        except Exception as e:
+            logger.error(f"Error resampling {image_path}: {str(e)}")
+            return None
+
+
+class CellCache:
+    """
+    LRU cache of rendered grid cells keyed by image path and a render key.
+    
+    The render key identifies everything else that went into the cell, such as
+    its size and fit. Overlays are drawn after the cell is taken from the cache,
+    so they are not part of the key. Entries are dropped when the image file changes.
+    """
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        Initialize cell cache.
+        
+        Args:
+            max_bytes (int): Approximate memory budget for cached cells
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def size_bytes(self):
+        """Approximate memory held by cached cells."""
+        return self._size_bytes
+    
+    def get(self, image_path, key):
+        """
+        Get a rendered cell.
+        
+        Args:
+            image_path (str): Path to the cell's image file
+            key: Hashable render key
+        
+        Returns:
+            PIL.Image: Rendered cell, or None if it is not cached. The image is
+                shared with the cache and must not be modified.
+        """
+        try:
+            mtime = os.path.getmtime(image_path)
+        except OSError:
+            return None
+        
+        with self._lock:
+            img = self._entries.get((image_path, mtime, key))
+            if img is not None:
+                self._entries.move_to_end((image_path, mtime, key))
+            return img
+    
+    def put(self, image_path, key, img):
+        """
+        Store a rendered cell.
+        
+        Args:
+            image_path (str): Path to the cell's image file
+            key: Hashable render key
+            img (PIL.Image): Rendered cell
+        """
+        try:
+            mtime = os.path.getmtime(image_path)
+        except OSError:
+            return
+        
+        entry_bytes = img.width * img.height * len(img.getbands())
+        if entry_bytes > self.max_bytes:
+            return
+        
+        with self._lock:
+            if (image_path, mtime, key) not in self._entries:
+                self._entries[(image_path, mtime, key)] = img
+                self._size_bytes += entry_bytes
+            
+            while self._size_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size_bytes -= evicted.width * evicted.height * len(evicted.getbands())
+    
+    def clear(self):
+        """Remove all cached cells."""
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+
+# Create global cache instances
+proxy_cache = ProxyCache()
+resample_cache = ResampleCache(int(config.get('image_cache.resample_cache_mb', 256)) * 1024 * 1024)
+cell_cache = CellCache(int(config.get('image_cache.cell_cache_mb', 64)) * 1024 * 1024)
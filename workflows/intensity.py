@@ -0,0 +1,138 @@
+"""
+Intensity normalization for SEM Image Workflow Manager.
+Matches the brightness and contrast of images acquired with different detector
+settings by histogram matching, so samples can be compared side by side.
+"""
+
+import numpy as np
+from PIL import Image
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+# Intensity levels of 8-bit images
+LEVELS = 256
+
+# Cumulative fractions at which intensity distributions are sampled
+QUANTILES = (np.arange(LEVELS) + 0.5) / LEVELS
+
+
+def proxy_histogram(img, max_size=256):
+    """
+    Compute the intensity histogram of an image from a downsampled grayscale proxy.
+    
+    Args:
+        img (PIL.Image): Image
+        max_size (int): Approximate maximum width/height of the proxy in pixels
+    
+    Returns:
+        numpy.ndarray: Pixel counts per intensity level (LEVELS entries)
+    """
+    pixels = np.asarray(img if img.mode == "L" else img.convert("L"))
+    
+    # Sample every n-th pixel; averaging would smooth out noise and narrow the histogram
+    step = max(1, max(pixels.shape) // max_size)
+    return np.bincount(pixels[::step, ::step].ravel(), minlength=LEVELS)
+
+
+def cumulative_distribution(histogram):
+    """
+    Normalize a histogram to a cumulative distribution.
+    
+    Args:
+        histogram (numpy.ndarray): Pixel counts per intensity level
+    
+    Returns:
+        numpy.ndarray: Fraction of pixels at or below each level, ending at 1
+    """
+    cdf = np.cumsum(histogram, dtype=np.float64)
+    if cdf[-1] <= 0:
+        return np.linspace(1.0 / LEVELS, 1.0, LEVELS)
+    return cdf / cdf[-1]
+
+
+def quantile_function(cdf):
+    """
+    Get the intensity levels at evenly spaced cumulative fractions of a distribution.
+    
+    Args:
+        cdf (numpy.ndarray): Cumulative distribution
+    
+    Returns:
+        numpy.ndarray: Intensity level at each of QUANTILES
+    """
+    levels = np.searchsorted(cdf, QUANTILES, side="left")
+    return np.minimum(levels, LEVELS - 1).astype(np.float64)
+
+
+def matching_lut(source_cdf, reference_quantiles):
+    """
+    Build the lookup table that maps one intensity distribution onto another.
+    
+    Args:
+        source_cdf (numpy.ndarray): Cumulative distribution of the image to adjust
+        reference_quantiles (numpy.ndarray): Quantile function of the distribution to match
+    
+    Returns:
+        numpy.ndarray: uint8 lookup table with LEVELS entries
+    """
+    # Rank each level by the middle of its pixels, then read the reference level at that rank
+    ranks = (source_cdf + np.concatenate(([0.0], source_cdf[:-1]))) / 2.0
+    lut = np.interp(ranks, QUANTILES, reference_quantiles)
+    return np.clip(np.rint(lut), 0, LEVELS - 1).astype(np.uint8)
+
+
+def apply_lut(img, lut):
+    """
+    Map the intensities of an image through a lookup table.
+    
+    Args:
+        img (PIL.Image): 8-bit grayscale or RGB image; other modes are converted to grayscale
+        lut (numpy.ndarray): uint8 lookup table with LEVELS entries
+    
+    Returns:
+        PIL.Image: Adjusted image
+    """
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("L")
+    
+    pixels = np.take(lut, np.asarray(img))
+    return Image.fromarray(pixels, img.mode)
+
+
+def match_intensities(images, reference=None, max_size=256):
+    """
+    Normalize the intensities of a set of images to a common distribution.
+    
+    Histograms come from downsampled proxies and each image is adjusted with
+    a single table lookup, so normalization costs a few milliseconds per image.
+    
+    Args:
+        images (list): PIL images
+        reference (int, optional): Index of the image whose distribution the others
+            are matched to; by default all images are matched to the average of their
+            distributions (the mean of their quantile functions)
+        max_size (int): Approximate maximum width/height of the histogram proxies
+    
+    Returns:
+        list: Adjusted PIL images, in the same order
+    """
+    if len(images) < 2:
+        return list(images)
+    
+    cdfs = [cumulative_distribution(proxy_histogram(img, max_size)) for img in images]
+    
+    if reference is None:
+        reference_quantiles = np.mean([quantile_function(cdf) for cdf in cdfs], axis=0)
+    else:
+        reference_quantiles = quantile_function(cdfs[reference])
+    
+    adjusted = []
+    for index, (img, cdf) in enumerate(zip(images, cdfs)):
+        if index == reference:
+            adjusted.append(img)
+            continue
+        adjusted.append(apply_lut(img, matching_lut(cdf, reference_quantiles)))
+    
+    logger.info(f"Normalized intensities of {len(images)} images")
+    return adjusted
@@ -4,11 +4,9 @@ Creates hierarchical visualizations of the same scene at different magnification
 """
 
 import os
-import numpy as np
-import cv2
-from PIL import Image, ImageDraw, ImageFont
 from utils.logger import Logger
 from workflows.workflow_base import WorkflowBase
+from workflows.grid_generator import GridGenerator, GridCell
 
 logger = Logger(__name__)
 
@@ -189,6 +187,9 @@ class MagGridWorkflow(WorkflowBase):
         Returns:
             tuple: (x, y, width, height) of the match rectangle, or None if no match found
         """
+        # Deferred import - OpenCV is slow to load and only needed for template matching
+        import cv2
+        
         try:
             # Get metadata for both images
             low_metadata = self.session_manager.metadata.get(low_img_path)
@@ -256,7 +257,9 @@ class MagGridWorkflow(WorkflowBase):
         Args:
             collection: MagGrid collection to visualize
             layout (tuple, optional): Grid layout as (rows, columns)
-            options (dict, optional): Annotation options
+            options (dict, optional): Annotation and render options; "quality" is
+                "preview" (default) or "export", and "target_size" bounds the size of
+                the rendered image as (width, height)
             
         Returns:
             PIL.Image: Grid visualization image
@@ -287,38 +290,34 @@ class MagGridWorkflow(WorkflowBase):
         rows, cols = layout
         logger.info(f"Creating MagGrid with layout {rows}x{cols} for {num_images} images")
         
+        # Previews are rendered at screen size; export re-renders the same settings at full size
+        quality = options.get("quality", "preview")
+        self._store_render_settings(collection, layout, options)
+        
+        # Increased spacing between images (was 4)
+        generator = GridGenerator(spacing=10, quality=quality, target_size=options.get("target_size"),
+                                  stream=options.get("stream", False))
+        
         # Load all images
-        pil_images = []
-        for img_data in images:
-            try:
-                img_path = img_data["path"]
-                img = Image.open(img_path)
-                pil_images.append(img)
-            except Exception as e:
-                logger.error(f"Error loading image {img_path}: {str(e)}")
-                return None
+        pil_images = generator.open_images([img_data["path"] for img_data in images])
+        if any(img is None for img in pil_images):
+            generator.close()
+            return None
         
         # Determine the size of grid cells (use the max width and height)
         cell_width = max(img.width for img in pil_images)
         cell_height = max(img.height for img in pil_images)
+        cell_size = (cell_width, cell_height)
         
-        # Create a blank grid image with spacing
-        spacing = 10  # Increased spacing between images (was 4)
-        grid_width = cols * cell_width + (cols - 1) * spacing
-        grid_height = rows * cell_height + (rows - 1) * spacing
-        grid_img = Image.new('RGB', (grid_width, grid_height), color='white')
-        
-        # Place images in the grid
         # For MagGrid, we place from lowest to highest magnification
         # left to right, top to bottom
-        draw = ImageDraw.Draw(grid_img)
-        
-        try:
-            # Try to load a font
-            font = ImageFont.truetype("arial.ttf", 10)
-        except IOError:
-            # Fallback to default font
-            font = ImageFont.load_default()
+        # Window 16-bit and float images to 8 bits as they are drawn
+        from workflows.windowing import window_settings
+        cells = [
+            GridCell(img, path=img_data["path"], window=window_settings(options, img_data.get("metadata_dict")))
+            for img_data, img in zip(images, pil_images)
+        ]
+        font_size = 10
         
         # Define colors for bounding boxes
         box_colors = [
@@ -330,41 +329,32 @@ class MagGridWorkflow(WorkflowBase):
             (0, 255, 255),  # Cyan
         ]
         
-        # Place images and draw bounding boxes
-        for i, (img_data, img) in enumerate(zip(images, pil_images)):
-            row = i // cols
-            col = i % cols
-            
-            # Calculate position
-            x = col * (cell_width + spacing)
-            y = row * (cell_height + spacing)
+        # Describe labels and bounding boxes as overlays in cell coordinates
+        for i, (img_data, cell) in enumerate(zip(images, cells)):
+            x_offset, y_offset = cell.image_offset(cell_size)
             
-            # Center the image in its cell
-            x_offset = (cell_width - img.width) // 2
-            y_offset = (cell_height - img.height) // 2
-            
-            # Paste the image
-            grid_img.paste(img, (x + x_offset, y + y_offset))
-            
-            # Draw magnification label
+            # Magnification label
             mag = img_data["metadata_dict"]["magnification"]
-            label = f"{mag}x"
-            draw.text((x + 5, y + 5), label, fill=(255, 255, 255), font=font, stroke_width=1, stroke_fill=(0, 0, 0))
+            cell.overlays.append({
+                "type": "text", "text": f"{mag}x", "position": (5, 5), "color": (255, 255, 255),
+                "font_size": font_size, "stroke_width": 1, "stroke_color": (0, 0, 0)
+            })
             
             # Add filename label if requested
             if options.get("label_style") == "filename":
                 try:
                     filename = os.path.basename(img_data["path"])
-                    # Draw filename at the top left corner of the image
-                    label_x = x + x_offset
-                    label_y = y + y_offset - 15  # Position above the image
+                    # Filename at the top left corner of the image, above it
+                    label_position = (x_offset, y_offset - 15)
                     
                     # Add a background for better readability
-                    text_bbox = draw.textbbox((label_x, label_y), filename, font=font)
-                    draw.rectangle(text_bbox, fill="white")
+                    left, top, right, bottom = generator.text_bbox(filename, font_size, label_position)
+                    cell.overlays.append({"type": "box", "box": (left, top, right - left, bottom - top), "fill": "white"})
                     
-                    # Draw text
-                    draw.text((label_x, label_y), filename, fill=(0, 0, 0), font=font)
+                    cell.overlays.append({
+                        "type": "text", "text": filename, "position": label_position,
+                        "color": (0, 0, 0), "font_size": font_size
+                    })
                     logger.debug(f"Added filename label: {filename}")
                 except Exception as e:
                     logger.error(f"Error adding filename label: {str(e)}")
@@ -386,97 +376,39 @@ class MagGridWorkflow(WorkflowBase):
                     # Get line thickness
                     line_thickness = options.get("line_thickness", 2)
                     
-                    # Draw bounding box based on style
+                    # Box position within this cell
                     mx, my, mw, mh = match_rect
-                    
-                    # Calculate absolute coordinates in the grid
-                    box_x = x + x_offset + mx
-                    box_y = y + y_offset + my
-                    
-                    # Calculate right and bottom edges
+                    box_x = x_offset + mx
+                    box_y = y_offset + my
                     box_right = box_x + mw
                     box_bottom = box_y + mh
                     
-                    # Log the box coordinates for debugging
-                    logger.debug(f"Drawing box at ({box_x}, {box_y}) to ({box_right}, {box_bottom})")
+                    logger.debug(f"Box at ({box_x}, {box_y}) to ({box_right}, {box_bottom}) in cell {i}")
                     
-                    # Draw the box according to selected style
-                    if options["box_style"] == "solid":
-                        # Draw rectangle using the exact coordinates from template matching
-                        draw.rectangle(
-                            [box_x, box_y, box_right, box_bottom],
-                            outline=color,
-                            width=line_thickness
-                        )
-                    elif options["box_style"] == "dotted":
-                        # Draw dotted rectangle by using short lines
-                        dots = 20  # Number of dots per side
-                        for d in range(dots):
-                            # Top edge
-                            tx1 = box_x + (mw * d / dots)
-                            tx2 = box_x + (mw * (d + 0.5) / dots)
-                            draw.line([(tx1, box_y), (tx2, box_y)], fill=color, width=line_thickness)
-                            
-                            # Bottom edge
-                            bx1 = box_x + (mw * d / dots)
-                            bx2 = box_x + (mw * (d + 0.5) / dots)
-                            draw.line([(bx1, box_bottom), (bx2, box_bottom)], fill=color, width=line_thickness)
-                            
-                            # Left edge
-                            ly1 = box_y + (mh * d / dots)
-                            ly2 = box_y + (mh * (d + 0.5) / dots)
-                            draw.line([(box_x, ly1), (box_x, ly2)], fill=color, width=line_thickness)
-                            
-                            # Right edge
-                            ry1 = box_y + (mh * d / dots)
-                            ry2 = box_y + (mh * (d + 0.5) / dots)
-                            draw.line([(box_right, ry1), (box_right, ry2)], fill=color, width=line_thickness)
-                    elif options["box_style"] == "corners":
-                        # Draw just the corners (L shapes)
-                        corner_length = min(20, mw/4, mh/4)  # Length of corner lines
-                        
-                        # Top-left corner
-                        draw.line([(box_x, box_y), (box_x + corner_length, box_y)], fill=color, width=line_thickness)
-                        draw.line([(box_x, box_y), (box_x, box_y + corner_length)], fill=color, width=line_thickness)
-                        
-                        # Top-right corner
-                        draw.line([(box_right - corner_length, box_y), (box_right, box_y)], fill=color, width=line_thickness)
-                        draw.line([(box_right, box_y), (box_right, box_y + corner_length)], fill=color, width=line_thickness)
-                        
-                        # Bottom-left corner
-                        draw.line([(box_x, box_bottom - corner_length), (box_x, box_bottom)], fill=color, width=line_thickness)
-                        draw.line([(box_x, box_bottom), (box_x + corner_length, box_bottom)], fill=color, width=line_thickness)
-                        
-                        # Bottom-right corner
-                        draw.line([(box_right - corner_length, box_bottom), (box_right, box_bottom)], fill=color, width=line_thickness)
-                        draw.line([(box_right, box_bottom - corner_length), (box_right, box_bottom)], fill=color, width=line_thickness)
+                    # Rectangle using the exact coordinates from template matching; dotted
+                    # and corner styles are drawn by the grid engine from the same box
+                    cell.overlays.append({
+                        "type": "box", "box": (box_x, box_y, mw, mh), "color": color,
+                        "width": line_thickness, "style": options["box_style"]
+                    })
                     
-                    # Draw corresponding colored border on the next image
-                    if i+1 < len(images):
-                        next_row = (i+1) // cols
-                        next_col = (i+1) % cols
-                        next_x = next_col * (cell_width + spacing)
-                        next_y = next_row * (cell_height + spacing)
-                        next_img = pil_images[i+1]
-                        
-                        # Calculate offsets for centering
-                        next_x_offset = (cell_width - next_img.width) // 2
-                        next_y_offset = (cell_height - next_img.height) // 2
-                        
-                        # Draw colored border around the next image
-                        border_width = line_thickness
-                        next_box_x = next_x + next_x_offset
-                        next_box_y = next_y + next_y_offset
-                        draw.rectangle(
-                            [
-                                next_box_x - border_width,
-                                next_box_y - border_width,
-                                next_box_x + next_img.width + border_width,
-                                next_box_y + next_img.height + border_width
-                            ],
-                            outline=color,
-                            width=line_thickness
-                        )
+                    # Corresponding colored border around the next image
+                    next_cell = cells[i+1]
+                    next_x_offset, next_y_offset = next_cell.image_offset(cell_size)
+                    border_width = line_thickness
+                    next_cell.overlays.append({
+                        "type": "box",
+                        "box": (
+                            next_x_offset - border_width,
+                            next_y_offset - border_width,
+                            next_cell.image.width + 2 * border_width,
+                            next_cell.image.height + 2 * border_width
+                        ),
+                        "color": color,
+                        "width": line_thickness
+                    })
+        
+        grid_img = generator.render(cells, layout, cell_size)
         
         logger.info(f"Created MagGrid visualization with {num_images} images")
         return grid_img
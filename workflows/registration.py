@@ -0,0 +1,169 @@
+"""
+Cross-mode image registration for SEM Image Workflow Manager.
+Estimates sub-pixel drift between frames of the same scene by FFT phase correlation.
+"""
+
+import numpy as np
+from PIL import Image
+from utils.logger import Logger
+from workflows.image_cache import proxy_cache
+
+logger = Logger(__name__)
+
+# Cache of 2D Hann windows by proxy shape
+_windows = {}
+
+
+def _get_window(shape):
+    """
+    Get a 2D Hann window for the given shape, creating it on first use.
+    
+    Args:
+        shape (tuple): Array shape as (height, width)
+    
+    Returns:
+        numpy.ndarray: 2D float32 window
+    """
+    window = _windows.get(shape)
+    if window is None:
+        window = np.outer(np.hanning(shape[0]), np.hanning(shape[1])).astype(np.float32)
+        _windows[shape] = window
+    return window
+
+
+def _refine_peak(values, index):
+    """
+    Refine a correlation peak position with a parabolic fit through its neighbours.
+    
+    Args:
+        values (numpy.ndarray): 1D slice through the correlation surface
+        index (int): Integer position of the peak
+    
+    Returns:
+        float: Sub-pixel offset from the integer peak in the range [-0.5, 0.5]
+    """
+    n = len(values)
+    left = values[(index - 1) % n]
+    centre = values[index]
+    right = values[(index + 1) % n]
+    
+    denominator = left - 2 * centre + right
+    if denominator == 0:
+        return 0.0
+    
+    return float(np.clip(0.5 * (left - right) / denominator, -0.5, 0.5))
+
+
+def phase_correlation(reference, moving):
+    """
+    Estimate the translation of one image relative to another.
+    
+    The returned shift (dx, dy) is the displacement of the scene content in
+    `moving` relative to `reference`, i.e. moving(x) ~ reference(x - shift).
+    
+    Args:
+        reference (numpy.ndarray): Reference image as a 2D array
+        moving (numpy.ndarray): Image to register, same shape as reference
+    
+    Returns:
+        tuple: (dx, dy, confidence) with sub-pixel shifts in pixels and the
+            height of the normalized correlation peak
+    """
+    window = _get_window(reference.shape)
+    
+    ref = (reference - reference.mean()) * window
+    mov = (moving - moving.mean()) * window
+    
+    cross_power = np.fft.fft2(mov) * np.conj(np.fft.fft2(ref))
+    cross_power /= np.abs(cross_power) + 1e-9
+    surface = np.fft.ifft2(cross_power).real
+    
+    peak_y, peak_x = np.unravel_index(np.argmax(surface), surface.shape)
+    confidence = float(surface[peak_y, peak_x])
+    
+    dy = peak_y + _refine_peak(surface[:, peak_x], peak_y)
+    dx = peak_x + _refine_peak(surface[peak_y, :], peak_x)
+    
+    # Shifts beyond half the frame wrap around to negative values
+    height, width = surface.shape
+    if dy > height / 2:
+        dy -= height
+    if dx > width / 2:
+        dx -= width
+    
+    return dx, dy, confidence
+
+
+def register_images(image_paths, reference_index=0, proxy_size=256):
+    """
+    Register a set of images of the same scene against a reference image.
+    
+    All images are compared on cached downsampled proxies resampled to the
+    reference proxy's shape, so frames of different pixel sizes can be mixed.
+    
+    Args:
+        image_paths (list): Paths to the images to register
+        reference_index (int): Index of the reference image in image_paths
+        proxy_size (int): Maximum width/height of the proxies in pixels
+    
+    Returns:
+        list: One dict per image with "shift" as (dx, dy) fractions of the
+            frame size and "confidence", or None if the reference failed to load
+    """
+    reference = proxy_cache.get(image_paths[reference_index], proxy_size)
+    if reference is None:
+        logger.error(f"Could not load reference image for registration: {image_paths[reference_index]}")
+        return None
+    
+    height, width = reference.shape
+    results = []
+    
+    for i, image_path in enumerate(image_paths):
+        if i == reference_index:
+            results.append({"shift": (0.0, 0.0), "confidence": 1.0})
+            continue
+        
+        moving = proxy_cache.get(image_path, proxy_size)
+        if moving is None:
+            results.append({"shift": (0.0, 0.0), "confidence": 0.0})
+            continue
+        
+        # Bring the proxy onto the reference proxy's pixel grid
+        if moving.shape != reference.shape:
+            moving = np.asarray(
+                Image.fromarray(moving, mode='F').resize((width, height), Image.BILINEAR),
+                dtype=np.float32
+            )
+        
+        dx, dy, confidence = phase_correlation(reference, moving)
+        results.append({
+            "shift": (dx / width, dy / height),
+            "confidence": confidence
+        })
+        
+        logger.debug(f"Registered {image_path}: shift ({dx:.2f}, {dy:.2f}) proxy px, confidence {confidence:.3f}")
+    
+    return results
+
+
+def common_overlap(shifts, frame_size):
+    """
+    Calculate the region of the reference frame covered by every shifted image.
+    
+    Args:
+        shifts (list): Per-image (dx, dy) shifts in pixels of the common frame
+        frame_size (tuple): Size of the common frame as (width, height)
+    
+    Returns:
+        tuple: (left, top, width, height) of the overlap in reference frame
+            coordinates; width and height are 0 if the images do not overlap
+    """
+    frame_width, frame_height = frame_size
+    
+    # Reference coordinate u is visible in image i at u + shift_i
+    left = max(-dx for dx, _ in shifts + [(0.0, 0.0)])
+    top = max(-dy for _, dy in shifts + [(0.0, 0.0)])
+    right = min(frame_width - dx for dx, _ in shifts + [(0.0, 0.0)])
+    bottom = min(frame_height - dy for _, dy in shifts + [(0.0, 0.0)])
+    
+    return left, top, max(0, int(right - left)), max(0, int(bottom - top))
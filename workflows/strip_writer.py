@@ -0,0 +1,323 @@
+"""
+Streaming image writers for SEM Image Workflow Manager.
+Write PNG and TIFF files from horizontal strips of pixels, so very large grids
+can be exported without holding the whole image in memory.
+"""
+
+import os
+import struct
+import zlib
+from fractions import Fraction
+
+import numpy as np
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# PNG colour types and TIFF photometric interpretations per image mode
+PNG_COLOR_TYPES = {"L": 0, "RGB": 2}
+TIFF_PHOTOMETRIC = {"L": 1, "RGB": 2}
+
+# TIFF field types as (type code, struct format)
+TIFF_SHORT = (3, "H")
+TIFF_LONG = (4, "I")
+TIFF_RATIONAL = (5, "II")
+TIFF_LONG8 = (16, "Q")
+
+# Classic TIFF offsets are 32-bit; larger files are written as BigTIFF
+TIFF_CLASSIC_LIMIT = 2 ** 32 - 2 ** 26
+
+
+def _strip_pixels(strip, mode):
+    """
+    Get the pixels of a strip as a (rows, width * bands) uint8 array.
+    
+    Args:
+        strip: PIL image or numpy array holding whole rows
+        mode (str): "L" or "RGB"
+    
+    Returns:
+        numpy.ndarray: Pixel rows
+    """
+    if hasattr(strip, "mode") and strip.mode != mode:
+        strip = strip.convert(mode)
+    pixels = np.asarray(strip, dtype=np.uint8)
+    return pixels.reshape(pixels.shape[0], -1)
+
+
+class PngStripWriter:
+    """
+    Write a PNG file row by row through zlib.
+    
+    Rows are filtered with the PNG "Up" filter, which suits the smooth gradients of
+    SEM images and can be computed for a whole strip at once.
+    """
+    
+    def __init__(self, path, size, mode="RGB", dpi=None, compress_level=6):
+        """
+        Initialize PNG writer and write the file header.
+        
+        Args:
+            path (str): Output file path
+            size (tuple): Image size as (width, height)
+            mode (str): "L" or "RGB"
+            dpi (tuple, optional): Resolution as (x, y) dots per inch
+            compress_level (int): zlib compression level (0-9)
+        """
+        if mode not in PNG_COLOR_TYPES:
+            raise ValueError(f"Unsupported image mode for PNG streaming: {mode}")
+        
+        self.path = path
+        self.width, self.height = size
+        self.mode = mode
+        self.rows_written = 0
+        self._previous = np.zeros(self.width * len(mode), dtype=np.uint8)
+        self._compressor = zlib.compressobj(compress_level)
+        self._file = open(path, 'wb')
+        
+        self._file.write(PNG_SIGNATURE)
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, PNG_COLOR_TYPES[mode], 0, 0, 0))
+        if dpi:
+            # Physical pixel size in pixels per metre
+            self._chunk(b'pHYs', struct.pack('>IIB', round(dpi[0] / 0.0254), round(dpi[1] / 0.0254), 1))
+    
+    def write(self, strip):
+        """
+        Append rows to the image.
+        
+        Args:
+            strip: PIL image or numpy array of the next rows, as wide as the image
+        """
+        pixels = _strip_pixels(strip, self.mode)
+        
+        # Up filter: each row minus the row above it, wrapping around in uint8
+        rows = np.empty((pixels.shape[0], pixels.shape[1] + 1), dtype=np.uint8)
+        rows[:, 0] = 2
+        rows[:, 1:] = np.diff(pixels, axis=0, prepend=self._previous[np.newaxis])
+        
+        data = self._compressor.compress(rows.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+        
+        self._previous = pixels[-1].copy()
+        self.rows_written += pixels.shape[0]
+    
+    def close(self):
+        """Finish the compressed stream and close the file."""
+        if self._file is None:
+            return
+        
+        try:
+            self._chunk(b'IDAT', self._compressor.flush())
+            self._chunk(b'IEND', b'')
+        finally:
+            self._file.close()
+            self._file = None
+        
+        if self.rows_written != self.height:
+            logger.warning(f"Wrote {self.rows_written} of {self.height} rows to {self.path}")
+    
+    def _chunk(self, kind, data):
+        """Write a PNG chunk with its length and CRC."""
+        self._file.write(struct.pack('>I', len(data)) + kind + data)
+        self._file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TiffStripWriter:
+    """
+    Write a deflate-compressed, strip-organized TIFF file.
+    
+    Strips are compressed and written as rows arrive, and the directory is written
+    at the end, once all strip offsets are known. Files that may exceed the 4 GB
+    limit of classic TIFF are written as BigTIFF.
+    """
+    
+    def __init__(self, path, size, mode="RGB", dpi=None, rows_per_strip=256, compress_level=6, bigtiff=None):
+        """
+        Initialize TIFF writer and write the file header.
+        
+        Args:
+            path (str): Output file path
+            size (tuple): Image size as (width, height)
+            mode (str): "L" or "RGB"
+            dpi (tuple, optional): Resolution as (x, y) dots per inch
+            rows_per_strip (int): Rows per TIFF strip
+            compress_level (int): zlib compression level (0-9)
+            bigtiff (bool, optional): Write BigTIFF; by default only when the
+                uncompressed image would not fit in a classic TIFF
+        """
+        if mode not in TIFF_PHOTOMETRIC:
+            raise ValueError(f"Unsupported image mode for TIFF streaming: {mode}")
+        
+        self.path = path
+        self.width, self.height = size
+        self.mode = mode
+        self.dpi = dpi
+        self.rows_per_strip = max(1, rows_per_strip)
+        self.compress_level = compress_level
+        self.rows_written = 0
+        
+        if bigtiff is None:
+            bigtiff = self.width * self.height * len(mode) > TIFF_CLASSIC_LIMIT
+        self.bigtiff = bigtiff
+        
+        self._strips = []  # (offset, byte count)
+        self._pending = None
+        self._file = open(path, 'wb')
+        
+        # Header; the directory offset is filled in on close
+        if bigtiff:
+            self._file.write(b'II' + struct.pack('<HHHQ', 43, 8, 0, 0))
+        else:
+            self._file.write(b'II' + struct.pack('<HI', 42, 0))
+    
+    def write(self, strip):
+        """
+        Append rows to the image.
+        
+        Args:
+            strip: PIL image or numpy array of the next rows, as wide as the image
+        """
+        pixels = _strip_pixels(strip, self.mode)
+        if self._pending is not None:
+            pixels = np.concatenate([self._pending, pixels])
+            self._pending = None
+        
+        complete = pixels.shape[0] - pixels.shape[0] % self.rows_per_strip
+        for top in range(0, complete, self.rows_per_strip):
+            self._write_strip(pixels[top:top + self.rows_per_strip])
+        
+        if complete < pixels.shape[0]:
+            self._pending = pixels[complete:].copy()
+    
+    def close(self):
+        """Write the remaining rows and the image directory, then close the file."""
+        if self._file is None:
+            return
+        
+        try:
+            if self._pending is not None:
+                self._write_strip(self._pending)
+                self._pending = None
+            self._write_directory()
+        finally:
+            self._file.close()
+            self._file = None
+        
+        if self.rows_written != self.height:
+            logger.warning(f"Wrote {self.rows_written} of {self.height} rows to {self.path}")
+    
+    def _write_strip(self, pixels):
+        """Compress and write one TIFF strip."""
+        bands = len(self.mode)
+        
+        # Horizontal differencing predictor: each sample minus the same sample of the pixel to its left
+        samples = pixels.reshape(pixels.shape[0], self.width, bands)
+        predicted = np.diff(samples, axis=1, prepend=np.zeros((pixels.shape[0], 1, bands), dtype=np.uint8))
+        
+        data = zlib.compress(predicted.tobytes(), self.compress_level)
+        self._strips.append((self._file.tell(), len(data)))
+        self._file.write(data)
+        self.rows_written += pixels.shape[0]
+    
+    def _write_directory(self):
+        """Write the image file directory and point the header at it."""
+        bands = len(self.mode)
+        offset_type = TIFF_LONG8 if self.bigtiff else TIFF_LONG
+        
+        entries = [
+            (256, TIFF_LONG, [self.width]),
+            (257, TIFF_LONG, [self.height]),
+            (258, TIFF_SHORT, [8] * bands),
+            (259, TIFF_SHORT, [8]),  # Adobe deflate
+            (262, TIFF_SHORT, [TIFF_PHOTOMETRIC[self.mode]]),
+            (273, offset_type, [offset for offset, _ in self._strips]),
+            (277, TIFF_SHORT, [bands]),
+            (278, TIFF_LONG, [self.rows_per_strip]),
+            (279, offset_type, [count for _, count in self._strips]),
+            (284, TIFF_SHORT, [1]),  # Chunky planar configuration
+            (317, TIFF_SHORT, [2]),  # Horizontal differencing
+        ]
+        if self.dpi:
+            for tag, value in ((282, self.dpi[0]), (283, self.dpi[1])):
+                resolution = Fraction(value).limit_denominator(10000)
+                entries.append((tag, TIFF_RATIONAL, [(resolution.numerator, resolution.denominator)]))
+            entries.append((296, TIFF_SHORT, [2]))  # Inches
+        entries.sort(key=lambda entry: entry[0])
+        
+        if self.bigtiff:
+            count_format, entry_size, inline_size, offset_format = '<Q', 20, 8, '<Q'
+        else:
+            count_format, entry_size, inline_size, offset_format = '<H', 12, 4, '<I'
+        
+        # Word-align the directory
+        directory_offset = self._file.tell()
+        if directory_offset % 2:
+            self._file.write(b'\0')
+            directory_offset += 1
+        
+        extra_offset = (directory_offset + struct.calcsize(count_format)
+                        + len(entries) * entry_size + struct.calcsize(offset_format))
+        directory = struct.pack(count_format, len(entries))
+        extra = b''
+        
+        for tag, (type_code, value_format), values in entries:
+            if type_code == TIFF_RATIONAL[0]:
+                data = b''.join(struct.pack('<' + value_format, *value) for value in values)
+            else:
+                data = struct.pack(f'<{len(values)}{value_format}', *values)
+            
+            if len(data) <= inline_size:
+                value_field = data.ljust(inline_size, b'\0')
+            else:
+                value_field = struct.pack(offset_format, extra_offset + len(extra))
+                extra += data + (b'\0' if len(data) % 2 else b'')
+            
+            directory += struct.pack('<HH', tag, type_code)
+            directory += struct.pack('<Q' if self.bigtiff else '<I', len(values)) + value_field
+        
+        directory += struct.pack(offset_format, 0)  # No further directories
+        self._file.write(directory + extra)
+        
+        self._file.seek(8 if self.bigtiff else 4)
+        self._file.write(struct.pack(offset_format, directory_offset))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_strip_writer(path, size, mode="RGB", format=None, dpi=None, rows_per_strip=256):
+    """
+    Open a streaming writer for an image file.
+    
+    Args:
+        path (str): Output file path
+        size (tuple): Image size as (width, height)
+        mode (str): "L" or "RGB"
+        format (str, optional): "PNG" or "TIFF"; by default taken from the file extension
+        dpi (tuple, optional): Resolution as (x, y) dots per inch
+        rows_per_strip (int): Rows per TIFF strip
+    
+    Returns:
+        PngStripWriter or TiffStripWriter: Writer, or None if the format cannot be streamed
+    """
+    if format is None:
+        format = os.path.splitext(path)[1][1:]
+    format = format.upper()
+    
+    if format == "PNG":
+        return PngStripWriter(path, size, mode, dpi)
+    if format in ("TIF", "TIFF"):
+        return TiffStripWriter(path, size, mode, dpi, rows_per_strip)
+    return None
@@ -0,0 +1,437 @@
+"""
+Vector grid export for SEM Image Workflow Manager.
+Writes grids as SVG or PDF documents in which each cell is an embedded raster
+image and the labels, boxes and arrows drawn over it stay vector shapes, so
+annotations remain sharp at any print size and can be edited afterwards.
+"""
+
+import base64
+import io
+import os
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+from PIL import ImageColor
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+VECTOR_FORMATS = ("SVG", "PDF")
+
+# PDF points per inch; without a resolution one grid pixel is one point
+PDF_POINTS_PER_INCH = 72
+
+# Font used for PDF text; one of the standard fonts every PDF reader provides,
+# and metric-compatible with Arial, the label font on Windows
+PDF_FONT = "Helvetica"
+
+
+def vector_format(path, format=None):
+    """
+    Get the vector format a grid is saved in.
+    
+    Args:
+        path (str): Output file path
+        format (str, optional): Format name; by default taken from the file extension
+    
+    Returns:
+        str: "SVG" or "PDF", or None for other formats
+    """
+    if format is None:
+        format = os.path.splitext(path)[1][1:]
+    format = format.upper()
+    return format if format in VECTOR_FORMATS else None
+
+
+def _rgb(color):
+    """
+    Convert an overlay colour to an (R, G, B) tuple.
+    
+    Alpha is dropped, as it is when overlays are drawn on the RGB grid canvas.
+    
+    Args:
+        color: Colour name, "#rrggbb" string or (R, G, B[, A]) tuple
+    
+    Returns:
+        tuple: (R, G, B), or None for no colour
+    """
+    if color is None:
+        return None
+    if isinstance(color, str):
+        color = ImageColor.getrgb(color)
+    return tuple(int(c) for c in color[:3])
+
+
+def _png_rows(img):
+    """
+    Filter an image's rows with the PNG "Up" filter for Flate compression.
+    
+    Args:
+        img (PIL.Image): "L" or "RGB" image
+    
+    Returns:
+        bytes: Filtered rows, each prefixed with its filter type
+    """
+    pixels = np.asarray(img, dtype=np.uint8)
+    pixels = pixels.reshape(pixels.shape[0], -1)
+    rows = np.empty((pixels.shape[0], pixels.shape[1] + 1), dtype=np.uint8)
+    rows[:, 0] = 2
+    rows[:, 1:] = np.diff(pixels, axis=0, prepend=np.zeros((1, pixels.shape[1]), dtype=np.uint8))
+    return rows.tobytes()
+
+
+class SvgWriter:
+    """
+    Write an SVG document shape by shape.
+    
+    Coordinates are grid pixels; the document's physical size comes from the
+    resolution, and images are embedded as base64 PNG data.
+    """
+    
+    def __init__(self, path, size, dpi=None):
+        """
+        Initialize SVG writer and write the document header.
+        
+        Args:
+            path (str): Output file path
+            size (tuple): Grid size in pixels as (width, height)
+            dpi (tuple, optional): Resolution as (x, y) dots per inch; without it the
+                document is sized in CSS pixels
+        """
+        self.path = path
+        width, height = size
+        if dpi:
+            physical = f'width="{width / dpi[0]:.4f}in" height="{height / dpi[1]:.4f}in"'
+        else:
+            physical = f'width="{width}" height="{height}"'
+        
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self._file.write(f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+                         f'{physical} viewBox="0 0 {width} {height}">\n')
+    
+    def image(self, img, x, y):
+        """Embed an "L" or "RGB" image with its top-left corner at (x, y)."""
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG", compress_level=6)
+        self._file.write(f'<image x="{x}" y="{y}" width="{img.width}" height="{img.height}" '
+                         f'preserveAspectRatio="none" xlink:href="data:image/png;base64,')
+        self._file.write(base64.b64encode(buffer.getvalue()).decode('ascii'))
+        self._file.write('"/>\n')
+    
+    def rect(self, x, y, width, height, fill=None, stroke=None, line_width=0):
+        """Draw a rectangle, filled and/or stroked centred on its outline."""
+        self._file.write(f'<rect x="{x:.2f}" y="{y:.2f}" width="{width:.2f}" height="{height:.2f}" '
+                         f'{self._paint(fill, stroke, line_width)}/>\n')
+    
+    def line(self, start, end, color, line_width, dash=None):
+        """Draw a straight line, optionally dashed as (on, off) lengths."""
+        dash_attr = f' stroke-dasharray="{dash[0]:.3f} {dash[1]:.3f}"' if dash else ''
+        self._file.write(f'<line x1="{start[0]:.2f}" y1="{start[1]:.2f}" x2="{end[0]:.2f}" y2="{end[1]:.2f}" '
+                         f'{self._paint(None, color, line_width)}{dash_attr}/>\n')
+    
+    def polygon(self, points, fill):
+        """Draw a filled polygon."""
+        coordinates = " ".join(f"{px:.2f},{py:.2f}" for px, py in points)
+        self._file.write(f'<polygon points="{coordinates}" {self._paint(fill, None, 0)}/>\n')
+    
+    def text(self, x, baseline, text, font_size, family, fill, stroke=None, stroke_width=0):
+        """Draw a line of text with its baseline at the given height, optionally outlined."""
+        attributes = (f'x="{x:.2f}" y="{baseline:.2f}" font-family={quoteattr(family + ", sans-serif")} '
+                      f'font-size="{font_size}" xml:space="preserve"')
+        if stroke is not None and stroke_width:
+            # The outline is a separate element below the text, since not every
+            # renderer supports paint-order
+            self._file.write(f'<text {attributes} fill="none" stroke="{self._color(stroke)}" '
+                             f'stroke-width="{2 * stroke_width}" stroke-linejoin="round">{escape(text)}</text>\n')
+        self._file.write(f'<text {attributes} fill="{self._color(fill)}">{escape(text)}</text>\n')
+    
+    def close(self):
+        """Finish the document and close the file."""
+        if self._file is None:
+            return
+        try:
+            self._file.write('</svg>\n')
+        finally:
+            self._file.close()
+            self._file = None
+    
+    def _color(self, color):
+        return "#{:02x}{:02x}{:02x}".format(*_rgb(color))
+    
+    def _paint(self, fill, stroke, line_width):
+        fill_attr = f'fill="{self._color(fill)}"' if fill is not None else 'fill="none"'
+        if stroke is None or not line_width:
+            return fill_attr
+        return f'{fill_attr} stroke="{self._color(stroke)}" stroke-width="{line_width}"'
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PdfWriter:
+    """
+    Write a single-page PDF document.
+    
+    Images are written as Flate-compressed image objects as they arrive, so only
+    one cell is held in memory at a time; the page's drawing operators are kept
+    until the document is closed. Coordinates are grid pixels with the origin at
+    the top left, mapped onto the page by the content stream's transformation.
+    """
+    
+    def __init__(self, path, size, dpi=None):
+        """
+        Initialize PDF writer and write the file header.
+        
+        Args:
+            path (str): Output file path
+            size (tuple): Grid size in pixels as (width, height)
+            dpi (tuple, optional): Resolution as (x, y) dots per inch; without it one
+                pixel is one point
+        """
+        self.path = path
+        self.width, self.height = size
+        self.scale = (PDF_POINTS_PER_INCH / dpi[0], PDF_POINTS_PER_INCH / dpi[1]) if dpi else (1.0, 1.0)
+        
+        # Objects 1-5 are the catalog, page tree, page, font and page contents;
+        # images follow from 6
+        self._offsets = {}
+        self._images = []
+        self._operators = []
+        self._skipped_characters = set()
+        self._file = open(path, 'wb')
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        
+        # Flip to top-left pixel coordinates
+        page_width, page_height = self.width * self.scale[0], self.height * self.scale[1]
+        self._operators.append(f"{self.scale[0]:.6f} 0 0 {-self.scale[1]:.6f} 0 {page_height:.4f} cm")
+        self._media_box = f"[0 0 {page_width:.4f} {page_height:.4f}]"
+    
+    def image(self, img, x, y):
+        """Embed an "L" or "RGB" image with its top-left corner at (x, y)."""
+        number = 6 + len(self._images)
+        colors = len(img.getbands())
+        data = zlib.compress(_png_rows(img), 6)
+        self._write_object(number, (
+            f"<< /Type /XObject /Subtype /Image /Width {img.width} /Height {img.height} "
+            f"/ColorSpace /{'DeviceGray' if colors == 1 else 'DeviceRGB'} /BitsPerComponent 8 "
+            f"/Filter /FlateDecode /DecodeParms << /Predictor 15 /Colors {colors} "
+            f"/BitsPerComponent 8 /Columns {img.width} >> /Length {len(data)} >>"
+        ), data)
+        self._images.append(number)
+        
+        # Image space is a unit square with its first row at the top
+        self._operators.append(f"q {img.width} 0 0 {-img.height} {x} {y + img.height} cm "
+                               f"/Im{len(self._images)} Do Q")
+    
+    def rect(self, x, y, width, height, fill=None, stroke=None, line_width=0):
+        """Draw a rectangle, filled and/or stroked centred on its outline."""
+        path = f"{x:.2f} {y:.2f} {width:.2f} {height:.2f} re"
+        if fill is not None:
+            self._operators.append(f"{self._color(fill, 'rg')} {path} f")
+        if stroke is not None and line_width:
+            self._operators.append(f"q {self._color(stroke, 'RG')} {line_width} w {path} S Q")
+    
+    def line(self, start, end, color, line_width, dash=None):
+        """Draw a straight line, optionally dashed as (on, off) lengths."""
+        dash_operator = f"[{dash[0]:.3f} {dash[1]:.3f}] 0 d " if dash else ""
+        self._operators.append(f"q {self._color(color, 'RG')} {line_width} w {dash_operator}"
+                               f"{start[0]:.2f} {start[1]:.2f} m {end[0]:.2f} {end[1]:.2f} l S Q")
+    
+    def polygon(self, points, fill):
+        """Draw a filled polygon."""
+        path = " ".join(f"{px:.2f} {py:.2f} {'m' if i == 0 else 'l'}" for i, (px, py) in enumerate(points))
+        self._operators.append(f"{self._color(fill, 'rg')} {path} h f")
+    
+    def text(self, x, baseline, text, font_size, family, fill, stroke=None, stroke_width=0):
+        """
+        Draw a line of text with its baseline at the given height.
+        
+        Text is set in the standard Helvetica font with WinAnsi encoding; characters
+        outside it are left out.
+        """
+        # Greek mu is used for micro units; WinAnsi only has the micro sign
+        text = text.replace('\u03bc', '\u00b5')
+        encoded = text.encode('cp1252', errors='ignore')
+        if len(encoded) < len(text):
+            self._skipped_characters.update(c for c in text if not c.encode('cp1252', errors='ignore'))
+        string = encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)').decode('latin-1')
+        
+        # The text matrix flips glyphs upright again in the top-left coordinates
+        show = f"BT /F1 {font_size} Tf 1 0 0 -1 {x:.2f} {baseline:.2f} Tm ({string}) Tj ET"
+        if stroke is not None and stroke_width:
+            self._operators.append(f"q {self._color(stroke, 'RG')} {2 * stroke_width} w 1 j 1 Tr {show} Q")
+        self._operators.append(f"q {self._color(fill, 'rg')} 0 Tr {show} Q")
+    
+    def close(self):
+        """Write the page, its contents and the cross-reference table, then close the file."""
+        if self._file is None:
+            return
+        
+        try:
+            images = " ".join(f"/Im{i + 1} {number} 0 R" for i, number in enumerate(self._images))
+            self._write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+            self._write_object(2, "<< /Type /Pages /Kids [3 0 R] /Count 1 >>")
+            self._write_object(3, (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox {self._media_box} "
+                f"/Resources << /Font << /F1 4 0 R >> /XObject << {images} >> >> /Contents 5 0 R >>"
+            ))
+            self._write_object(4, f"<< /Type /Font /Subtype /Type1 /BaseFont /{PDF_FONT} /Encoding /WinAnsiEncoding >>")
+            
+            contents = zlib.compress("\n".join(self._operators).encode('latin-1'), 6)
+            self._write_object(5, f"<< /Filter /FlateDecode /Length {len(contents)} >>", contents)
+            
+            xref_offset = self._file.tell()
+            count = max(self._offsets) + 1
+            self._file.write(f"xref\n0 {count}\n0000000000 65535 f \n".encode('ascii'))
+            for number in range(1, count):
+                self._file.write(f"{self._offsets[number]:010d} 00000 n \n".encode('ascii'))
+            self._file.write(f"trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n"
+                             .encode('ascii'))
+        finally:
+            self._file.close()
+            self._file = None
+        
+        if self._skipped_characters:
+            logger.warning(f"Characters not available in the PDF font were left out: "
+                           f"{''.join(sorted(self._skipped_characters))}")
+    
+    def _write_object(self, number, dictionary, stream=None):
+        """Write an indirect object, with an optional stream."""
+        self._offsets[number] = self._file.tell()
+        self._file.write(f"{number} 0 obj\n{dictionary}\n".encode('latin-1'))
+        if stream is not None:
+            self._file.write(b"stream\n" + stream + b"\nendstream\n")
+        self._file.write(b"endobj\n")
+    
+    def _color(self, color, operator):
+        red, green, blue = _rgb(color)
+        return f"{red / 255:.3f} {green / 255:.3f} {blue / 255:.3f} {operator}"
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_overlays(writer, generator, overlays, origin):
+    """
+    Write overlays as vector shapes, matching how draw_overlays rasterizes them.
+    
+    Shapes are placed on pixel centres and outlines are inset by half their width,
+    so each shape covers the same pixels as in the raster grid.
+    
+    Args:
+        writer (SvgWriter or PdfWriter): Document writer
+        generator (GridGenerator): Rendering engine the grid was laid out with
+        overlays (list): Overlay dicts (see GridCell)
+        origin (tuple): Grid position of the overlays' (0, 0)
+    """
+    origin_x, origin_y = origin
+    
+    def point(x, y):
+        return origin_x + x + 0.5, origin_y + y + 0.5
+    
+    for overlay in overlays:
+        overlay_type = overlay.get('type')
+        color = overlay.get('color', (255, 0, 0))
+        width = overlay.get('width', 2)
+        
+        if overlay_type == 'text':
+            font_size = overlay.get('font_size', 10)
+            font = generator.font(font_size)
+            try:
+                family, ascent = font.getname()[0], font.getmetrics()[0]
+            except AttributeError:
+                family, ascent = "sans-serif", font_size * 0.8
+            
+            # Text is positioned by the top of its ascent, as PIL draws it; PIL strokes
+            # with the fill colour when no stroke colour is given
+            x, y = overlay.get('position', (0, 0))
+            fill = overlay.get('color', (0, 0, 0))
+            writer.text(origin_x + x, origin_y + y + ascent, overlay.get('text', ''), font_size, family,
+                        fill, overlay.get('stroke_color') or fill, overlay.get('stroke_width', 0))
+        
+        elif overlay_type == 'box' and overlay.get('style', 'solid') == 'dotted':
+            # One dashed line per side instead of a line per dash
+            x, y, w, h = overlay.get('box')
+            dots = overlay.get('dots', 20)
+            for start, end, length in (((x, y), (x + w, y), w), ((x, y + h), (x + w, y + h), w),
+                                       ((x, y), (x, y + h), h), ((x + w, y), (x + w, y + h), h)):
+                dash = (length / (2 * dots),) * 2 if length > 0 else None
+                writer.line(point(*start), point(*end), color, width, dash)
+        
+        elif overlay_type == 'box' and overlay.get('style', 'solid') == 'corners':
+            for start, end in generator.box_segments(overlay):
+                writer.line(point(*start), point(*end), color, width)
+        
+        elif overlay_type == 'box':
+            x, y, w, h = overlay.get('box')
+            left, top = origin_x + x, origin_y + y
+            if overlay.get('fill') is not None:
+                writer.rect(left, top, w + 1, h + 1, fill=overlay.get('fill'))
+            if overlay.get('color') is not None and width:
+                writer.rect(left + width / 2, top + width / 2, w + 1 - width, h + 1 - width,
+                            stroke=overlay.get('color'), line_width=width)
+        
+        elif overlay_type in ('line', 'arrow'):
+            start = point(*overlay.get('start', (0, 0)))
+            end = point(*overlay.get('end', (0, 0)))
+            writer.line(start, end, color, width)
+            
+            if overlay_type == 'arrow':
+                writer.polygon(generator.arrowhead(end, start), color)
+
+
+def write_vector_grid(grid, path, format=None, dpi=None):
+    """
+    Write a grid as an SVG or PDF document.
+    
+    Cells are embedded one at a time at native resolution and the generator's
+    images are released as they are written, so a grid can be written only once.
+    
+    Args:
+        grid (StreamedGrid): Grid at native size
+        path (str): Output file path
+        format (str, optional): "SVG" or "PDF"; by default taken from the file extension
+        dpi (tuple, optional): Resolution as (x, y) dots per inch, setting the
+            document's physical size
+    """
+    format = vector_format(path, format)
+    if format is None:
+        raise ValueError(f"Not a vector format: {path}")
+    
+    generator = grid.generator
+    cells = grid.cells
+    positions = [generator.cell_position(i, grid.layout, grid.cell_size) for i in range(len(cells))]
+    last_use = {id(cell.image): i for i, cell in enumerate(cells)}
+    
+    writer_class = SvgWriter if format == "SVG" else PdfWriter
+    with writer_class(path, grid.size, dpi) as writer:
+        writer.rect(0, 0, grid.width, grid.height, fill=generator.background_color)
+        
+        # Cell images first, then the overlay layer over all of them, as in the raster grid
+        for i, (cell, (x, y)) in enumerate(zip(cells, positions)):
+            if cell.fit == "center":
+                cell_img = generator.display_image(cell)
+                x_offset, y_offset = cell.image_offset(grid.cell_size)
+                x, y = x + x_offset, y + y_offset
+            else:
+                cell_img = generator.fit_to_cell(cell, grid.cell_size)
+            
+            if cell_img.mode not in ("L", "RGB"):
+                cell_img = cell_img.convert("L" if cell_img.mode in ("1", "LA") else "RGB")
+            writer.image(cell_img, x, y)
+            
+            if last_use[id(cell.image)] == i:
+                generator.release_image(cell.image)
+        
+        for cell, position in zip(cells, positions):
+            write_overlays(writer, generator, cell.overlays, position)
+    
+    logger.info(f"Wrote {grid.width}x{grid.height} grid with {len(cells)} cells to {path} as {format}")
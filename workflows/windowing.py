@@ -0,0 +1,278 @@
+"""
+Intensity windowing for SEM Image Workflow Manager.
+Maps 16-bit and floating point images to 8 bits for display through a precomputed
+lookup table, so high bit depth detector exports keep their contrast instead of
+being clipped by PIL's mode conversion.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+from utils.logger import Logger
+from utils.config import config
+
+logger = Logger(__name__)
+
+# One lookup table entry per 16-bit level
+LUT_SIZE = 65536
+
+# Image modes that are windowed before display; 16-bit images index the lookup
+# table directly, 32-bit integer and float images are first quantized to 16 bits
+HIGH_BIT_DEPTH_MODES = ("I;16", "I;16L", "I;16B", "I;16N", "I", "F")
+
+WINDOW_METHODS = ("minmax", "percentile", "metadata")
+
+# Pixels sampled to estimate percentile limits
+SAMPLE_PIXELS = 1 << 20
+
+# Rows mapped per lookup, to bound the size of temporary arrays
+STRIP_ROWS = 256
+
+
+def needs_windowing(img):
+    """
+    Check if an image has to be windowed to display it.
+    
+    Args:
+        img (PIL.Image): Image
+    
+    Returns:
+        bool: True for 16-bit, 32-bit integer and float images
+    """
+    return img.mode in HIGH_BIT_DEPTH_MODES
+
+
+def _finite_value(value):
+    """
+    Get a metadata value as a float, treating missing and non-finite values alike.
+    
+    Args:
+        value: Value as stored in metadata; CSV-loaded rows use NaN for missing
+    
+    Returns:
+        float: Value, or None if it is missing, not numeric or not finite
+    """
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if np.isfinite(value) else None
+
+
+def window_settings(options=None, metadata=None):
+    """
+    Get the windowing settings for an image from render options and its metadata.
+    
+    Args:
+        options (dict, optional): Render options; "window_method" is "minmax",
+            "percentile" or "metadata" and defaults to grid_generator.window_method
+        metadata (dict, optional): Image metadata with "contrast", "brightness" and
+            "gamma" as applied by the instrument, for the "metadata" method
+    
+    Returns:
+        tuple: Hashable settings, ("minmax",), ("percentile", low, high) or
+            ("metadata", contrast, brightness, gamma)
+    """
+    method = (options or {}).get("window_method", config.get('grid_generator.window_method', 'percentile'))
+    if method not in WINDOW_METHODS:
+        logger.warning(f"Unknown window method {method}, using percentile")
+        method = "percentile"
+    
+    if method == "metadata":
+        values = [_finite_value((metadata or {}).get(key)) for key in ("contrast", "brightness", "gamma")]
+        if any(value is not None for value in values):
+            contrast, brightness, gamma = values
+            return ("metadata",
+                    1.0 if contrast is None else contrast,
+                    0.5 if brightness is None else brightness,
+                    1.0 if gamma is None or gamma <= 0 else gamma)
+        # Images without stored settings fall back to their own distribution
+        method = "percentile"
+    
+    if method == "minmax":
+        return ("minmax",)
+    
+    low, high = config.get('grid_generator.window_percentiles', [0.5, 99.5])
+    return ("percentile", float(low), float(high))
+
+
+def window_limits(pixels, settings):
+    """
+    Get the raw intensities mapped to black and white.
+    
+    Args:
+        pixels (numpy.ndarray): 2D pixel array
+        settings (tuple): Windowing settings (see window_settings)
+    
+    Returns:
+        tuple: (low, high) raw intensities, with high > low
+    """
+    method = settings[0]
+    if method == "percentile":
+        # Percentiles of a regular subsample; full sorting would dominate the cost
+        step = max(1, int(np.sqrt(pixels.size / SAMPLE_PIXELS)))
+        sample = pixels[::step, ::step]
+        if sample.dtype.kind == 'f':
+            sample = sample[np.isfinite(sample)]
+        if sample.size == 0:
+            low, high = 0.0, 1.0
+        else:
+            low, high = np.percentile(sample, settings[1:3])
+    elif method == "metadata" and pixels.dtype.kind == 'u' and pixels.dtype.itemsize == 2:
+        # Instrument settings apply to the detector's full 16-bit range
+        low, high = 0, LUT_SIZE - 1
+    else:
+        low, high = np.nanmin(pixels), np.nanmax(pixels)
+    
+    low, high = float(low), float(high)
+    if not np.isfinite(low) or not np.isfinite(high):
+        low, high = 0.0, 1.0
+    if high <= low:
+        high = low + 1.0
+    return low, high
+
+
+def build_window_lut(low, high, contrast=1.0, brightness=0.5, gamma=1.0):
+    """
+    Build a lookup table mapping 16-bit levels to 8-bit display intensities.
+    
+    Levels are normalized to the window, then a contrast and brightness transfer
+    around mid-grey and a gamma are applied; the defaults leave the window linear.
+    
+    Args:
+        low (float): Level mapped to black
+        high (float): Level mapped to white
+        contrast (float): Gain applied around mid-grey
+        brightness (float): Output level of mid-grey, from 0 to 1
+        gamma (float): Display gamma
+    
+    Returns:
+        numpy.ndarray: LUT_SIZE entry uint8 lookup table
+    """
+    levels = (np.arange(LUT_SIZE, dtype=np.float64) - low) / (high - low)
+    levels = np.clip(contrast * (levels - 0.5) + brightness, 0.0, 1.0)
+    if gamma != 1.0:
+        levels = levels ** (1.0 / gamma)
+    return np.rint(levels * 255).astype(np.uint8)
+
+
+def _window_table(pixels, settings):
+    """
+    Build the lookup table for an image.
+    
+    Args:
+        pixels (numpy.ndarray): 2D pixel array
+        settings (tuple): Windowing settings (see window_settings)
+    
+    Returns:
+        tuple: (lookup table, quantization limits); the limits are None for 16-bit
+            images, which index the table directly
+    """
+    low, high = window_limits(pixels, settings)
+    transfer = settings[1:4] if settings[0] == "metadata" else ()
+    
+    if pixels.dtype.kind == 'u' and pixels.dtype.itemsize == 2:
+        return build_window_lut(low, high, *transfer), None
+    
+    # Other images are quantized over the window first, so the table covers it exactly
+    return build_window_lut(0, LUT_SIZE - 1, *transfer), (low, high)
+
+
+class WindowCache:
+    """
+    LRU cache of windowing lookup tables keyed by image path and settings.
+    """
+    
+    def __init__(self, max_entries=128):
+        """
+        Initialize window cache.
+        
+        Args:
+            max_entries (int): Maximum number of lookup tables kept in memory
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, image_path, settings, pixels):
+        """
+        Get the lookup table for an image, building it on a cache miss.
+        
+        Args:
+            image_path (str): Path to the image file
+            settings (tuple): Windowing settings (see window_settings)
+            pixels (numpy.ndarray): The image's pixels, used on a cache miss
+        
+        Returns:
+            tuple: (lookup table, quantization limits), see _window_table
+        """
+        try:
+            mtime = os.path.getmtime(image_path)
+        except OSError:
+            return _window_table(pixels, settings)
+        
+        key = (image_path, mtime, settings)
+        
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        
+        table = _window_table(pixels, settings)
+        
+        with self._lock:
+            self._entries[key] = table
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        
+        return table
+    
+    def clear(self):
+        """Remove all cached lookup tables."""
+        with self._lock:
+            self._entries.clear()
+
+
+def apply_window(img, image_path=None, settings=None):
+    """
+    Map a high bit depth image to an 8-bit grayscale image for display.
+    
+    Args:
+        img (PIL.Image): Image; images that need no windowing are returned as is
+        image_path (str, optional): Path of the image, to reuse its cached lookup table
+        settings (tuple, optional): Windowing settings; defaults to window_settings()
+    
+    Returns:
+        PIL.Image: 8-bit "L" image, or img itself
+    """
+    if not needs_windowing(img):
+        return img
+    
+    if settings is None:
+        settings = window_settings()
+    
+    pixels = np.asarray(img)
+    if image_path:
+        lut, limits = window_cache.get(image_path, settings, pixels)
+    else:
+        lut, limits = _window_table(pixels, settings)
+    
+    windowed = np.empty(pixels.shape, dtype=np.uint8)
+    for top in range(0, pixels.shape[0], STRIP_ROWS):
+        strip = pixels[top:top + STRIP_ROWS]
+        if limits is not None:
+            low, high = limits
+            strip = np.nan_to_num(strip.astype(np.float32), nan=low)
+            strip = np.clip((strip - low) * ((LUT_SIZE - 1) / (high - low)), 0, LUT_SIZE - 1).astype(np.uint16)
+        np.take(lut, strip, out=windowed[top:top + STRIP_ROWS])
+    
+    return Image.fromarray(windowed, 'L')
+
+
+# Create global cache instance
+window_cache = WindowCache()
@@ -7,6 +7,7 @@ import os
 import json
 from abc import ABC, abstractmethod
 from utils.logger import Logger
+from utils.config import config
 
 logger = Logger(__name__)
 
@@ -49,11 +50,47 @@ def convert_to_serializable(obj):
         return obj
 
 
+class WorkflowMessage:
+    """
+    A notice raised by a workflow operation for the caller to present.
+    
+    Workflows do not show dialogs themselves, so they can run in worker threads
+    and batch jobs; the UI shows these messages after the operation returns.
+    """
+    
+    INFO = "info"
+    WARNING = "warning"
+    ERROR = "error"
+    
+    def __init__(self, level, title, text, code=None, details=None):
+        """
+        Initialize workflow message.
+        
+        Args:
+            level (str): One of WorkflowMessage.INFO, WARNING or ERROR
+            title (str): Short title, e.g. for a dialog caption
+            text (str): Message text
+            code (str, optional): Machine-readable identifier of the condition
+            details (dict, optional): Structured data about the condition
+        """
+        self.level = level
+        self.title = title
+        self.text = text
+        self.code = code
+        self.details = details or {}
+    
+    def __repr__(self):
+        return f"WorkflowMessage({self.level!r}, {self.code or self.title!r})"
+
+
 class WorkflowBase(ABC):
     """
     Base class for all workflow types.
     """
     
+    # Options that apply to a single rendering and are not stored with a collection
+    RENDER_ONLY_OPTIONS = ("quality", "target_size", "stream", "persist")
+    
     def __init__(self, session_manager):
         """
         Initialize workflow with session manager.
@@ -64,6 +101,7 @@ class WorkflowBase(ABC):
         self.session_manager = session_manager
         self.collections = []
         self.workflow_folder = None
+        self.messages = []  # WorkflowMessage objects from the last operation
         
         if session_manager and session_manager.session_folder:
             self._setup_workflow_folder()
@@ -129,6 +167,46 @@ class WorkflowBase(ABC):
         """
         pass
     
+    def _add_message(self, level, title, text, code=None, **details):
+        """
+        Record a message for the caller and log it.
+        
+        Args:
+            level (str): One of WorkflowMessage.INFO, WARNING or ERROR
+            title (str): Short title
+            text (str): Message text
+            code (str, optional): Machine-readable identifier of the condition
+            **details: Structured data about the condition
+        
+        Returns:
+            WorkflowMessage: The recorded message
+        """
+        message = WorkflowMessage(level, title, text, code, details)
+        self.messages.append(message)
+        
+        if level == WorkflowMessage.ERROR:
+            logger.error(text)
+        elif level == WorkflowMessage.WARNING:
+            logger.warning(text)
+        else:
+            logger.info(text)
+        return message
+    
+    def get_message(self, code):
+        """
+        Get the message with the given code from the last operation.
+        
+        Args:
+            code (str): Message code
+        
+        Returns:
+            WorkflowMessage: The message, or None if the last operation did not raise it
+        """
+        for message in self.messages:
+            if message.code == code:
+                return message
+        return None
+    
     def save_collection(self, collection):
         """
         Save a collection to a file in the workflow folder.
@@ -211,6 +289,114 @@ class WorkflowBase(ABC):
         logger.info(f"Loaded {len(self.collections)} collections")
         return self.collections
     
+    def render_for_export(self, collection):
+        """
+        Re-render a collection at export quality using its last preview settings.
+        
+        Workflows that store "render_settings" in a collection when creating a grid
+        render previews with cheap resampling; this renders the same grid again
+        with full-quality resampling for export. Grids at native size are streamed
+        to disk strip by strip when saved (grid_generator.stream_export).
+        
+        Args:
+            collection: Collection to render
+        
+        Returns:
+            PIL.Image: Export quality grid image (or a StreamedGrid, which is saved
+                the same way), or None if the collection has no stored render settings
+        """
+        settings = collection.get("render_settings")
+        if not settings:
+            return None
+        
+        layout = settings.get("layout")
+        options = dict(settings.get("options") or {})
+        options["quality"] = "export"
+        options["stream"] = config.get('grid_generator.stream_export', True)
+        # Exports run on a worker thread; the collection file is only written by the UI thread
+        options["persist"] = False
+        
+        logger.info(f"Rendering collection {collection.get('id', 'unknown')} at export quality")
+        return self.create_grid(collection, tuple(layout) if layout else None, options)
+    
+    def export_vector(self, collection, image_path, grid_image=None):
+        """
+        Export a grid as an SVG or PDF document next to its exported image.
+        
+        The grid is rendered again at native size with its stored render settings.
+        Cells are embedded as images and labels, boxes and arrows are written as
+        vector shapes, so annotations stay sharp when the figure is scaled for print.
+        Enabled by grid_generator.vector_export ("svg" or "pdf").
+        
+        Args:
+            collection: Collection to render
+            image_path (str): Path of the exported image; the document gets the same name
+            grid_image: The exported grid, whose physical size the document keeps
+        
+        Returns:
+            str: Path of the document, or None if vector export is off or not possible
+        """
+        from workflows.grid_generator import StreamedGrid
+        from workflows.vector_export import VECTOR_FORMATS
+        
+        format = str(config.get('grid_generator.vector_export', '') or '').upper()
+        if not format:
+            return None
+        if format not in VECTOR_FORMATS:
+            logger.warning(f"Unknown vector export format: {format}")
+            return None
+        
+        settings = collection.get("render_settings")
+        if not settings:
+            logger.info("Collection has no render settings, skipping vector export")
+            return None
+        
+        layout = settings.get("layout")
+        options = dict(settings.get("options") or {})
+        options.update({"quality": "export", "stream": True, "print_size": False})
+        
+        try:
+            grid = self.create_grid(collection, tuple(layout) if layout else None, options)
+        except Exception as e:
+            logger.error(f"Error rendering grid for vector export: {str(e)}")
+            return None
+        finally:
+            # Keep the settings the user rendered with, not the native size render
+            collection["render_settings"] = settings
+        
+        if not isinstance(grid, StreamedGrid):
+            logger.info("Grid is not made of separate cells, skipping vector export")
+            return None
+        
+        # Keep the physical size of the exported image, e.g. when rendered at print size
+        dpi = None
+        if grid_image is not None and grid_image.info.get("dpi"):
+            width_inches = grid_image.width / grid_image.info["dpi"][0]
+            dpi = (grid.width / width_inches, grid.width / width_inches)
+        
+        vector_path = os.path.splitext(image_path)[0] + "." + format.lower()
+        try:
+            logger.info(f"Saving vector grid to: {vector_path}")
+            grid.save(vector_path, format=format, dpi=dpi)
+        except Exception as e:
+            logger.error(f"Error exporting vector grid: {str(e)}")
+            return None
+        return vector_path
+    
+    def _store_render_settings(self, collection, layout, options):
+        """
+        Store the layout and options a grid was created with, for render_for_export.
+        
+        Args:
+            collection: Collection being rendered
+            layout (tuple): Grid layout as (rows, columns)
+            options (dict): Render options
+        """
+        collection["render_settings"] = {
+            "layout": list(layout),
+            "options": {key: value for key, value in options.items() if key not in self.RENDER_ONLY_OPTIONS}
+        }
+    
     def export_grid(self, grid_image, collection):
         """
         Export a grid visualization as a PNG file to the project folder.
@@ -328,7 +514,10 @@ class WorkflowBase(ABC):
             
             # Save the grid image
             logger.info(f"Saving grid image to: {image_path}")
-            grid_image.save(image_path, format="PNG")
+            grid_image.save(image_path, format="PNG", dpi=grid_image.info.get("dpi"))
+            
+            # Optional SVG or PDF copy with vector annotations
+            self.export_vector(collection, image_path, grid_image)
             
             # Create a caption file
             logger.info(f"Saving caption to: {caption_path}")